@@ -0,0 +1,214 @@
+from __future__ import print_function
+
+import argparse
+import glob
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from common.json_log import JsonLogIndex
+from common.prompts import Prompts
+from common.worker_pool import WorkerPool
+
+
+class FleetTarget(object):
+    def __init__(self, name, directory, context=None, kubeconfig=None):
+        self.name = name
+        self.directory = directory
+        self.context = context
+        self.kubeconfig = kubeconfig
+        self.log_dir = os.path.join(directory, "logs")
+        self.state_dir = os.path.join(directory, "state")
+        self.output_file = os.path.join(directory, "output.log")
+        self.status = None
+        self.result = BootstrapFleet.RESULT_NOT_RUN
+        self.seconds = None
+        self.errors = None
+        self.log_file = None
+
+
+class BootstrapFleet(object):
+    """
+    Runs bootstrap_install.py in headless mode against many clusters at once. Every target is a kubectl context,
+    whose configuration is flattened into a kubeconfig of its own, or a kubeconfig file. Each install runs in its own
+    process with its own KUBECONFIG, log directory and state directory under the fleet directory so no two targets
+    share a log, an apply cache or a journal. A result for every target is printed at the end.
+    """
+    KUBECTL_MINIFY = ["kubectl", "config", "view", "--minify", "--flatten"]
+    DEFAULT_MAX_CONCURRENT = 4
+    RESULT_NOT_RUN = "NOT RUN"
+    RESULT_OK = "OK"
+    RESULT_ERRORS = "ERRORS"
+    RESULT_FAILED = "FAILED"
+
+    def __init__(self):
+        self.base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.install_script = os.path.join(self.base_dir, "bootstrap_install.py")
+        self.fleet_dir = os.path.abspath(os.path.join(self.base_dir, "..", "fleet"))
+        self.parsed_args = None
+        self.targets = list()
+        self._processes = dict()
+        self._lock = threading.Lock()
+        self._parse_args()
+
+    def _parse_args(self):
+        arg_parser = argparse.ArgumentParser(description="Install one response file to many Kubernetes clusters "
+                                                         "concurrently")
+        arg_parser.add_argument("-r", "--response-file", action="store", required=True,
+                                help="prompt response file recorded with -m {0}".format(Prompts.RECORD_MODE_STR))
+        arg_parser.add_argument("--context", action="append", default=list(), dest="contexts",
+                                help="kubectl context to install to; may be repeated")
+        arg_parser.add_argument("--kubeconfig", action="append", default=list(), dest="kubeconfigs",
+                                help="kubeconfig file of a cluster to install to; may be repeated")
+        arg_parser.add_argument("--max-concurrent", action="store", type=int,
+                                default=BootstrapFleet.DEFAULT_MAX_CONCURRENT,
+                                help="maximum number of clusters installed at the same time")
+        arg_parser.add_argument("--fleet-dir", action="store", default=self.fleet_dir,
+                                help="directory of the logs and state of each cluster (default: {0})"
+                                .format(self.fleet_dir))
+        arg_parser.add_argument("install_args", nargs=argparse.REMAINDER,
+                                help="arguments after -- are passed to bootstrap_install.py, for example "
+                                     "-- --parallel --engine native")
+
+        self.parsed_args = arg_parser.parse_args()
+        if len(self.parsed_args.contexts) == 0 and len(self.parsed_args.kubeconfigs) == 0:
+            arg_parser.error("at least one --context or --kubeconfig is needed")
+        if not os.path.exists(self.parsed_args.response_file):
+            arg_parser.error("the response file {0} does not exist".format(self.parsed_args.response_file))
+        if self.parsed_args.max_concurrent < 1:
+            arg_parser.error("--max-concurrent must be at least 1")
+        if self.parsed_args.install_args[:1] == ["--"]:
+            self.parsed_args.install_args = self.parsed_args.install_args[1:]
+
+    @staticmethod
+    def get_target_name(name, used):
+        name = re.sub("[^A-Za-z0-9_.-]", "_", name)
+        unique_name = name
+        count = 1
+        while unique_name in used:
+            count += 1
+            unique_name = "{0}-{1}".format(name, count)
+        used.add(unique_name)
+        return unique_name
+
+    def get_targets(self):
+        fleet_dir = os.path.abspath(self.parsed_args.fleet_dir)
+        used = set()
+        targets = list()
+        for context in self.parsed_args.contexts:
+            name = BootstrapFleet.get_target_name(context, used)
+            targets.append(FleetTarget(name, os.path.join(fleet_dir, name), context=context))
+        for kubeconfig in self.parsed_args.kubeconfigs:
+            name = BootstrapFleet.get_target_name(os.path.splitext(os.path.basename(kubeconfig))[0], used)
+            targets.append(FleetTarget(name, os.path.join(fleet_dir, name), kubeconfig=os.path.abspath(kubeconfig)))
+        return targets
+
+    @staticmethod
+    def write_context_kubeconfig(target):
+        """
+        Flatten the configuration of the context into a kubeconfig of the target's own so its install cannot be
+        affected by a change of the current context while it runs
+        """
+        process = subprocess.Popen(BootstrapFleet.KUBECTL_MINIFY + ["--context={0}".format(target.context)],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, error = process.communicate()
+        if process.returncode != 0:
+            raise IOError("Could not get the configuration of the context {0}: {1}".format(
+                target.context, error.decode("UTF-8").strip()))
+
+        target.kubeconfig = os.path.join(target.directory, "kubeconfig")
+        with open(target.kubeconfig, "wb") as fp:
+            fp.write(output)
+        # The flattened configuration holds the credentials of the cluster
+        os.chmod(target.kubeconfig, 0o600)
+
+    def get_install_command(self, target):
+        command = [sys.executable, self.install_script, "-m", Prompts.HEADLESS_MODE_STR,
+                   "-r", os.path.abspath(self.parsed_args.response_file),
+                   "--log-dir", target.log_dir, "--state-dir", target.state_dir]
+        # The JSON log is where the errors of each install are counted from
+        if "--json-log" not in self.parsed_args.install_args:
+            command.append("--json-log")
+        return command + self.parsed_args.install_args
+
+    def run_target(self, target):
+        started = time.time()
+        try:
+            if not os.path.exists(target.directory):
+                os.makedirs(target.directory)
+            if target.context is not None:
+                BootstrapFleet.write_context_kubeconfig(target)
+
+            env = dict(os.environ)
+            env["KUBECONFIG"] = target.kubeconfig
+            print("Installing to {0}...".format(target.name))
+            with open(target.output_file, "w") as output, open(os.devnull) as devnull:
+                process = subprocess.Popen(self.get_install_command(target), stdin=devnull, stdout=output,
+                                           stderr=subprocess.STDOUT, env=env)
+                with self._lock:
+                    self._processes[target.name] = process
+                target.status = process.wait()
+        except (IOError, OSError) as e:
+            print("ERROR: {0}: {1}".format(target.name, str(e)))
+            target.result = BootstrapFleet.RESULT_FAILED
+            return False
+        finally:
+            target.seconds = time.time() - started
+
+        self.read_errors(target)
+        if target.status != 0:
+            target.result = BootstrapFleet.RESULT_FAILED
+        elif target.errors:
+            target.result = BootstrapFleet.RESULT_ERRORS
+        else:
+            target.result = BootstrapFleet.RESULT_OK
+        print("Finished {0}: {1} after {2:.1f}s".format(target.name, target.result, target.seconds))
+        return target.result == BootstrapFleet.RESULT_OK
+
+    @staticmethod
+    def read_errors(target):
+        log_files = sorted(glob.glob(os.path.join(target.log_dir, "*.jsonl")), key=os.path.getmtime)
+        if len(log_files) == 0:
+            return
+        target.log_file = log_files[-1]
+        target.errors = len(JsonLogIndex.load(target.log_file)["errors"])
+
+    def print_results(self):
+        print("")
+        print("{0:<24}  {1:<8}  {2:>4}  {3:>8}  {4:>6}  {5}".format("Target", "Result", "Exit", "Seconds", "Errors",
+                                                                  "Output"))
+        for target in self.targets:
+            print("{0:<24}  {1:<8}  {2:>4}  {3:>8}  {4:>6}  {5}".format(
+                target.name, target.result, "-" if target.status is None else target.status,
+                "-" if target.seconds is None else "{0:.1f}".format(target.seconds),
+                "-" if target.errors is None else target.errors, target.output_file))
+
+    def run(self):
+        self.targets = self.get_targets()
+        print("Installing to {0} cluster(s), {1} at a time".format(len(self.targets), self.parsed_args.max_concurrent))
+        pool = WorkerPool(min(self.parsed_args.max_concurrent, len(self.targets)), "fleet")
+        try:
+            tasks = [pool.submit(self.run_target, target) for target in self.targets]
+            # Waited for with a timeout so a Ctrl-C is not held up until every install has finished
+            while not all(task.wait(1) for task in tasks):
+                pass
+        except KeyboardInterrupt:
+            # The installs got the Ctrl-C too and are writing their logs; They are given the time to finish that
+            with self._lock:
+                processes = list(self._processes.values())
+            for process in processes:
+                process.wait()
+        finally:
+            pool.shutdown(False)
+
+        self.print_results()
+        if any(target.result != BootstrapFleet.RESULT_OK for target in self.targets):
+            return 1
+        return 0
+
+
+bootstrap_fleet = BootstrapFleet()
+sys.exit(bootstrap_fleet.run())
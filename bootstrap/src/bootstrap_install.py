@@ -1,15 +1,25 @@
 import os
+import sys
+
+from common.startup_profiler import StartupProfiler
+
+# Enabled before the other imports so their cost is measured
+StartupProfiler.enable_from_args(sys.argv)
 
 from bootstrapbase import BootstrapBase
+from common.apply_cache import ApplyCache
 from common.mapr_logger.log import Log
+from common.tracer import Tracer
 from common.os_command import OSCommand
 from k8s_operations import K8SOperations
-from mapr.clouds.cloud import Cloud
 from nodelabels import NodeLabels
 from validators.kubectl_validator import KubectlValidator
 from validators.openshiftclient_validator import OpenshiftClientValidator
+from validators.python_validator import PythonValidator
 from validators.validator import Validator
 
+StartupProfiler.mark("imports")
+
 
 class BootstrapInstall(BootstrapBase):
     def __init__(self):
@@ -22,9 +32,20 @@ class BootstrapInstall(BootstrapBase):
     def run(self):
         super(BootstrapInstall, self).run()
         k8s = K8SOperations(self._prompts, self.base_dir)
+        k8s.use_template_cache(self.state_dir)
+        k8s.template_values = self.get_template_values()
+        k8s.parallel = self.parsed_args.parallel
+        k8s.batch_apply = self.parsed_args.batch_apply
+        k8s.max_workers = self.parsed_args.max_workers
+        k8s.wait_ready = self.parsed_args.wait_ready
+        k8s.ready_timeout = self.parsed_args.ready_timeout
+        k8s.rollback = self.parsed_args.rollback
         self.prologue()
+        # The checks needed before the first prompt are collected together
+        Validator.collect_all([PythonValidator(), KubectlValidator()])
         self.python_check()
         self.check_laptop_tools()
+        StartupProfiler.mark("python and tool checks")
 
         do_storage = self.parsed_args.core_install
         do_cloud_install = self.parsed_args.cloud_install
@@ -72,6 +93,17 @@ class BootstrapInstall(BootstrapBase):
                 is_cloud = self.is_cloud_env(k8s, is_cloud)
                 install_ingress = self.check_if_ingress()
         self.configure_kubernetes()
+        if self.parsed_args.engine == "native":
+            k8s.use_native_client()
+        # The identity is looked up once, and only when something kept between runs needs it
+        use_apply_cache = self.parsed_args.skip_unchanged or ApplyCache.exists(self.state_dir)
+        use_journal = self.parsed_args.journal or self.parsed_args.resume
+        if use_apply_cache or use_journal:
+            cluster_id = k8s.get_cluster_identity()
+            if use_apply_cache:
+                k8s.use_apply_cache(self.state_dir, cluster_id, self.parsed_args.skip_unchanged)
+            if use_journal:
+                k8s.use_journal(self.state_dir, cluster_id, self.parsed_args.resume)
 
         nl = NodeLabels(k8s)
         nl.process_labels()
@@ -82,25 +114,30 @@ class BootstrapInstall(BootstrapBase):
             k8s.create_user_secret()
             if not k8s.check_ready():
                 return
+        components = list()
         if install_config:
             if install_cspaces:
-                k8s.install_cspaces_configuration_components()
+                components.append("cspaces_configuration")
             if install_storage:
-                k8s.install_clusters_configuration_components()
+                components.append("clusters_configuration")
         if install_csi:
-            k8s.install_csi_components()
+            components.append("csi")
         if install_config:
-            k8s.install_external_components()
+            components.append("external")
         if install_cspaces:
-            k8s.install_system_cspace_components()
+            components.append("system_cspace")
         if install_storage:
-            k8s.install_system_cluster_components()
+            components.append("system_cluster")
         if install_spark:
-            k8s.install_spark_components()
+            components.append("spark")
         if install_drill:
-            k8s.install_drill_components()
+            components.append("drill")
         if install_kubeflow:
-            k8s.install_kubeflow_components()
+            components.append("kubeflow")
+        if not k8s.install_components(components):
+            # What the failed phase created was rolled back so nothing may be installed on top of it
+            Log.error("The install was rolled back and stopped; Fix the errors above and run it again")
+            BootstrapBase.exit_application(1)
         if install_storage:
             if install_ingress:
                 k8s.install_ingress_components(is_cloud)
@@ -162,15 +199,13 @@ class BootstrapInstall(BootstrapBase):
 
     @staticmethod
     def check_laptop_tools():
-        kubectl_validator = KubectlValidator()
-        kubectl_validator.collect()
+        kubectl_validator = Validator.get_collected(KubectlValidator)
         if kubectl_validator.operation != Validator.OPERATION_OK:
             BootstrapBase.exit_application(3)
 
     @staticmethod
     def check_oc_installed():
-        oc_validator = OpenshiftClientValidator()
-        oc_validator.collect()
+        oc_validator = Validator.get_collected(OpenshiftClientValidator)
 
         if oc_validator.operation != Validator.OPERATION_OK:
             BootstrapBase.exit_application(5)
@@ -229,8 +264,11 @@ class BootstrapInstall(BootstrapBase):
         return choice
 
     def install_cloud(self):
+        # Imported here because most installs are not cloud installs
+        from mapr.clouds.cloud import Cloud
+
         print("")
-        Cloud.initialize(self._prompts)
+        Cloud.initialize(self._prompts, self.state_dir)
         cloud_names = Cloud.get_cloud_names()
 
         if len(cloud_names) == 0:
@@ -310,6 +348,8 @@ class BootstrapInstall(BootstrapBase):
         Log.info("PAS Installation complete")
 
 
+Tracer.trace_methods(BootstrapInstall, ("run", "install_cloud", "configure_kubernetes", "validate_nodes",
+                                        "check_laptop_tools"), "bootstrap")
 bootstrap_instsall = BootstrapInstall()
 bootstrap_instsall.run()
 BootstrapBase.exit_application(0)
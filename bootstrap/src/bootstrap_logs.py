@@ -0,0 +1,114 @@
+from __future__ import print_function
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+from common.json_log import JsonLogIndex
+
+
+class BootstrapLogs(object):
+    """
+    Searches the JSON logs written by bootstrapper runs that used --json-log. Only the sidecar index of each log
+    and the lines it points to are read, so searching hundreds of archived runs does not scan them.
+    """
+    def __init__(self):
+        self.base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.log_dir = os.path.abspath(os.path.join(self.base_dir, "..", "logs"))
+        self.parsed_args = None
+        self._parse_args()
+
+    def _parse_args(self):
+        arg_parser = argparse.ArgumentParser(description="Search the JSON logs of bootstrapper runs")
+        subparsers = arg_parser.add_subparsers(dest="command")
+
+        query_parser = subparsers.add_parser("query", help="print the events that match every filter given")
+        query_parser.add_argument("--errors", action="store_true", default=False,
+                                  help="only failed commands, failed phases and error messages")
+        query_parser.add_argument("--phase", action="store", default=None,
+                                  help="only events in phases whose name contains this")
+        query_parser.add_argument("--key", action="store", default=None,
+                                  help="only events for yaml keys that contain this")
+        query_parser.add_argument("--cmd", action="store", default=None, dest="cmd",
+                                  help="only commands that contain this, for example 'kubectl apply'")
+        query_parser.add_argument("logs", nargs="*", help="JSON logs or directories of them (default: {0})"
+                                  .format(self.log_dir))
+
+        summary_parser = subparsers.add_parser("summary", help="print the duration and error count of every run")
+        summary_parser.add_argument("logs", nargs="*", help="JSON logs or directories of them (default: {0})"
+                                    .format(self.log_dir))
+
+        self.parsed_args = arg_parser.parse_args()
+        if self.parsed_args.command is None:
+            arg_parser.print_help()
+            sys.exit(1)
+
+    def get_log_files(self):
+        paths = self.parsed_args.logs or [self.log_dir]
+        log_files = list()
+        for path in paths:
+            if os.path.isdir(path):
+                log_files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl"))))
+            elif os.path.exists(path):
+                log_files.append(path)
+            else:
+                print("WARNING: {0} does not exist".format(path))
+        return log_files
+
+    @staticmethod
+    def format_time(seconds):
+        if seconds is None:
+            return "-"
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds))
+
+    @staticmethod
+    def format_event(event):
+        if event.get("type") == "command":
+            what = "{0} status={1}".format(event.get("command"), event.get("status"))
+        elif event.get("type") == "log":
+            what = "{0}: {1}".format(event.get("level"), event.get("message"))
+        else:
+            what = event.get("operation")
+            if event.get("target") is not None:
+                what += " " + event["target"]
+            if event.get("error") is not None:
+                what += " error=" + event["error"]
+        duration = "" if event.get("duration") is None else " ({0:.2f}s)".format(event["duration"])
+        return "{0} [{1}] [{2}] {3}{4}".format(BootstrapLogs.format_time(event.get("time")), event.get("phase") or "-",
+                                               event.get("key") or "-", what, duration)
+
+    def query(self):
+        count = 0
+        for log_file in self.get_log_files():
+            events = JsonLogIndex.query(log_file, self.parsed_args.phase, self.parsed_args.key,
+                                        self.parsed_args.cmd, self.parsed_args.errors)
+            if len(events) == 0:
+                continue
+            print(log_file)
+            for event in events:
+                print("  " + BootstrapLogs.format_event(event))
+            count += len(events)
+        print("{0} matching events".format(count))
+
+    def summary(self):
+        print("{0:<19}  {1:>9}  {2:>7}  {3:>6}  {4}".format("Started", "Seconds", "Events", "Errors", "Log"))
+        for log_file in self.get_log_files():
+            index = JsonLogIndex.load(log_file)
+            started = index.get("started")
+            ended = index.get("ended")
+            seconds = "-" if started is None or ended is None else "{0:.1f}".format(ended - started)
+            print("{0:<19}  {1:>9}  {2:>7}  {3:>6}  {4}".format(BootstrapLogs.format_time(started), seconds,
+                                                                index["events"], len(index["errors"]),
+                                                                os.path.basename(log_file)))
+
+    def run(self):
+        if self.parsed_args.command == "query":
+            self.query()
+        else:
+            self.summary()
+
+
+bootstrap_logs = BootstrapLogs()
+bootstrap_logs.run()
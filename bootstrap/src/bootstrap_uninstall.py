@@ -1,9 +1,19 @@
 import os
+import sys
+
+from common.startup_profiler import StartupProfiler
+
+# Enabled before the other imports so their cost is measured
+StartupProfiler.enable_from_args(sys.argv)
 
 from bootstrapbase import BootstrapBase
+from common.apply_cache import ApplyCache
 from common.mapr_logger.log import Log
+from common.tracer import Tracer
 from k8s_operations import K8SOperations
 
+StartupProfiler.mark("imports")
+
 
 class BootstrapUninstall(BootstrapBase):
     def __init__(self):
@@ -13,6 +23,8 @@ class BootstrapUninstall(BootstrapBase):
     def run(self):
         super(BootstrapUninstall, self).run()
         k8s = K8SOperations(self._prompts, self.base_dir)
+        k8s.use_template_cache(self.state_dir)
+        k8s.template_values = self.get_template_values()
         self.python_check()
         self.prologue()
         self.confirm_delete_installation()
@@ -58,31 +70,45 @@ class BootstrapUninstall(BootstrapBase):
         if k8s.is_openshift_connected():
             k8s.is_openshift = True
             k8s.switch_to_oc()
+        if self.parsed_args.engine == "native":
+            k8s.use_native_client()
+        # The deleted yamls are forgotten so a later install does not skip them
+        if ApplyCache.exists(self.state_dir):
+            k8s.use_apply_cache(self.state_dir, k8s.get_cluster_identity())
+        k8s.parallel = self.parsed_args.parallel
+        k8s.fast_teardown = self.parsed_args.fast
+        k8s.max_workers = self.parsed_args.max_workers
+        k8s.delete_timeout = self.parsed_args.delete_timeout
+
+        components = list()
         if uninstall_cspaces:
-            k8s.uninstall_system_cspace_components()
+            components.append("system_cspace")
         if uninstall_storage:
-            k8s.uninstall_system_cluster_components()
+            components.append("system_cluster")
         if uninstall_spark:
-            k8s.uninstall_spark_components()
+            components.append("spark")
         if uninstall_drill:
-            k8s.uninstall_drill_components()
+            components.append("drill")
         if uninstall_config:
             if uninstall_cspaces:
-                k8s.uninstall_cspaces_configuration_components()
+                components.append("cspaces_configuration")
             if uninstall_storage:
-                k8s.uninstall_clusters_configuration_components()
+                components.append("clusters_configuration")
         if uninstall_kubeflow:
-            k8s.uninstall_kubeflow_components()
-        if uninstall_storage:
-            if uninstall_ui:
-                k8s.uninstall_ui_components()
-            if uninstall_ingress:
-                is_cloud = self.is_cloud_env()
-                k8s.uninstall_ingress_components(is_cloud)
+            components.append("kubeflow")
+        if uninstall_storage and uninstall_ui:
+            components.append("ui")
+        pending = k8s.uninstall_components(components)
+        if uninstall_storage and uninstall_ingress:
+            is_cloud = self.is_cloud_env()
+            k8s.uninstall_ingress_components(is_cloud)
         if uninstall_csi:
-            k8s.uninstall_csi_components()
+            # The CSI driver has to outlive the pods that mount its volumes
+            k8s.wait_for_deletion(pending)
+            pending = k8s.uninstall_components(["csi"])
         if uninstall_external:
-            k8s.uninstall_external_components()
+            pending.extend(k8s.uninstall_components(["external"]))
+        k8s.wait_for_deletion(pending)
         self.complete_uninstallation()
 
     def confirm_delete_installation(self):
@@ -168,6 +194,7 @@ class BootstrapUninstall(BootstrapBase):
         Log.info("")
 
 
+Tracer.trace_methods(BootstrapUninstall, ("run",), "bootstrap")
 bootstrap_uninstall = BootstrapUninstall()
 bootstrap_uninstall.run()
 BootstrapBase.exit_application(0)
@@ -5,9 +5,13 @@ from datetime import datetime
 
 from common.const import Constants
 from common.mapr_logger.log import Log
+from common.os_command import OSCommand
 from common.prompts import Prompts
+from common.startup_profiler import StartupProfiler
+from common.tracer import Tracer
 from validators.python_validator import PythonValidator
 from validators.validator import Validator
+from validators.validator_cache import ValidatorCache
 
 # TODO: This needs to be change with every public release. Hopefully we automate this in the future.
 BOOTSTRAP_BUILD_VERSION_NO = "1.0.0"
@@ -16,6 +20,7 @@ BOOTSTRAP_BUILD_VERSION_NO = "1.0.0"
 class BootstrapBase(object):
     NOW = datetime.now()
     _prompts = None
+    _json_log = None
 
     def __init__(self, is_install):
         self.prompt_mode = Prompts.PROMPT_MODE_STR
@@ -25,22 +30,32 @@ class BootstrapBase(object):
         self.is_install = is_install
         self.base_dir = os.path.dirname(os.path.abspath(__file__))
         self.script_dir = os.path.abspath(os.path.join(self.base_dir, ".."))
+        self.state_dir = os.path.join(self.script_dir, "state")
+        self.log_dir = os.path.join(self.script_dir, "logs")
         self.log_config_file = os.path.join(self.base_dir, Constants.LOGGER_CONF)
         signal.signal(signal.SIGINT, self.exit_application)
 
     def run(self):
-        logdir = os.path.join(self.script_dir, "logs")
+        logdir = self.log_dir
         if os.path.exists(logdir):
             if not os.path.isdir(logdir):
                 print("ERROR: {0} is not a directory and cannot be used as alog directory".format(logdir))
                 BootstrapBase.exit_application(1)
         else:
-            os.mkdir(logdir)
+            os.makedirs(logdir)
 
         logname = os.path.join(logdir, BootstrapBase.NOW.strftime("bootstrap-%m-%d_%H:%M:%S.log"))
-        Log.initialize(self.log_config_file, logname)
+        Log.initialize(self.log_config_file, logname, cache_dir=self.state_dir)
+        OSCommand.set_default_timeout(self.parsed_args.command_timeout)
+        OSCommand.set_max_concurrent(self.parsed_args.max_commands)
+        Validator.set_cache(ValidatorCache(self.state_dir))
+        if self.parsed_args.json_log:
+            from common.json_log import JsonLog
+            BootstrapBase._json_log = JsonLog.open(os.path.splitext(logname)[0] + ".jsonl")
+        StartupProfiler.mark("log initialization")
 
         BootstrapBase._prompts = Prompts.initialize(self.prompt_mode, self.prompt_response_file)
+        StartupProfiler.mark("prompts initialization")
         Log.info("Prompt mode: {0}, response file: {1}".format(self.prompt_mode, self.prompt_response_file))
 
     def _parse_args(self):
@@ -49,16 +64,111 @@ class BootstrapBase(object):
                                      default=self.prompt_mode, help="prompt mode ({0}, {1}, {2})".format(Prompts.PROMPT_MODE_STR, Prompts.HEADLESS_MODE_STR, Prompts.RECORD_MODE_STR))
         self.arg_parser.add_argument("-r", "--response-file", action="store",
                                      default=self.prompt_response_file, help="prompt response file")
+        self.arg_parser.add_argument("--values", action="store", default=None,
+                                     help="yaml file of values to substitute into the component yamls")
+        self.arg_parser.add_argument("--set", action="append", default=list(), metavar="KEY=VALUE",
+                                     help="value to substitute into the component yamls; may be repeated")
+        self.arg_parser.add_argument("--command-timeout", action="store", type=int, default=None,
+                                     help="seconds after which a kubectl, oc or cloud command is killed")
+        self.arg_parser.add_argument("--max-commands", action="store", type=int, default=OSCommand.DEFAULT_MAX_CONCURRENT,
+                                     help="maximum number of kubectl, oc or cloud commands that run at the same time")
+        self.arg_parser.add_argument("--trace", action="store_true", default=False,
+                                     help="record the time of every phase and command and write a Chrome trace file "
+                                          "next to the log")
+        self.arg_parser.add_argument("--json-log", action="store_true", default=False,
+                                     help="also write a JSON lines log of every phase, command and error with an index "
+                                          "that bootstraplogs.sh can search")
+        self.arg_parser.add_argument(StartupProfiler.FLAG, action="store_true", default=False,
+                                     help="report the time taken by each import and initialization step until the "
+                                          "first prompt")
+        self.arg_parser.add_argument("--log-dir", action="store", default=self.log_dir,
+                                     help="directory the log files are written to")
+        self.arg_parser.add_argument("--state-dir", action="store", default=self.state_dir,
+                                     help="directory of the caches and journal kept between runs")
+        self.arg_parser.add_argument("--engine", action="store", choices=("kubectl", "native"), default="kubectl",
+                                     help="run Kubernetes operations with kubectl or by calling the API server directly")
         if self.is_install:
             # Not intended for customer use. No guarantees given if these are set to True
             self.arg_parser.add_argument("--cloud_install", action="store_true", default=False, help=argparse.SUPPRESS)
             self.arg_parser.add_argument("--core_install", action="store_true", default=False, help=argparse.SUPPRESS)
+            self.arg_parser.add_argument("--parallel", action="store_true", default=False,
+                                         help="install independent components and yamls concurrently")
+            self.arg_parser.add_argument("--batch-apply", action="store_true", default=False,
+                                         help="apply all the yamls of a component with a single kubectl command")
+            self.arg_parser.add_argument("--max-workers", action="store", type=int, default=Constants.MAX_WORKERS,
+                                         help="maximum number of concurrent operations when --parallel is used")
+            self.arg_parser.add_argument("--rollback", action="store_true", default=False,
+                                         help="when an install phase fails delete the objects it created and stop")
+            self.arg_parser.add_argument("--journal", action="store_true", default=False,
+                                         help="record each install step in the state directory so an install that "
+                                              "fails or is killed can be continued with --resume")
+            self.arg_parser.add_argument("--resume", action="store_true", default=False,
+                                         help="skip the steps that the last install to this cluster journaled as "
+                                              "completed, when their yamls have not changed; implies --journal")
+            self.arg_parser.add_argument("--skip-unchanged", action="store_true", default=False,
+                                         help="skip the yamls that have not changed since they were last applied to "
+                                              "this cluster; objects deleted or edited outside the bootstrapper since "
+                                              "then are not repaired, so leave this out to apply every yaml")
+            self.arg_parser.add_argument("--wait-ready", action="store_true", default=False,
+                                         help="wait for the workloads of each component to be ready before continuing")
+            self.arg_parser.add_argument("--ready-timeout", action="store", type=int,
+                                         default=Constants.READY_TIMEOUT,
+                                         help="seconds to wait for the workloads of a component to be ready")
+        else:
+            self.arg_parser.add_argument("--parallel", action="store_true", default=False,
+                                         help="delete the yamls of each component concurrently without waiting for "
+                                              "finalizers and then wait for all the deleted objects at once")
+            self.arg_parser.add_argument("--fast", action="store_true", default=False,
+                                         help="delete the namespaces of the MapR components and let Kubernetes delete "
+                                              "what is in them instead of deleting each yaml")
+            self.arg_parser.add_argument("--max-workers", action="store", type=int, default=Constants.MAX_WORKERS,
+                                         help="maximum number of concurrent operations when --parallel or --fast is "
+                                              "used")
+            self.arg_parser.add_argument("--delete-timeout", action="store", type=int,
+                                         default=Constants.DELETE_TIMEOUT,
+                                         help="seconds to wait for all the deleted objects to be gone when --parallel "
+                                              "or --fast is used")
 
         self.parsed_args = self.arg_parser.parse_args()
 
+        if self.parsed_args.trace:
+            Tracer.enable()
+        self.log_dir = os.path.abspath(self.parsed_args.log_dir)
+        self.state_dir = os.path.abspath(self.parsed_args.state_dir)
         self.prompt_mode = self.parsed_args.mode
         self.prompt_response_file = self.parsed_args.response_file
         self.prompt_mode, self.prompt_response_file = Prompts.validate_commandline_options(self.prompt_mode, self.prompt_response_file)
+        StartupProfiler.mark("argument parsing")
+
+    def get_template_values(self):
+        values = dict()
+        if self.parsed_args.values is None and len(self.parsed_args.set) == 0:
+            return values
+
+        import yaml
+        if self.parsed_args.values is not None:
+            try:
+                with open(self.parsed_args.values) as fp:
+                    file_values = yaml.safe_load(fp) or dict()
+            except (IOError, yaml.YAMLError) as e:
+                Log.error("Could not read the values file {0}: {1}".format(self.parsed_args.values, str(e)))
+                BootstrapBase.exit_application(1)
+            if not isinstance(file_values, dict):
+                Log.error("The values file {0} must contain a yaml dictionary".format(self.parsed_args.values))
+                BootstrapBase.exit_application(1)
+            values.update(file_values)
+
+        for setting in self.parsed_args.set:
+            key, separator, value = setting.partition("=")
+            if separator == "" or key == "":
+                Log.error("The value '{0}' must be in the form KEY=VALUE".format(setting))
+                BootstrapBase.exit_application(1)
+            # Parsed like yaml so numbers and booleans keep their type
+            values[key] = yaml.safe_load(value)
+
+        if len(values) > 0:
+            Log.info("Substituting values for: {0}".format(", ".join(sorted(values.keys()))))
+        return values
 
     def prologue(self):
         title = os.linesep + "MapR for Kubernetes Bootstrap "
@@ -70,8 +180,7 @@ class BootstrapBase(object):
 
     @staticmethod
     def python_check():
-        python_validator = PythonValidator()
-        python_validator.collect()
+        python_validator = Validator.get_collected(PythonValidator)
 
         if python_validator.operation == Validator.OPERATION_INSTALL:
             BootstrapBase.exit_application(1)
@@ -83,6 +192,18 @@ class BootstrapBase(object):
         elif python_validator.operation != Validator.OPERATION_OK:
             BootstrapBase.exit_application(1)
 
+    @staticmethod
+    def write_trace():
+        if not Tracer.is_recording() or Log.get_log_filename() is None:
+            return
+
+        trace_file = os.path.splitext(Log.get_log_filename())[0] + ".trace.json"
+        Tracer.write_chrome_trace(trace_file)
+        Log.info(os.linesep + "Slowest operations:", True)
+        for line in Tracer.get_summary():
+            Log.info(line, True)
+        Log.info("Timing trace written to {0}".format(trace_file), True)
+
     @staticmethod
     def exit_application(signum, _=None):
         if signum == 0:
@@ -93,5 +214,12 @@ class BootstrapBase(object):
         if BootstrapBase._prompts is not None:
             BootstrapBase._prompts.write_response_file()
             BootstrapBase._prompts = None
+        # Commands run in their own process groups so they do not see the Ctrl-C themselves
+        OSCommand.cancel_all()
+        StartupProfiler.report("until exit")
+        BootstrapBase.write_trace()
+        if BootstrapBase._json_log is not None:
+            BootstrapBase._json_log.close()
+            BootstrapBase._json_log = None
         Log.close()
         exit(signum)
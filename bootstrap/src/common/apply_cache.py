@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+import threading
+
+from common.mapr_logger.log import Log
+
+
+class ApplyCache(object):
+    """
+    Remembers the content hash of every yaml key that was last applied successfully to a cluster so a re-run can
+    skip the yamls that have not changed. Entries are kept per cluster identity so switching the kubectl context
+    to a different cluster never skips anything. The file is rewritten atomically after every change.
+
+    Only the local record is checked, not the cluster, so skipping is opt-in with --skip-unchanged. Once the file
+    exists every install and uninstall keeps it up to date, even without the option, so it never holds a hash
+    that is no longer what the cluster was last given.
+    """
+    FILENAME = "apply-cache.json"
+
+    def __init__(self, state_dir, cluster_id):
+        self.filename = os.path.join(state_dir, ApplyCache.FILENAME)
+        self.cluster_id = cluster_id
+        self._lock = threading.Lock()
+        self._clusters = self._load()
+        self._entries = self._clusters.setdefault(cluster_id, dict())
+
+    @staticmethod
+    def exists(state_dir):
+        return os.path.exists(os.path.join(state_dir, ApplyCache.FILENAME))
+
+    @staticmethod
+    def hash_content(content):
+        if not isinstance(content, bytes):
+            content = content.encode("UTF-8")
+        return hashlib.sha256(content).hexdigest()
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return dict()
+        try:
+            with open(self.filename) as fp:
+                return json.load(fp)
+        except (IOError, ValueError) as e:
+            Log.warning("Ignoring the unreadable apply cache {0}: {1}".format(self.filename, str(e)))
+            return dict()
+
+    def _save(self):
+        directory = os.path.dirname(self.filename)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "w") as fp:
+            json.dump(self._clusters, fp, indent=2, sort_keys=True)
+        os.rename(temp_filename, self.filename)
+
+    def is_applied(self, key, digest):
+        with self._lock:
+            return self._entries.get(key) == digest
+
+    def record(self, key, digest):
+        with self._lock:
+            self._entries[key] = digest
+            self._save()
+
+    def forget(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
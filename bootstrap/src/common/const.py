@@ -12,3 +12,7 @@ class Constants(object):
     LDAPADMIN_PASS = "mapr"
     LDAPBIND_USER = "readonly"
     LDAPBIND_PASS = "mapr"
+    # The defaults of the command line options, kept here so parsing the arguments imports nothing else
+    MAX_WORKERS = 8
+    READY_TIMEOUT = 600
+    DELETE_TIMEOUT = 600
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+
+try:
+    import Queue as queue  # Python 2
+except ImportError:
+    import queue  # Python 3
+
+from common.mapr_logger.log import Log
+from mapr_exceptions.ex import InstallException
+
+
+class DependencyGraph(object):
+    """
+    A directed acyclic graph of named actions. Each action runs once all of the actions it depends on have
+    succeeded. Actions return True for success like the K8SOperations run_* methods. If an action fails
+    every action that depends on it (directly or not) is skipped.
+    """
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+    def __init__(self):
+        self._actions = OrderedDict()
+        self._depends_on = dict()
+        self._dependents = dict()
+
+    def add_node(self, name, action, *args):
+        if name in self._actions:
+            raise InstallException("The node '{0}' is already in the dependency graph".format(name))
+        self._actions[name] = (action, args)
+        self._depends_on[name] = set()
+        self._dependents[name] = set()
+
+    def has_node(self, name):
+        return name in self._actions
+
+    def get_nodes(self):
+        return list(self._actions.keys())
+
+    def add_dependency(self, name, depends_on):
+        if name not in self._actions or depends_on not in self._actions:
+            raise InstallException("Both '{0}' and '{1}' must be nodes in the dependency graph".format(name, depends_on))
+        if name == depends_on:
+            return
+        self._depends_on[name].add(depends_on)
+        self._dependents[depends_on].add(name)
+
+    def get_dependencies(self, name):
+        return set(self._depends_on[name])
+
+    def get_levels(self):
+        """
+        Group the nodes into levels where each node only depends on nodes in earlier levels. Nodes in the same
+        level are independent of each other. Insertion order is kept inside each level.
+        """
+        remaining = dict((name, len(deps)) for name, deps in self._depends_on.items())
+        levels = list()
+        current = [name for name in self._actions if remaining[name] == 0]
+
+        while len(current) > 0:
+            levels.append(current)
+            next_level = list()
+            for name in current:
+                for dependent in self._dependents[name]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        next_level.append(dependent)
+            current = [name for name in self._actions if name in next_level]
+
+        if sum(len(level) for level in levels) != len(self._actions):
+            cycle = [name for name, count in remaining.items() if count > 0]
+            raise InstallException("The dependency graph has a cycle between: {0}".format(", ".join(sorted(cycle))))
+
+        return levels
+
+    def run(self, pool):
+        """
+        Run all actions on the supplied WorkerPool and return a dict of node name to SUCCEEDED, FAILED or SKIPPED
+        """
+        # Validates there are no cycles before anything is started
+        self.get_levels()
+
+        results = dict()
+        remaining = dict((name, len(deps)) for name, deps in self._depends_on.items())
+        completed = queue.Queue()
+        running = 0
+
+        for name in self._actions:
+            if remaining[name] == 0:
+                self._start(pool, completed, name)
+                running += 1
+
+        while running > 0:
+            name, task = completed.get()
+            running -= 1
+
+            if task.failed() or not task.result:
+                results[name] = DependencyGraph.FAILED
+                self._skip_dependents(name, results)
+                continue
+
+            results[name] = DependencyGraph.SUCCEEDED
+            for dependent in self._dependents[name]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0 and dependent not in results:
+                    self._start(pool, completed, dependent)
+                    running += 1
+
+        return results
+
+    def _start(self, pool, completed, name):
+        action, args = self._actions[name]
+        pool.submit_with_callback(lambda task: completed.put((name, task)), action, *args)
+
+    def _skip_dependents(self, failed_name, results):
+        pending = list(self._dependents[failed_name])
+        while len(pending) > 0:
+            name = pending.pop()
+            if name in results:
+                continue
+            Log.error("Skipping {0} because {1} did not complete".format(name, failed_name))
+            results[name] = DependencyGraph.SKIPPED
+            pending.extend(self._dependents[name])
@@ -1,19 +1,22 @@
+from common.yaml_template import TemplateCache
 
 
 class FileUtils(object):
     """
-    Find an occurance of a yaml key in a file and replace the value for that key.
+    Find every occurance of the yaml keys in a file and replace the values for those keys.
     filename - the yaml file to load the contents of to check for replacements
-    replace_dict - keys/values of where the key is also the key in the yaml file and value is the replacement
+    replace_dict - keys/values of where the key is also the key in the yaml file and value is the replacement. A key
+                   can also be a dotted path such as metadata.namespace to only match that path.
 
-    return the new file name and if the file has changed or is the original file
+    return the rendered yaml text and if it is different from the contents of the file. No files are written; the
+    substitution plan of each file is compiled once and kept in the template cache.
     """
+    _template_cache = TemplateCache()
+
     @staticmethod
-    def replace_yaml_value(filename, replace_dict):
-        # 1) open with PyYAML
-        # 2) try and find all keys in replace_dict and replace the value
-        # 3) write new yaml file to a new file
-        # 4) return full path to new yaml file
+    def set_template_cache(template_cache):
+        FileUtils._template_cache = template_cache
 
-        # TODO: Don't return original file name, return the temporary one
-        return filename, False
+    @staticmethod
+    def replace_yaml_value(filename, replace_dict):
+        return FileUtils._template_cache.render(filename, replace_dict)
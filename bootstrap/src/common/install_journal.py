@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+import time
+
+from common.mapr_logger.log import Log
+
+
+class InstallJournal(object):
+    """
+    A record of every step of the current install, written as it happens so it survives the install being killed.
+    Each step is appended as one JSON line with the cluster identity, the content hash and the result and the file
+    is synced to disk before the install moves on. A resumed install skips the steps that completed on the same
+    cluster with the same content; anything else is done again. A new install that is not resumed starts a new
+    journal.
+
+    The journal is only kept with --journal or --resume. The file is opened for each step and closed again so
+    nothing is left open however the install exits.
+    """
+    FILENAME = "install-journal.jsonl"
+
+    def __init__(self, state_dir, cluster_id, resume=False):
+        self.filename = os.path.join(state_dir, InstallJournal.FILENAME)
+        self.cluster_id = cluster_id
+        self._lock = threading.Lock()
+        if resume:
+            self._truncate_partial_line()
+        self._completed = self._load() if resume else dict()
+        if not os.path.exists(state_dir):
+            os.makedirs(state_dir)
+        if not resume:
+            open(self.filename, "w").close()
+
+    def _truncate_partial_line(self):
+        """
+        Cut off the last line when an install was killed while writing it, so the steps appended by the resumed
+        install start on a line of their own
+        """
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, "rb+") as fp:
+            content = fp.read()
+            if len(content) == 0 or content.endswith(b"\n"):
+                return
+            Log.warning("Ignoring the partial last step of the install journal {0}".format(self.filename))
+            fp.truncate(content.rfind(b"\n") + 1)
+
+    def _load(self):
+        completed = dict()
+        if not os.path.exists(self.filename):
+            return completed
+        with open(self.filename) as fp:
+            for line in fp:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    Log.warning("Ignoring an unreadable step of the install journal {0}".format(self.filename))
+                    continue
+                if entry.get("cluster") != self.cluster_id:
+                    continue
+                if entry.get("result"):
+                    completed[entry["step"]] = entry.get("digest")
+                else:
+                    completed.pop(entry["step"], None)
+        return completed
+
+    def get_completed_count(self):
+        with self._lock:
+            return len(self._completed)
+
+    def is_completed(self, step, digest):
+        with self._lock:
+            return step in self._completed and self._completed[step] == digest
+
+    def record(self, step, digest, result):
+        entry = {"time": time.time(), "cluster": self.cluster_id, "step": step, "digest": digest,
+                 "result": bool(result)}
+        line = json.dumps(entry, sort_keys=True) + "\n"
+        with self._lock:
+            if result:
+                self._completed[step] = digest
+            else:
+                self._completed.pop(step, None)
+            with open(self.filename, "a") as fp:
+                fp.write(line)
+                fp.flush()
+                os.fsync(fp.fileno())
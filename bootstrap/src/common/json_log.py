@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from common.mapr_logger.log import Log
+from common.tracer import Tracer
+
+
+class JsonLogIndex(object):
+    """
+    The sidecar index of a JSON log. It holds the byte offsets of the events of every phase, yaml key and command
+    and of every error so a query can seek straight to the matching lines instead of reading the whole log. The
+    index records the size of the log it describes; a log without a matching index, such as one from a run that
+    crashed, is indexed by scanning it once.
+    """
+    VERSION = 1
+    SECTIONS = (("phase", "phases"), ("key", "keys"), ("command", "commands"))
+    ERROR_LEVELS = ("ERROR", "CRITICAL")
+
+    @staticmethod
+    def new():
+        return {"version": JsonLogIndex.VERSION, "events": 0, "size": 0, "started": None, "ended": None,
+                "phases": dict(), "keys": dict(), "commands": dict(), "errors": list()}
+
+    @staticmethod
+    def is_error(event):
+        if event.get("type") == "command":
+            return event.get("status") != 0
+        return event.get("error") is not None or event.get("level") in JsonLogIndex.ERROR_LEVELS
+
+    @staticmethod
+    def add(index, offset, event):
+        index["events"] += 1
+        if index["started"] is None:
+            index["started"] = event.get("time")
+        for field, section in JsonLogIndex.SECTIONS:
+            value = event.get(field)
+            if value is not None:
+                index[section].setdefault(value, list()).append(offset)
+        if JsonLogIndex.is_error(event):
+            index["errors"].append(offset)
+
+    @staticmethod
+    def get_filename(log_filename):
+        return os.path.splitext(log_filename)[0] + ".index.json"
+
+    @staticmethod
+    def save(index, filename):
+        temp_filename = filename + ".tmp"
+        with open(temp_filename, "w") as fp:
+            json.dump(index, fp, sort_keys=True)
+        os.rename(temp_filename, filename)
+
+    @staticmethod
+    def build(log_filename):
+        index = JsonLogIndex.new()
+        with open(log_filename, "rb") as fp:
+            offset = 0
+            for line in fp:
+                try:
+                    event = json.loads(line.decode("UTF-8"))
+                except ValueError:
+                    # The last line of a log whose run was killed can be partial
+                    break
+                JsonLogIndex.add(index, offset, event)
+                # Spans are written when they finish, so a run ended when its last span did
+                if event.get("time") is not None:
+                    ended = event["time"] + (event.get("duration") or 0)
+                    index["ended"] = max(index["ended"] or ended, ended)
+                offset += len(line)
+        index["size"] = offset
+        return index
+
+    @staticmethod
+    def load(log_filename):
+        index_filename = JsonLogIndex.get_filename(log_filename)
+        if os.path.exists(index_filename):
+            try:
+                with open(index_filename) as fp:
+                    index = json.load(fp)
+                if index.get("version") == JsonLogIndex.VERSION and \
+                        index.get("size") == os.path.getsize(log_filename):
+                    return index
+            except (IOError, ValueError):
+                pass
+        return JsonLogIndex.build(log_filename)
+
+    @staticmethod
+    def _matching_offsets(section, pattern):
+        # A pattern matches any name that contains it, so "install_csi" finds K8SOperations.install_csi_components
+        offsets = set()
+        for name, name_offsets in section.items():
+            if pattern in name:
+                offsets.update(name_offsets)
+        return offsets
+
+    @staticmethod
+    def query(log_filename, phase=None, key=None, command=None, errors=False):
+        """
+        Return the events of the log that match every filter that is given, in the order they were written
+        """
+        index = JsonLogIndex.load(log_filename)
+        selected = None
+        for pattern, section in ((phase, "phases"), (key, "keys"), (command, "commands")):
+            if pattern is not None:
+                offsets = JsonLogIndex._matching_offsets(index[section], pattern)
+                selected = offsets if selected is None else selected & offsets
+        if errors:
+            offsets = set(index["errors"])
+            selected = offsets if selected is None else selected & offsets
+
+        events = list()
+        with open(log_filename, "rb") as fp:
+            if selected is None:
+                for line in fp:
+                    events.append(json.loads(line.decode("UTF-8")))
+            else:
+                for offset in sorted(selected):
+                    fp.seek(offset)
+                    events.append(json.loads(fp.readline().decode("UTF-8")))
+        return events
+
+
+class JsonLog(object):
+    """
+    A JSON lines log written next to the text log when the bootstrapper is run with --json-log. Every command,
+    install phase, cloud step, warning and error is written as one JSON object with its phase, yaml key, command,
+    status and duration. The sidecar index is written when the log is closed.
+    """
+    SPAN_CATEGORIES = ("bootstrap", "phase", "cloud", "command")
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._index = JsonLogIndex.new()
+        self._fp = open(filename, "ab")
+
+    @staticmethod
+    def open(filename):
+        """
+        Open the log and register it for spans and log messages. Spans are needed for the phase and key of each
+        event so tracing is enabled, without recording the spans.
+        """
+        json_log = JsonLog(filename)
+        Tracer.enable(record=False)
+        Tracer.add_listener(json_log.on_span)
+        Log.add_event_listener(json_log.on_log)
+        return json_log
+
+    def on_span(self, span):
+        if span.category not in JsonLog.SPAN_CATEGORIES:
+            return
+        phase, key = Tracer.get_context(span)
+        event = {"time": span.start, "type": span.category, "phase": phase, "key": key,
+                 "duration": round(span.get_duration(), 3)}
+        if span.category == "command":
+            event["command"] = span.name
+            event["status"] = span.args.get("status")
+        else:
+            event["operation"] = span.name
+            if "target" in span.args:
+                event["target"] = span.args["target"]
+            if "error" in span.args:
+                event["error"] = span.args["error"]
+        self.write(event)
+
+    def on_log(self, level, msg):
+        phase, key = Tracer.get_context(Tracer.current())
+        self.write({"time": time.time(), "type": "log", "level": logging.getLevelName(level), "phase": phase,
+                    "key": key, "message": msg})
+
+    def write(self, event):
+        line = (json.dumps(event, sort_keys=True) + "\n").encode("UTF-8")
+        with self._lock:
+            if self._fp is None:
+                return
+            offset = self._fp.tell()
+            self._fp.write(line)
+            # Flushed per event so the log of a run that crashes can still be indexed and searched
+            self._fp.flush()
+            JsonLogIndex.add(self._index, offset, event)
+
+    def close(self):
+        with self._lock:
+            if self._fp is None:
+                return
+            self._index["size"] = self._fp.tell()
+            self._index["ended"] = time.time()
+            self._fp.close()
+            self._fp = None
+        JsonLogIndex.save(self._index, JsonLogIndex.get_filename(self.filename))
@@ -0,0 +1,89 @@
+
+class ManifestObject(object):
+    def __init__(self, kind, name, namespace=None, api_version=None):
+        self.kind = kind
+        self.name = name
+        self.namespace = namespace
+        self.api_version = api_version
+
+    def to_reference(self):
+        # Just enough of the object for the native client to find it by path
+        metadata = {"name": self.name}
+        if self.namespace is not None:
+            metadata["namespace"] = self.namespace
+        return {"apiVersion": self.api_version, "kind": self.kind, "metadata": metadata}
+
+    def __str__(self):
+        if self.namespace is None:
+            return "{0}/{1}".format(self.kind, self.name)
+        return "{0}/{1} in {2}".format(self.kind, self.name, self.namespace)
+
+
+class Manifest(object):
+    """
+    The Kubernetes objects described by one prereq yaml file, or by its rendered content when values were
+    substituted. The yaml is only parsed the first time the objects are needed.
+    """
+    # The order that kinds need to be created in. Namespaces first, then the things that live in them or are
+    # referenced by bindings, then the bindings and finally the workloads that run as the service accounts.
+    # Any kind not listed here is treated as a workload.
+    NAMESPACE_RANK = 0
+    DEFINITION_RANK = 1
+    BINDING_RANK = 2
+    WORKLOAD_RANK = 3
+    KIND_RANKS = {
+        "Namespace": NAMESPACE_RANK,
+        "CustomResourceDefinition": DEFINITION_RANK,
+        "PriorityClass": DEFINITION_RANK,
+        "StorageClass": DEFINITION_RANK,
+        "PodSecurityPolicy": DEFINITION_RANK,
+        "ClusterRole": DEFINITION_RANK,
+        "Role": DEFINITION_RANK,
+        "ServiceAccount": DEFINITION_RANK,
+        "Secret": DEFINITION_RANK,
+        "ConfigMap": DEFINITION_RANK,
+        "ClusterRoleBinding": BINDING_RANK,
+        "RoleBinding": BINDING_RANK,
+        # The Openshift policy commands that follow an SCC bind it to service accounts
+        "SecurityContextConstraints": BINDING_RANK
+    }
+    # The kinds in the prereq yamls that are not in a namespace even when their metadata names one
+    CLUSTER_KINDS = ("Namespace", "CustomResourceDefinition", "PriorityClass", "StorageClass", "PodSecurityPolicy",
+                     "ClusterRole", "ClusterRoleBinding", "SecurityContextConstraints")
+
+    def __init__(self, key, filename, content=None):
+        self.key = key
+        self.filename = filename
+        self.content = content
+        self._objects = None
+
+    def _load(self):
+        import yaml
+        if self.content is not None:
+            return list(yaml.safe_load_all(self.content))
+        with open(self.filename) as fp:
+            return list(yaml.safe_load_all(fp))
+
+    def get_objects(self):
+        if self._objects is None:
+            objects = list()
+            for document in self._load():
+                if not document:
+                    continue
+                metadata = document.get("metadata", dict())
+                objects.append(ManifestObject(document.get("kind"), metadata.get("name"),
+                                              metadata.get("namespace"), document.get("apiVersion")))
+            self._objects = objects
+        return self._objects
+
+    def get_rank(self):
+        objects = self.get_objects()
+        if len(objects) == 0:
+            return Manifest.WORKLOAD_RANK
+        return min(Manifest.KIND_RANKS.get(obj.kind, Manifest.WORKLOAD_RANK) for obj in objects)
+
+    def get_namespaces(self):
+        return set(obj.namespace for obj in self.get_objects() if obj.namespace is not None)
+
+    def get_created_namespaces(self):
+        return set(obj.name for obj in self.get_objects() if obj.kind == "Namespace")
@@ -4,21 +4,40 @@ try:
     from StringIO import StringIO  # Python 2
 except ImportError:
     from io import StringIO  # Python 3
+try:
+    import queue  # Python 3
+except ImportError:
+    import Queue as queue  # Python 2
+import atexit
+import json
 import logging
 import logging.config
+import logging.handlers
 import os
 import stat
 import sys
+import threading
 import traceback
 
-import yaml
-
 
 class LogException(Exception):
     def __init__(self, value):
         Exception.__init__(self, value)
 
 
+if hasattr(logging.handlers, "QueueHandler"):
+    class _RecordQueueHandler(logging.handlers.QueueHandler):
+        """
+        Puts records on the queue as they are. The listener runs in this process so nothing has to be formatted
+        or pickled on the calling thread; the file handler formats the record on the listener thread.
+        """
+        def prepare(self, record):
+            return record
+else:
+    # Python 2 has no queue handler so records are written to the file on the calling thread
+    _RecordQueueHandler = None
+
+
 class Log(object):
     CRITICAL = logging.CRITICAL
     FATAL = logging.FATAL
@@ -32,7 +51,10 @@ class Log(object):
 
     # Needed to compare the name of this file to the method that iterates over
     # the call stack to get the correct calling method
-    STACK_EXCLUDE = "common/mapr_logger/Log.py"
+    STACK_EXCLUDE = os.path.normcase(os.path.join("common", "mapr_logger", "log.py"))
+    # The formatter fields that need the caller's frame. The frame is only looked up when a formatter uses one
+    CALLER_FIELDS = ("%(pathname)", "%(filename)", "%(module)", "%(lineno)", "%(funcName)")
+    UNKNOWN_CALLER = ("(unknown file)", 0, "(unknown function)")
     NOT_INITIALIZED = "Log is not initialized: %s: %s"
     ALREADY_INITIALIZED = "The logger is already initialized."
     NO_CONFIGFILE = "A configuration file must be specified during log initialization."
@@ -40,16 +62,24 @@ class Log(object):
     NO_CONSOLE_LEVEL = "The console level must not be None."
     CONSOLE_LEVEL_INT = "The console level specified must be an integer or one of the predefined logger constants " \
                         "for example: logging.INFO."
+    # The parsed logging configuration is kept as JSON in the cache directory so yaml is not imported at startup
+    CONFIG_CACHE = "logger-config.json"
 
     _log_filename = None
     _file_logger = None
     _console_logger = None
     _console_level = logging.NOTSET
-    _warning_count = None
-    _error_count = None
+    _min_level = logging.NOTSET
+    _needs_caller = True
+    _listener = None
+    _event_listeners = list()
+    _warning_count = 0
+    _error_count = 0
+    # Installs can run on worker threads so console lines and the counters are updated under a lock
+    _lock = threading.Lock()
 
     @staticmethod
-    def initialize(config_filename, log_filename, file_level=None, console_level=None, rollover=True):
+    def initialize(config_filename, log_filename, file_level=None, console_level=None, rollover=True, cache_dir=None):
         if Log._file_logger is not None:
             raise LogException(Log.ALREADY_INITIALIZED)
 
@@ -61,8 +91,7 @@ class Log(object):
         if not os.path.exists(config_filename):
             raise LogException(Log.CONFIGFILE_NO_EXIST % os.path.abspath(config_filename))
 
-        with open(config_filename) as fp:
-            logger_config = yaml.load(fp)
+        logger_config = Log._load_config(config_filename, cache_dir)
 
         # user might not override the level
         if file_level is not None:
@@ -80,10 +109,85 @@ class Log(object):
 
         Log._file_logger = logging.getLogger('fileLogger')
         # Log._console_logger = logging.getLogger('consoleLogger')
+        handlers = list(Log._file_logger.handlers)
+        Log._min_level = min([handler.level for handler in handlers] or [logging.NOTSET])
+        Log._needs_caller = any(Log._uses_caller(handler.formatter) for handler in handlers)
+        Log._start_listener(handlers)
         Log._log_filename = log_filename
         Log._warning_count = 0
         Log._error_count = 0
 
+    @staticmethod
+    def _uses_caller(formatter):
+        fmt = getattr(formatter, "_fmt", None) or ""
+        return any(field in fmt for field in Log.CALLER_FIELDS)
+
+    @staticmethod
+    def _start_listener(handlers):
+        """
+        Move the file logger's handlers behind a queue so the file is written by a background thread
+        """
+        if _RecordQueueHandler is None or len(handlers) == 0:
+            return
+
+        records = queue.Queue()
+        for handler in handlers:
+            Log._file_logger.removeHandler(handler)
+        Log._file_logger.addHandler(_RecordQueueHandler(records))
+        Log._listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        Log._listener.start()
+
+    @staticmethod
+    def _stop_listener():
+        # Blocks until every queued record is written
+        listener = Log._listener
+        Log._listener = None
+        if listener is not None:
+            listener.stop()
+
+    @staticmethod
+    def _load_config(config_filename, cache_dir):
+        stat_result = os.stat(config_filename)
+        stamp = [os.path.abspath(config_filename), stat_result.st_size, stat_result.st_mtime]
+        cache_filename = None if cache_dir is None else os.path.join(cache_dir, Log.CONFIG_CACHE)
+        if cache_filename is not None and os.path.exists(cache_filename):
+            try:
+                with open(cache_filename) as fp:
+                    cached = json.load(fp)
+                if cached.get("stamp") == stamp:
+                    return cached["config"]
+            except (IOError, ValueError, KeyError):
+                pass
+
+        import yaml
+        # The configuration names logging constants with python/name tags so it needs a loader that resolves them;
+        # the C loaders are used when PyYAML was built with libyaml
+        loader = getattr(yaml, "CUnsafeLoader", None) or getattr(yaml, "UnsafeLoader", None) or \
+            getattr(yaml, "CLoader", None) or yaml.Loader
+        with open(config_filename) as fp:
+            logger_config = yaml.load(fp, Loader=loader)
+
+        if cache_filename is not None:
+            try:
+                if not os.path.exists(cache_dir):
+                    os.makedirs(cache_dir)
+                temp_filename = cache_filename + ".tmp"
+                with open(temp_filename, "w") as fp:
+                    json.dump({"stamp": stamp, "config": logger_config}, fp)
+                os.rename(temp_filename, cache_filename)
+            except (IOError, OSError, TypeError):
+                # The cache only saves time; the configuration is parsed again next time
+                pass
+        return logger_config
+
+    @staticmethod
+    def add_event_listener(listener):
+        """
+        Call the listener with the level and message of every warning and error, for example to copy them to the
+        JSON log
+        """
+        Log._event_listeners.append(listener)
+
     @staticmethod
     def get_log_filename():
         return Log._log_filename
@@ -98,7 +202,10 @@ class Log(object):
 
     @staticmethod
     def close():
+        # The queue is drained before the handlers are closed and the log is made read only
+        Log._stop_listener()
         logging.shutdown()
+        Log._event_listeners = list()
         Log._file_logger = None
         Log._console_logger = None
         Log._warning_count = 0
@@ -118,7 +225,7 @@ class Log(object):
     @staticmethod
     def info(msg, stdout=False, *args, **kwargs):
         if stdout:
-            print(msg)
+            Log._print(msg)
         Log._log(logging.INFO, msg, args, **kwargs)
 
     @staticmethod
@@ -127,28 +234,37 @@ class Log(object):
 
     @staticmethod
     def warning(msg, *args, **kwargs):
-        print("WARNING: {0}".format(msg))
+        Log._print("WARNING: {0}".format(msg))
         Log._log(logging.WARNING, msg, args, **kwargs)
-        Log._warning_count += 1
+        with Log._lock:
+            Log._warning_count += 1
 
     @staticmethod
     def error(msg, *args, **kwargs):
-        print("ERROR: {0}".format(msg))
+        Log._print("ERROR: {0}".format(msg))
         Log._log(logging.ERROR, msg, args, **kwargs)
-        Log._error_count += 1
+        with Log._lock:
+            Log._error_count += 1
 
     @staticmethod
     def critical(msg, *args, **kwargs):
-        print("CRITICAL: {0}".format(msg))
+        Log._print("CRITICAL: {0}".format(msg))
         Log._log(logging.CRITICAL, msg, args, **kwargs)
-        Log._error_count += 1
+        with Log._lock:
+            Log._error_count += 1
 
     @staticmethod
     def exception(msg, *args, **kwargs):
         kwargs['exc_info'] = 1
-        print("EXCEPTION: {0}".format(msg))
+        Log._print("EXCEPTION: {0}".format(msg))
         Log._log(logging.ERROR, msg, args, **kwargs)
-        Log._error_count += 1
+        with Log._lock:
+            Log._error_count += 1
+
+    @staticmethod
+    def _print(msg):
+        with Log._lock:
+            print(msg)
 
     @staticmethod
     def get_error_count():
@@ -167,7 +283,7 @@ class Log(object):
         f = Log._currentframe()
         if f is not None:
             f = f.f_back
-        rv = "(unknown file)", 0, "(unknown function)"
+        rv = Log.UNKNOWN_CALLER
         while hasattr(f, "f_code"):
             co = f.f_code
             filename = os.path.normcase(co.co_filename)
@@ -181,6 +297,8 @@ class Log(object):
     @staticmethod
     def _currentframe():
         """Return the frame object for the caller's stack frame."""
+        if hasattr(sys, "_getframe"):
+            return sys._getframe(1)
         # noinspection PyBroadException
         try:
             raise Exception
@@ -189,7 +307,14 @@ class Log(object):
 
     @staticmethod
     def _log(level, msg, args, exc_info=None, extra=None):
+        # Messages below the level of every handler are dropped before any work is done on them
+        if Log._file_logger is not None and Log._console_logger is None and level < Log._min_level:
+            return
+
         msg = msg.strip(' \n')
+        if level >= logging.WARNING:
+            for listener in Log._event_listeners:
+                listener(level, msg)
 
         if exc_info:
             if not isinstance(exc_info, tuple):
@@ -208,7 +333,7 @@ class Log(object):
                 print(Log.NOT_INITIALIZED % (logging.getLevelName(level), msg))
 
         """Log the message to the logger(s)"""
-        fn, lno, func = Log._find_caller()
+        fn, lno, func = Log._find_caller() if Log._needs_caller else Log.UNKNOWN_CALLER
 
         if Log._file_logger is not None:
             record = Log._file_logger.makeRecord(Log._file_logger.name, level,
@@ -232,3 +357,7 @@ class Log(object):
                                                     level, fn, lno, msg, args,
                                                     exc_info, func, extra)
             Log._console_logger.handle(record)
+
+
+# Records still queued when the bootstrapper exits without calling close() are written before logging shuts down
+atexit.register(Log._stop_listener)
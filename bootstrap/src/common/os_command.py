@@ -1,18 +1,61 @@
+import os
+import signal
 import subprocess
+import sys
+import threading
 
 from common.mapr_logger.log import Log
+from common.tracer import Tracer
+from common.worker_pool import WorkerPool
 
 
 class OSCommand(object):
+    """
+    Runs shell commands. Each command runs in its own process group so a timeout or cancel_all() kills the
+    command and everything it started, not just the shell. The number of commands running at once across all
+    threads is bounded by a semaphore.
+
+    This is thread based rather than asyncio based because the bootstrapper still supports Python 2.7. Commands
+    are overlapped by calling run2 from WorkerPool threads, see run_many.
+    """
+    TIMEOUT_STATUS = 124
+    CANCELLED_STATUS = 130
+    DEFAULT_MAX_CONCURRENT = 16
+
+    default_timeout = None
+    max_concurrent = DEFAULT_MAX_CONCURRENT
+    _semaphore = threading.BoundedSemaphore(DEFAULT_MAX_CONCURRENT)
+    _processes = set()
+    _processes_lock = threading.Lock()
+    _cancelled = False
+
+    @staticmethod
+    def set_max_concurrent(max_concurrent):
+        OSCommand.max_concurrent = max(max_concurrent, 1)
+        OSCommand._semaphore = threading.BoundedSemaphore(OSCommand.max_concurrent)
+
+    @staticmethod
+    def set_default_timeout(timeout):
+        OSCommand.default_timeout = timeout
+
     @staticmethod
     def run(statements):
         response, status = OSCommand.run2(statements)
         return response
 
     @staticmethod
-    def run2(statements, username=None, use_nohup=False, out_file=None, in_background=False, users_env=False):
+    def run2(statements, username=None, use_nohup=False, out_file=None, in_background=False, users_env=False,
+             input_data=None, timeout=None, on_line=None):
+        """
+        timeout - seconds before the command is killed; defaults to OSCommand.default_timeout. A command that is
+                  killed returns TIMEOUT_STATUS.
+        on_line - called with each line of output as soon as it is read. The output is then logged line by line
+                  instead of all at once when the command ends.
+        """
         if isinstance(statements, str):
             statements = [statements]
+        if timeout is None:
+            timeout = OSCommand.default_timeout
 
         responses = ''
         status = 0
@@ -37,12 +80,13 @@ class OSCommand(object):
                 new_statement += ' &'
 
             Log.debug('RUN: %s' % new_statement)
+            if input_data is not None:
+                # The input is written to the command's stdin, for example a yaml stream for 'kubectl apply -f -'
+                if not isinstance(input_data, (bytes, bytearray)):
+                    input_data = input_data.encode("UTF-8")
+                Log.debug('STDIN: %d bytes' % len(input_data))
 
-            process = subprocess.Popen('%s 2>&1' % new_statement, shell=True, stdout=subprocess.PIPE)
-            response = process.stdout.read()
-            # process.wait will only return None if the process hasn't terminated. We don't
-            # need to check for None here
-            status = process.wait()
+            response, status = OSCommand._execute(new_statement, input_data, timeout, on_line)
 
             if len(response) == 0:
                 response = '<no response>'
@@ -51,7 +95,8 @@ class OSCommand(object):
                 if not isinstance(response, str) and isinstance(response, (bytes, bytearray)):
                     response = response.decode("UTF-8")
             Log.debug('STATUS: %s' % str(status))
-            Log.debug('RESPONSE: %s' % response)
+            if on_line is None:
+                Log.debug('RESPONSE: %s' % response)
 
             responses += response
 
@@ -60,6 +105,153 @@ class OSCommand(object):
 
         return responses, status
 
+    @staticmethod
+    def _popen(statement, has_input):
+        kwargs = dict()
+        if os.name == "posix":
+            if sys.version_info >= (3, 2):
+                kwargs["start_new_session"] = True
+            else:
+                kwargs["preexec_fn"] = os.setsid
+        return subprocess.Popen('%s 2>&1' % statement, shell=True, bufsize=-1, stdout=subprocess.PIPE,
+                                stdin=subprocess.PIPE if has_input else None, **kwargs)
+
+    @staticmethod
+    def _span_name(statement):
+        # Only the command and its sub commands name the span; the arguments can hold passwords
+        words = list()
+        for word in statement.split():
+            if word.startswith("-") or len(words) == 3:
+                break
+            words.append(word)
+        return " ".join(words)
+
+    @staticmethod
+    def _execute(statement, input_data, timeout, on_line):
+        with Tracer.span(OSCommand._span_name(statement), "command") as span:
+            response, status = OSCommand._execute_process(statement, input_data, timeout, on_line)
+            span.set("status", status)
+            span.set("output_bytes", len(response))
+            if input_data is not None:
+                span.set("input_bytes", len(input_data))
+        return response, status
+
+    @staticmethod
+    def _execute_process(statement, input_data, timeout, on_line):
+        with OSCommand._semaphore:
+            if OSCommand._cancelled:
+                return 'Cancelled before it started', OSCommand.CANCELLED_STATUS
+
+            process = OSCommand._popen(statement, input_data is not None)
+            with OSCommand._processes_lock:
+                OSCommand._processes.add(process)
+
+            timed_out = threading.Event()
+            timer = None
+            if timeout is not None:
+                timer = threading.Timer(timeout, OSCommand._expire, (process, timed_out))
+                timer.daemon = True
+                timer.start()
+
+            # stdin is written by its own thread so a command that writes a lot of output before reading all of its
+            # input cannot deadlock with us
+            writer = None
+            if input_data is not None:
+                writer = threading.Thread(target=OSCommand._write_input, args=(process, input_data))
+                writer.daemon = True
+                writer.start()
+
+            lines = list()
+            try:
+                for line in iter(process.stdout.readline, b''):
+                    lines.append(line)
+                    if on_line is not None:
+                        if not isinstance(line, str):
+                            line = line.decode("UTF-8", "replace")
+                        line = line.rstrip("\r\n")
+                        Log.debug('OUTPUT: %s' % line)
+                        on_line(line)
+                # process.wait will only return None if the process hasn't terminated. We don't
+                # need to check for None here
+                status = process.wait()
+                if writer is not None:
+                    writer.join()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                process.stdout.close()
+                with OSCommand._processes_lock:
+                    OSCommand._processes.discard(process)
+
+        response = b''.join(lines)
+        if timed_out.is_set():
+            Log.error('Command timed out after %s seconds: %s' % (str(timeout), statement))
+            status = OSCommand.TIMEOUT_STATUS
+        elif OSCommand._cancelled and status < 0:
+            status = OSCommand.CANCELLED_STATUS
+        return response, status
+
+    @staticmethod
+    def _write_input(process, input_data):
+        try:
+            process.stdin.write(input_data)
+        except (IOError, OSError):
+            # The command exited without reading all of its input. Its status reports the problem
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except (IOError, OSError):
+                pass
+
+    @staticmethod
+    def _expire(process, timed_out):
+        timed_out.set()
+        OSCommand._kill(process)
+
+    @staticmethod
+    def _kill(process):
+        try:
+            if os.name == "posix":
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except OSError:
+            # The process already exited
+            pass
+
+    @staticmethod
+    def cancel_all():
+        """
+        Kill every running command and stop new ones from starting. Used when the bootstrapper is exiting.
+        """
+        OSCommand._cancelled = True
+        with OSCommand._processes_lock:
+            processes = list(OSCommand._processes)
+        for process in processes:
+            OSCommand._kill(process)
+
+    @staticmethod
+    def run_many(statements, timeout=None, max_workers=WorkerPool.DEFAULT_MAX_WORKERS):
+        """
+        Run independent statements concurrently and return a (response, status) tuple for each in the same order.
+        A statement that could not be run at all has the error as its response.
+        """
+        if len(statements) == 0:
+            return list()
+
+        with WorkerPool(min(max_workers, len(statements)), "command") as pool:
+            tasks = pool.map(lambda statement: OSCommand.run2(statement, timeout=timeout), statements)
+        results = list()
+        for statement, task in zip(statements, tasks):
+            if task.failed():
+                error = str(task.exc_info[1]) or task.exc_info[0].__name__
+                Log.error("Could not run {0}: {1}".format(statement, error))
+                results.append((error, 1))
+            else:
+                results.append(task.result)
+        return results
+
     @staticmethod
     def run2_nolog(statements):
         if isinstance(statements, str):
@@ -10,6 +10,8 @@ import sys
 
 from common.mapr_logger.log import Log
 from common.parser import Parser
+from common.startup_profiler import StartupProfiler
+from common.tracer import Tracer
 from mapr_exceptions.ex import InstallPromptException, InstallException
 
 
@@ -116,6 +118,7 @@ class Prompts(object):
             self.response_file.close()
 
     def prompt(self, prompt, default=None, password=False, newline=False, key_name=None):
+        StartupProfiler.report()
         self.check_prompt_key(key_name)
 
         if self.mode == Prompts.HEADLESS_MODE:
@@ -322,3 +325,6 @@ class Prompts(object):
     def get_pass(prompt):
         passwd = getpass.getpass(prompt)
         return passwd
+
+
+Tracer.trace_methods(Prompts, ("prompt",), "prompt")
@@ -0,0 +1,123 @@
+from __future__ import print_function
+
+import sys
+import threading
+import time
+
+try:
+    import __builtin__ as builtins  # Python 2
+except ImportError:
+    import builtins  # Python 3
+
+
+class StartupProfiler(object):
+    """
+    Measures the time from the start of the bootstrapper to its first prompt when it is run with
+    --profile-startup. Every module imported in that time is timed, both on its own and with the modules it
+    imported, and the initialisation phases are timed between calls to mark(). The report is printed once at the
+    first prompt, or at exit when there is no prompt, and warns when the startup is over BUDGET seconds.
+
+    This has to be enabled before the bootstrapper imports its modules, so the entry scripts check sys.argv for
+    the flag before their imports rather than waiting for argparse.
+    """
+    FLAG = "--profile-startup"
+    BUDGET = 2.0
+    REPORT_COUNT = 20
+
+    _enabled = False
+    _reported = False
+    _start = None
+    _last_mark = None
+    _original_import = None
+    _imports = list()
+    _phases = list()
+    _local = threading.local()
+
+    @staticmethod
+    def enable_from_args(args):
+        if StartupProfiler.FLAG in args:
+            StartupProfiler.enable()
+
+    @staticmethod
+    def enable():
+        if StartupProfiler._enabled:
+            return
+        StartupProfiler._enabled = True
+        StartupProfiler._start = StartupProfiler._last_mark = time.time()
+        StartupProfiler._original_import = builtins.__import__
+        builtins.__import__ = StartupProfiler._import
+
+    @staticmethod
+    def is_enabled():
+        return StartupProfiler._enabled
+
+    @staticmethod
+    def _import(name, globals=None, locals=None, fromlist=(), level=0):
+        original_import = StartupProfiler._original_import
+        # Relative imports and modules that are already loaded cost nothing worth reporting
+        if level > 0 or name in sys.modules or StartupProfiler._reported:
+            return original_import(name, globals, locals, fromlist, level)
+
+        stack = getattr(StartupProfiler._local, "stack", None)
+        if stack is None:
+            stack = StartupProfiler._local.stack = list()
+
+        # The time of the modules this one imports is added to its frame so its own time can be worked out
+        frame = [0.0]
+        stack.append(frame)
+        start = time.time()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.time() - start
+            stack.pop()
+            if len(stack) > 0:
+                stack[-1][0] += elapsed
+            StartupProfiler._imports.append((name, elapsed, elapsed - frame[0], len(stack)))
+
+    @staticmethod
+    def mark(phase):
+        """
+        Record the time since the previous mark as the cost of the phase
+        """
+        if not StartupProfiler._enabled or StartupProfiler._reported:
+            return
+        now = time.time()
+        StartupProfiler._phases.append((phase, now - StartupProfiler._last_mark))
+        StartupProfiler._last_mark = now
+
+    @staticmethod
+    def _write(line, warning=False):
+        # The report can be printed before the log is initialised
+        from common.mapr_logger.log import Log
+        if Log.get_log_filename() is None:
+            print(line)
+        elif warning:
+            Log.warning(line)
+        else:
+            Log.info(line, True)
+
+    @staticmethod
+    def report(phase="until first prompt"):
+        if not StartupProfiler._enabled or StartupProfiler._reported:
+            return
+        StartupProfiler.mark(phase)
+        StartupProfiler._reported = True
+        builtins.__import__ = StartupProfiler._original_import
+        total = time.time() - StartupProfiler._start
+
+        StartupProfiler._write("")
+        StartupProfiler._write("Startup profile: {0:.3f}s to the first prompt (budget {1:.1f}s)"
+                               .format(total, StartupProfiler.BUDGET))
+        StartupProfiler._write("{0:>10} {1:>10}  {2}".format("Total ms", "Self ms", "Import"))
+        imports = sorted(StartupProfiler._imports, key=lambda i: i[1], reverse=True)
+        for name, elapsed, own, depth in imports[:StartupProfiler.REPORT_COUNT]:
+            StartupProfiler._write("{0:>10.1f} {1:>10.1f}  {2}{3}".format(elapsed * 1000, own * 1000, "  " * depth,
+                                                                         name))
+        StartupProfiler._write("{0:>10}  {1}".format("Phase ms", "Phase"))
+        for phase_name, elapsed in StartupProfiler._phases:
+            StartupProfiler._write("{0:>10.1f}  {1}".format(elapsed * 1000, phase_name))
+
+        if total > StartupProfiler.BUDGET:
+            StartupProfiler._write("Startup took {0:.3f}s which is over the budget of {1:.1f}s"
+                                   .format(total, StartupProfiler.BUDGET), True)
@@ -0,0 +1,253 @@
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Span(object):
+    def __init__(self, name, category, parent):
+        self.name = name
+        self.category = category
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.thread = threading.current_thread()
+        self.start = time.time()
+        self.end = None
+        self.args = dict()
+
+    def set(self, name, value):
+        self.args[name] = value
+
+    def get_duration(self):
+        end = self.end if self.end is not None else time.time()
+        return end - self.start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        Tracer.finish(self)
+        return False
+
+
+class _NoSpan(object):
+    """
+    Returned by Tracer.span when tracing is off so instrumented code costs a single check
+    """
+    def set(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+class _Adopted(object):
+    """
+    Makes a span from another thread the parent of the spans started on this thread, see Tracer.adopt
+    """
+    def __init__(self, span):
+        self.span = span
+
+    def __enter__(self):
+        if self.span is not None:
+            Tracer._stack().append(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.span is not None:
+            stack = Tracer._stack()
+            if self.span in stack:
+                del stack[stack.index(self.span):]
+        return False
+
+
+class Tracer(object):
+    """
+    Records nested timing spans for commands, install phases, cloud steps and prompts when the bootstrapper is
+    run with --trace. The spans are exported as Chrome trace event JSON, which chrome://tracing and Perfetto can
+    open, and summarised as a table of the slowest operations. Spans nest per thread and a worker thread adopts
+    the span that was current when its task was submitted.
+
+    Listeners are called with every finished span. Tracing can be enabled without recording the spans when only
+    the listeners need them, for example for the JSON log.
+    """
+    SUMMARY_COUNT = 15
+
+    _enabled = False
+    _recording = False
+    _listeners = list()
+    _spans = list()
+    _open = set()
+    _lock = threading.Lock()
+    _local = threading.local()
+    _origin = None
+    _no_span = _NoSpan()
+
+    @staticmethod
+    def enable(record=True):
+        if not Tracer._enabled:
+            Tracer._enabled = True
+            Tracer._origin = time.time()
+        Tracer._recording = Tracer._recording or record
+
+    @staticmethod
+    def is_enabled():
+        return Tracer._enabled
+
+    @staticmethod
+    def is_recording():
+        return Tracer._recording
+
+    @staticmethod
+    def add_listener(listener):
+        Tracer._listeners.append(listener)
+
+    @staticmethod
+    def _stack():
+        stack = getattr(Tracer._local, "stack", None)
+        if stack is None:
+            stack = list()
+            Tracer._local.stack = stack
+        return stack
+
+    @staticmethod
+    def span(name, category):
+        if not Tracer._enabled:
+            return Tracer._no_span
+
+        stack = Tracer._stack()
+        span = Span(name, category, stack[-1] if len(stack) > 0 else None)
+        stack.append(span)
+        with Tracer._lock:
+            Tracer._open.add(span)
+        return span
+
+    @staticmethod
+    def finish(span):
+        span.end = time.time()
+        stack = Tracer._stack()
+        if span in stack:
+            del stack[stack.index(span):]
+        with Tracer._lock:
+            Tracer._open.discard(span)
+            if Tracer._recording:
+                Tracer._spans.append(span)
+        for listener in Tracer._listeners:
+            listener(span)
+
+    @staticmethod
+    def current():
+        if not Tracer._enabled:
+            return None
+        stack = Tracer._stack()
+        return stack[-1] if len(stack) > 0 else None
+
+    @staticmethod
+    def adopt(span):
+        return _Adopted(span)
+
+    @staticmethod
+    def get_context(span):
+        """
+        Return the phase and yaml key a span belongs to. The phase is the outermost phase span and the key is the
+        target of the innermost phase span that has one, such as the key of _install_component_key.
+        """
+        phase = None
+        key = None
+        while span is not None:
+            if span.category == "phase":
+                phase = span.name
+                if key is None:
+                    key = span.args.get("target")
+            span = span.parent
+        return phase, key
+
+    @staticmethod
+    def wrap(func, name, category):
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            if not Tracer._enabled:
+                return func(*args, **kwargs)
+            with Tracer.span(name, category) as span:
+                # The first string argument, such as the yaml key or component, tells calls of one method apart
+                for arg in args:
+                    if isinstance(arg, str):
+                        span.set("target", arg)
+                        break
+                if kwargs.get("key_name") is not None:
+                    span.set("key_name", kwargs["key_name"])
+                return func(*args, **kwargs)
+
+        traced.traced = True
+        return traced
+
+    @staticmethod
+    def trace_methods(clazz, prefixes, category):
+        """
+        Wrap the methods of a class whose names start with one of the prefixes in spans named Class.method
+        """
+        for name, member in list(clazz.__dict__.items()):
+            if not name.startswith(tuple(prefixes)):
+                continue
+            span_name = "{0}.{1}".format(clazz.__name__, name)
+            if isinstance(member, staticmethod):
+                func = member.__func__
+                if not getattr(func, "traced", False):
+                    setattr(clazz, name, staticmethod(Tracer.wrap(func, span_name, category)))
+            elif callable(member) and not getattr(member, "traced", False):
+                setattr(clazz, name, Tracer.wrap(member, span_name, category))
+
+    @staticmethod
+    def _snapshot():
+        with Tracer._lock:
+            spans = list(Tracer._spans)
+            for span in Tracer._open:
+                span.set("unfinished", True)
+                spans.append(span)
+        return spans
+
+    @staticmethod
+    def write_chrome_trace(filename):
+        pid = os.getpid()
+        events = list()
+        threads = dict()
+        for span in Tracer._snapshot():
+            tid = threads.setdefault(span.thread.ident, (len(threads), span.thread.name))[0]
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": int((span.start - Tracer._origin) * 1000000),
+                "dur": int(span.get_duration() * 1000000),
+                "pid": pid,
+                "tid": tid,
+                "args": span.args
+            })
+        for tid, thread_name in threads.values():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}})
+
+        with open(filename, "w") as fp:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fp)
+
+    @staticmethod
+    def get_slowest(count=SUMMARY_COUNT):
+        spans = sorted(Tracer._snapshot(), key=lambda s: s.get_duration(), reverse=True)
+        return spans[:count]
+
+    @staticmethod
+    def get_summary(count=SUMMARY_COUNT):
+        lines = ["{0:>10}  {1:<10} {2:<8} {3}".format("Seconds", "Category", "Status", "Operation")]
+        for span in Tracer.get_slowest(count):
+            status = span.args.get("status", span.args.get("error", ""))
+            name = span.name
+            if "target" in span.args:
+                name = "{0} {1}".format(name, span.args["target"])
+            lines.append("{0:>10.2f}  {1:<10} {2:<8} {3}{4}".format(span.get_duration(), span.category, str(status),
+                                                                    "  " * span.depth, name))
+        return lines
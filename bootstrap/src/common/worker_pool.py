@@ -0,0 +1,130 @@
+import sys
+import threading
+import time
+
+try:
+    import Queue as queue  # Python 2
+except ImportError:
+    import queue  # Python 3
+
+from common.const import Constants
+from common.mapr_logger.log import Log
+from common.tracer import Tracer
+
+
+class WorkerTask(object):
+    def __init__(self, func, args, kwargs, on_done=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.result = None
+        self.exc_info = None
+        self._event = threading.Event()
+        # Spans started by the task nest under the span that submitted it
+        self._span = Tracer.current()
+
+    def run(self):
+        # noinspection PyBroadException
+        try:
+            with Tracer.adopt(self._span):
+                self.result = self.func(*self.args, **self.kwargs)
+        except Exception:
+            self.exc_info = sys.exc_info()
+            Log.exception("Worker task {0} failed: {1}".format(getattr(self.func, "__name__", str(self.func)),
+                                                               str(self.exc_info[1])))
+        finally:
+            self._event.set()
+            if self.on_done is not None:
+                self.on_done(self)
+
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        self._event.wait(timeout)
+        return self._event.is_set()
+
+    def failed(self):
+        return self.exc_info is not None
+
+
+class WorkerPool(object):
+    """
+    A bounded pool of daemon threads. The bootstrapper still supports Python 2.7 so this is used instead of
+    concurrent.futures. Daemon threads are used so a Ctrl-C routed to exit_application is never blocked
+    by a worker that is waiting on a command.
+    """
+    DEFAULT_MAX_WORKERS = Constants.MAX_WORKERS
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, name="worker"):
+        if max_workers < 1:
+            max_workers = 1
+
+        self.max_workers = max_workers
+        self.name = name
+        self._queue = queue.Queue()
+        self._threads = list()
+        self._shutdown = False
+
+    def _start_thread(self):
+        thread = threading.Thread(target=self._worker, name="{0}-{1}".format(self.name, len(self._threads)))
+        thread.daemon = True
+        self._threads.append(thread)
+        thread.start()
+
+    def _worker(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            task.run()
+
+    def submit(self, func, *args, **kwargs):
+        return self.submit_with_callback(None, func, *args, **kwargs)
+
+    def submit_with_callback(self, on_done, func, *args, **kwargs):
+        if self._shutdown:
+            raise RuntimeError("Cannot submit to a worker pool that has been shut down")
+
+        task = WorkerTask(func, args, kwargs, on_done)
+        # Threads are only started as work arrives so a pool sized for a large cluster costs nothing on a small one
+        if len(self._threads) < self.max_workers:
+            self._start_thread()
+        self._queue.put(task)
+        return task
+
+    def map(self, func, items, timeout=None):
+        tasks = [self.submit(func, item) for item in items]
+        WorkerPool.wait_all(tasks, timeout)
+        return tasks
+
+    @staticmethod
+    def wait_all(tasks, timeout=None):
+        # A single deadline is shared by all tasks rather than applying the timeout to each one in turn
+        if timeout is None:
+            for task in tasks:
+                task.wait()
+            return True
+
+        deadline = time.time() + timeout
+        for task in tasks:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not task.wait(remaining):
+                return False
+        return True
+
+    def shutdown(self, wait=True):
+        self._shutdown = True
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown(exc_type is None)
+        return False
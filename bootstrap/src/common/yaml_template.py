@@ -0,0 +1,156 @@
+import io
+import json
+import os
+import threading
+
+
+class YamlTemplate(object):
+    """
+    A yaml file compiled into a substitution plan. The plan is a list of slots, one for every scalar value whose
+    key path ends with one of the replacement keys, holding the character offsets of that value in the original
+    text. Rendering splices the new values into the text, so the file is only parsed when it is compiled and its
+    formatting and comments are kept.
+
+    A replacement key is either a plain yaml key such as "namespace", which matches that key anywhere, or a
+    dotted path suffix such as "metadata.namespace".
+    """
+    def __init__(self, filename, text, keys, slots):
+        self.filename = filename
+        self.text = text
+        self.keys = keys
+        self.slots = slots
+
+    @staticmethod
+    def read(filename):
+        with io.open(filename, encoding="UTF-8") as fp:
+            return fp.read()
+
+    @staticmethod
+    def compile(filename, keys, text=None):
+        # yaml is only needed to compile a plan, which is rare once the plans are cached on disk
+        import yaml
+        if text is None:
+            text = YamlTemplate.read(filename)
+        keys = sorted(keys)
+        suffixes = [(key, key.split(".")) for key in keys]
+        slots = list()
+        if len(keys) > 0:
+            for document in yaml.compose_all(text, Loader=yaml.SafeLoader):
+                if document is not None:
+                    YamlTemplate._collect(document, list(), suffixes, slots)
+        slots.sort(key=lambda slot: slot[1])
+        return YamlTemplate(filename, text, keys, slots)
+
+    @staticmethod
+    def _collect(node, path, suffixes, slots):
+        import yaml
+        if isinstance(node, yaml.MappingNode):
+            for key_node, value_node in node.value:
+                value_path = path + [str(key_node.value)]
+                if isinstance(value_node, yaml.ScalarNode):
+                    for key, suffix in suffixes:
+                        if value_path[-len(suffix):] == suffix:
+                            slots.append([key, value_node.start_mark.index, value_node.end_mark.index])
+                            break
+                else:
+                    YamlTemplate._collect(value_node, value_path, suffixes, slots)
+        elif isinstance(node, yaml.SequenceNode):
+            for item in node.value:
+                YamlTemplate._collect(item, path, suffixes, slots)
+
+    @staticmethod
+    def format_value(value):
+        # JSON scalars are valid flow yaml scalars and quoting strings keeps values like "true" or "010" as strings
+        if isinstance(value, bool) or value is None or isinstance(value, (int, float)):
+            return json.dumps(value)
+        return json.dumps(str(value))
+
+    def render(self, values):
+        """
+        Return the text with the values substituted and whether anything was substituted
+        """
+        parts = list()
+        position = 0
+        for key, start, end in self.slots:
+            if key not in values:
+                continue
+            original = self.text[start:end]
+            parts.append(self.text[position:start])
+            parts.append(YamlTemplate.format_value(values[key]))
+            # Block scalars end at the start of the next line
+            if original.endswith("\n"):
+                parts.append("\n")
+            position = end
+
+        if position == 0:
+            return self.text, False
+        parts.append(self.text[position:])
+        return "".join(parts), True
+
+
+class TemplateCache(object):
+    """
+    Compiled templates kept in memory for the run and their plans kept on disk between runs. A plan on disk is
+    used while the size and modification time of its yaml file are unchanged and it was compiled for the same
+    replacement keys.
+    """
+    FILENAME = "template-cache.json"
+
+    def __init__(self, state_dir=None):
+        self.filename = None if state_dir is None else os.path.join(state_dir, TemplateCache.FILENAME)
+        self._templates = dict()
+        self._plans = self._load()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.filename is None or not os.path.exists(self.filename):
+            return dict()
+        try:
+            with open(self.filename) as fp:
+                return json.load(fp)
+        except (IOError, ValueError):
+            return dict()
+
+    def _save(self):
+        if self.filename is None:
+            return
+        directory = os.path.dirname(self.filename)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "w") as fp:
+            json.dump(self._plans, fp, sort_keys=True)
+        os.rename(temp_filename, self.filename)
+
+    @staticmethod
+    def _stamp(filename):
+        stat = os.stat(filename)
+        return [stat.st_size, stat.st_mtime]
+
+    def get(self, filename, keys):
+        keys = sorted(keys)
+        with self._lock:
+            template = self._templates.get(filename)
+            if template is not None and template.keys == keys:
+                return template
+
+            if len(keys) == 0:
+                # Nothing to substitute so there is no plan to compile or keep
+                template = YamlTemplate(filename, YamlTemplate.read(filename), keys, list())
+                self._templates[filename] = template
+                return template
+
+            stamp = TemplateCache._stamp(filename)
+            plan = self._plans.get(filename)
+            if plan is not None and plan["stamp"] == stamp and plan["keys"] == keys:
+                template = YamlTemplate(filename, YamlTemplate.read(filename), keys, plan["slots"])
+            else:
+                template = YamlTemplate.compile(filename, keys)
+                self._plans[filename] = {"stamp": stamp, "keys": keys, "slots": template.slots}
+                self._save()
+
+            self._templates[filename] = template
+            return template
+
+    def render(self, filename, values):
+        return self.get(filename, values.keys()).render(values)
@@ -0,0 +1,372 @@
+import base64
+import json
+import os
+import socket
+import ssl
+import tempfile
+import threading
+
+try:
+    import httplib  # Python 2
+except ImportError:
+    import http.client as httplib  # Python 3
+try:
+    from urllib import quote, urlencode  # Python 2
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import quote, urlencode, urlparse  # Python 3
+
+import yaml
+
+from common.mapr_logger.log import Log
+from mapr_exceptions.ex import KubernetesException
+
+
+class KubeConfig(object):
+    """
+    The parts of a kubeconfig file the native client needs: the API server and the credentials of the
+    current (or supplied) context. Exec and auth-provider plugins are not supported; kubectl must be used
+    for clusters that need them.
+    """
+    DEFAULT_PATH = "~/.kube/config"
+
+    def __init__(self, path=None, context=None):
+        if path is None:
+            path = os.environ.get("KUBECONFIG")
+            if path:
+                path = path.split(os.pathsep)[0]
+            else:
+                path = os.path.expanduser(KubeConfig.DEFAULT_PATH)
+        if not os.path.exists(path):
+            raise KubernetesException("The kubeconfig file {0} does not exist".format(path))
+
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        with open(path) as fp:
+            config = yaml.safe_load(fp) or dict()
+
+        self.context_name = context or config.get("current-context")
+        context_entry = KubeConfig._find(config, "contexts", self.context_name)
+        cluster = KubeConfig._find(config, "clusters", context_entry.get("cluster"))
+        user = KubeConfig._find(config, "users", context_entry.get("user"))
+
+        self.server = cluster.get("server")
+        if not self.server:
+            raise KubernetesException("The cluster for context {0} does not have a server".format(self.context_name))
+        self.namespace = context_entry.get("namespace", "default")
+        self.insecure = cluster.get("insecure-skip-tls-verify", False)
+        self.ca_file = self._path(cluster.get("certificate-authority"))
+        self.ca_data = KubeConfig._decode(cluster.get("certificate-authority-data"))
+
+        if "exec" in user or "auth-provider" in user:
+            raise KubernetesException("The user for context {0} uses a credential plugin which the native client "
+                                      "does not support".format(self.context_name))
+        self.token = user.get("token")
+        token_file = self._path(user.get("tokenFile"))
+        if self.token is None and token_file is not None:
+            with open(token_file) as fp:
+                self.token = fp.read().strip()
+        self.username = user.get("username")
+        self.password = user.get("password")
+        self.cert_file = self._path(user.get("client-certificate"))
+        self.cert_data = KubeConfig._decode(user.get("client-certificate-data"))
+        self.key_file = self._path(user.get("client-key"))
+        self.key_data = KubeConfig._decode(user.get("client-key-data"))
+
+    @staticmethod
+    def _find(config, section, name):
+        for entry in config.get(section) or list():
+            if entry.get("name") == name:
+                return entry.get(section[:-1]) or dict()
+        raise KubernetesException("Could not find {0} '{1}' in the kubeconfig file".format(section[:-1], name))
+
+    @staticmethod
+    def _decode(data):
+        if data is None:
+            return None
+        return base64.b64decode(data)
+
+    def _path(self, path):
+        if path is None:
+            return None
+        return os.path.join(self.base_dir, os.path.expanduser(path))
+
+
+class K8SClient(object):
+    """
+    A small Kubernetes API client used instead of forking kubectl for every operation. Each thread keeps one
+    keep-alive HTTPS connection to the API server so the TLS handshake is paid once per thread rather than
+    once per command.
+    """
+    FIELD_MANAGER = "mapr-bootstrap"
+    APPLY_PATCH = "application/apply-patch+yaml"
+    MERGE_PATCH = "application/merge-patch+json"
+    JSON = "application/json"
+    # Asks for lists of only the object metadata. Servers that do not support it return the full objects
+    METADATA_LIST = "application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1,application/json"
+    TIMEOUT = 60
+    PAGE_SIZE = 500
+
+    def __init__(self, kube_config):
+        self.config = kube_config
+        url = urlparse(kube_config.server)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.base_path = url.path.rstrip("/")
+        self._ssl_context = self._create_ssl_context() if self.scheme == "https" else None
+        self._local = threading.local()
+        self._resources = dict()
+        self._resources_lock = threading.Lock()
+
+    @staticmethod
+    def from_kubeconfig(path=None, context=None):
+        return K8SClient(KubeConfig(path, context))
+
+    def _create_ssl_context(self):
+        if self.config.insecure:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        elif self.config.ca_data is not None:
+            context = ssl.create_default_context(cadata=self.config.ca_data.decode("UTF-8"))
+        else:
+            context = ssl.create_default_context(cafile=self.config.ca_file)
+
+        if self.config.cert_file is not None or self.config.cert_data is not None:
+            # The ssl module can only load client certificates from files. Embedded certificates are written to
+            # private temporary files that are removed as soon as they are loaded
+            temp_files = list()
+            try:
+                cert_file = self.config.cert_file or K8SClient._write_temp(self.config.cert_data, temp_files)
+                key_file = self.config.key_file or K8SClient._write_temp(self.config.key_data, temp_files)
+                context.load_cert_chain(cert_file, key_file)
+            finally:
+                for temp_file in temp_files:
+                    os.remove(temp_file)
+
+        return context
+
+    @staticmethod
+    def _write_temp(data, temp_files):
+        fd, name = tempfile.mkstemp(prefix="mapr-k8s-")
+        temp_files.append(name)
+        os.write(fd, data)
+        os.close(fd)
+        return name
+
+    def _new_connection(self, timeout=TIMEOUT):
+        if self.scheme == "https":
+            return httplib.HTTPSConnection(self.host, self.port, timeout=timeout, context=self._ssl_context)
+        return httplib.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._new_connection()
+            self._local.connection = connection
+        return connection
+
+    def _close_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _headers(self, content_type=None, accept=JSON):
+        headers = {"Accept": accept, "User-Agent": K8SClient.FIELD_MANAGER}
+        if content_type is not None:
+            headers["Content-Type"] = content_type
+        if self.config.token is not None:
+            headers["Authorization"] = "Bearer {0}".format(self.config.token)
+        elif self.config.username is not None:
+            credentials = "{0}:{1}".format(self.config.username, self.config.password).encode("UTF-8")
+            headers["Authorization"] = "Basic {0}".format(base64.b64encode(credentials).decode("UTF-8"))
+        return headers
+
+    def _url(self, path, query=None):
+        url = self.base_path + path
+        if query:
+            url += "?" + urlencode(query)
+        return url
+
+    def request(self, method, path, body=None, content_type=JSON, query=None, accept=JSON):
+        url = self._url(path, query)
+        if body is not None and not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+
+        Log.debug("API: {0} {1}".format(method, url))
+        response = None
+        payload = None
+        # A keep-alive connection may have been closed by the server since it was last used so it is reopened
+        # and the request is tried one more time
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, url, body, self._headers(content_type if body is not None else None, accept))
+                response = connection.getresponse()
+                payload = response.read()
+                break
+            except (httplib.HTTPException, socket.error) as e:
+                self._close_connection()
+                if attempt == 1:
+                    raise KubernetesException("{0} {1} failed: {2}".format(method, url, str(e)))
+
+        Log.debug("API STATUS: {0}".format(response.status))
+        result = None
+        if payload:
+            try:
+                result = json.loads(payload.decode("UTF-8"))
+            except ValueError:
+                result = payload.decode("UTF-8")
+
+        if response.status >= 400:
+            message = result.get("message") if isinstance(result, dict) else result
+            raise KubernetesException("{0} {1} failed: {2}: {3}".format(method, url, response.status, message),
+                                      response.status)
+        return result
+
+    def _api_prefix(self, api_version):
+        if api_version == "v1":
+            return "/api/v1"
+        return "/apis/{0}".format(api_version)
+
+    def _get_resource(self, api_version, kind):
+        # Discovery results are cached per group version. A miss refreshes the cache once since a kind may have
+        # just been created by a CRD applied earlier in the same run
+        for refresh in (False, True):
+            with self._resources_lock:
+                resources = None if refresh else self._resources.get(api_version)
+            if resources is None:
+                document = self.request("GET", self._api_prefix(api_version))
+                resources = dict()
+                for resource in document.get("resources", list()):
+                    if "/" not in resource["name"]:
+                        resources[resource["kind"]] = (resource["name"], resource["namespaced"])
+                with self._resources_lock:
+                    self._resources[api_version] = resources
+            if kind in resources:
+                return resources[kind]
+
+        raise KubernetesException("The kind {0} is not served by {1}".format(kind, api_version))
+
+    def resource_path(self, api_version, kind, namespace=None, name=None):
+        plural, namespaced = self._get_resource(api_version, kind)
+        path = self._api_prefix(api_version)
+        if namespaced:
+            path += "/namespaces/{0}".format(quote(namespace or self.config.namespace))
+        path += "/{0}".format(plural)
+        if name is not None:
+            path += "/{0}".format(quote(name))
+        return path
+
+    def object_path(self, obj):
+        metadata = obj.get("metadata", dict())
+        return self.resource_path(obj.get("apiVersion"), obj.get("kind"), metadata.get("namespace"), metadata.get("name"))
+
+    @staticmethod
+    def load_yaml(content):
+        return [document for document in yaml.safe_load_all(content) if document]
+
+    def apply(self, obj):
+        """
+        Server side apply of one object. Conflicts with other field managers such as an earlier client side
+        kubectl apply are forced since the bootstrapper owns these objects.
+        """
+        query = {"fieldManager": K8SClient.FIELD_MANAGER, "force": "true"}
+        return self.request("PATCH", self.object_path(obj), obj, K8SClient.APPLY_PATCH, query)
+
+    def create(self, obj):
+        """
+        Create one object. Like kubectl create this fails when the object already exists.
+        """
+        metadata = obj.get("metadata", dict())
+        path = self.resource_path(obj.get("apiVersion"), obj.get("kind"), metadata.get("namespace"))
+        return self.request("POST", path, obj)
+
+    def get(self, obj):
+        try:
+            return self.request("GET", self.object_path(obj))
+        except KubernetesException as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def delete(self, obj, ignore_not_found=False, propagation="Background"):
+        body = {"kind": "DeleteOptions", "apiVersion": "v1", "propagationPolicy": propagation}
+        try:
+            self.request("DELETE", self.object_path(obj), body)
+        except KubernetesException as e:
+            if e.status == 404 and ignore_not_found:
+                return False
+            raise
+        return True
+
+    def label(self, api_version, kind, name, labels, namespace=None):
+        body = {"metadata": {"labels": labels}}
+        path = self.resource_path(api_version, kind, namespace, name)
+        return self.request("PATCH", path, body, K8SClient.MERGE_PATCH)
+
+    def list_pages(self, api_version, kind, namespace=None, label_selector=None, field_selector=None,
+                   limit=PAGE_SIZE, metadata_only=False):
+        """
+        Yield each page of a list using limit/continue so a large collection is never held in memory at once.
+        With metadata_only the server leaves out the spec and status of each item.
+        """
+        accept = K8SClient.METADATA_LIST if metadata_only else K8SClient.JSON
+        path = self.resource_path(api_version, kind, namespace)
+        query = {"limit": limit}
+        if label_selector is not None:
+            query["labelSelector"] = label_selector
+        if field_selector is not None:
+            query["fieldSelector"] = field_selector
+
+        while True:
+            page = self.request("GET", path, query=query, accept=accept)
+            yield page
+            continue_token = page.get("metadata", dict()).get("continue")
+            if not continue_token:
+                break
+            query["continue"] = continue_token
+
+    def list_items(self, api_version, kind, namespace=None, label_selector=None, field_selector=None):
+        items = list()
+        for page in self.list_pages(api_version, kind, namespace, label_selector, field_selector):
+            items.extend(page.get("items") or list())
+        return items
+
+    def watch(self, api_version, kind, namespace=None, resource_version=None, timeout_seconds=60,
+              field_selector=None):
+        """
+        Yield (type, object) watch events until the server ends the watch after timeout_seconds. A watch holds
+        its connection open so it uses its own connection rather than the thread's pooled one.
+        """
+        path = self.resource_path(api_version, kind, namespace)
+        query = {"watch": "true", "timeoutSeconds": max(int(timeout_seconds), 1), "allowWatchBookmarks": "true"}
+        if resource_version is not None:
+            query["resourceVersion"] = resource_version
+        if field_selector is not None:
+            query["fieldSelector"] = field_selector
+
+        connection = self._new_connection(timeout_seconds + K8SClient.TIMEOUT)
+        try:
+            connection.request("GET", self._url(path, query), None, self._headers())
+            response = connection.getresponse()
+            if response.status >= 400:
+                raise KubernetesException("Watch of {0} failed: {1}".format(path, response.status), response.status)
+
+            # Python 2 responses cannot be read a line at a time; the whole watch is read once it ends instead
+            if hasattr(response, "readline"):
+                lines = iter(response.readline, b"")
+            else:
+                lines = response.read().splitlines()
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                event = json.loads(line.decode("UTF-8"))
+                yield event.get("type"), event.get("object")
+        except (httplib.HTTPException, socket.error) as e:
+            raise KubernetesException("Watch of {0} failed: {1}".format(path, str(e)))
+        finally:
+            connection.close()
@@ -0,0 +1,201 @@
+import json
+import re
+import time
+
+from common.const import Constants
+from common.mapr_logger.log import Log
+from common.worker_pool import WorkerPool
+from mapr_exceptions.ex import KubernetesException
+
+
+class DeletionWatcher(object):
+    """
+    Waits for the objects deleted by an uninstall to be gone and reports the ones that are stuck, usually on a
+    finalizer.
+
+    Deletes are issued with --wait=false, or through the API with background propagation, so nothing blocks on a
+    finalizer while the deletes are made and this one wait covers all of them. With kubectl every namespace is
+    polled with one get of all its pending objects. With the native client each namespace and kind is listed
+    without the spec and status of its objects. Polls back off exponentially instead of sleeping for a fixed time.
+    """
+    DEFAULT_TIMEOUT = Constants.DELETE_TIMEOUT
+    INITIAL_DELAY = 1
+    MAX_DELAY = 15
+    # kubectl get fails for all the objects of a command when one of their custom resource definitions is gone
+    MISSING_TYPE = re.compile(r'the server doesn\'t have a resource type "([^"]+)"')
+
+    def __init__(self, k8s, objects, deadline):
+        self.k8s = k8s
+        self.deadline = deadline
+        # The same object can be in more than one yaml, for example a namespace
+        self.objects = list(dict((str(obj), obj) for obj in objects if obj.kind is not None).values())
+        self.gone_times = dict()
+        # The last metadata seen for each object that still exists
+        self.remaining = dict()
+        # Why the objects that could not be checked could not be checked
+        self.errors = dict()
+        self._started = time.time()
+
+    @staticmethod
+    def get_resource(obj):
+        # The kind is qualified by its API group so a custom resource with the same kind as a core one is not mixed up
+        if obj.api_version is not None and "/" in obj.api_version:
+            return "{0}.{1}/{2}".format(obj.kind.lower(), obj.api_version.split("/")[0], obj.name)
+        return "{0}/{1}".format(obj.kind.lower(), obj.name)
+
+    @staticmethod
+    def get_items(response):
+        # Nothing is written when none of the objects exist
+        if not response.strip().startswith("{"):
+            return list()
+        result = json.loads(response)
+        if "items" in result:
+            return result["items"]
+        return [result]
+
+    def _groups(self):
+        groups = dict()
+        for obj in self.objects:
+            if self.k8s.client is not None:
+                group = (obj.namespace, obj.api_version, obj.kind)
+            else:
+                group = (obj.namespace, None, None)
+            groups.setdefault(group, list()).append(obj)
+        return groups
+
+    def wait(self):
+        """
+        Wait until all the objects are gone or the deadline passes. Returns True when all are gone.
+        """
+        if len(self.objects) == 0:
+            return True
+
+        Log.info("Waiting up to {0:.0f}s for {1} deleted object(s) to be gone...".format(
+            max(self.deadline - self._started, 0), len(self.objects)), True)
+        groups = self._groups()
+        with WorkerPool(min(len(groups), self.k8s.max_workers), "delete-wait") as pool:
+            tasks = [pool.submit(self._poll_group, namespace, api_version, kind, objects)
+                     for (namespace, api_version, kind), objects in groups.items()]
+            WorkerPool.wait_all(tasks)
+
+        stuck = [str(obj) for obj in self.objects if str(obj) not in self.gone_times]
+        if len(stuck) == 0:
+            Log.info("All {0} deleted object(s) are gone after {1:.1f}s".format(len(self.objects),
+                                                                               time.time() - self._started), True)
+            return True
+
+        Log.warning("{0} deleted object(s) still exist:".format(len(stuck)))
+        for name in sorted(stuck):
+            metadata = self.remaining.get(name)
+            if name in self.errors:
+                Log.warning("  {0} could not be checked: {1}".format(name, self.errors[name]))
+            elif metadata is None:
+                Log.warning("  {0} could not be checked".format(name))
+            elif len(metadata.get("finalizers") or list()) > 0:
+                Log.warning("  {0} is waiting for the finalizer(s) {1}".format(name, ", ".join(metadata["finalizers"])))
+            elif metadata.get("deletionTimestamp") is None:
+                Log.warning("  {0} was not deleted".format(name))
+            else:
+                Log.warning("  {0} is still being deleted".format(name))
+        return False
+
+    def find_existing(self):
+        """
+        Return the metadata of each of the objects that exists now, by name, with one get per group
+        """
+        existing = dict()
+        groups = self._groups()
+        if len(groups) == 0:
+            return existing
+        with WorkerPool(min(len(groups), self.k8s.max_workers), "find") as pool:
+            tasks = [(objects, kind, pool.submit(self._get_existing, namespace, api_version, kind, objects))
+                     for (namespace, api_version, kind), objects in groups.items()]
+            WorkerPool.wait_all([task for _, _, task in tasks])
+
+        for objects, kind, task in tasks:
+            if task.failed() or task.result is None:
+                # When it is not known the object is treated as existing so it is never deleted by mistake
+                for obj in objects:
+                    existing[str(obj)] = dict()
+                continue
+            items = dict(((item.get("kind", kind), item.get("metadata", dict()).get("name")),
+                          item.get("metadata", dict())) for item in task.result)
+            for obj in objects:
+                if (obj.kind, obj.name) in items:
+                    existing[str(obj)] = items[(obj.kind, obj.name)]
+        return existing
+
+    def _poll_group(self, namespace, api_version, kind, objects):
+        pending = dict(((obj.kind, obj.name), obj) for obj in objects)
+        delay = DeletionWatcher.INITIAL_DELAY
+
+        while True:
+            items = self._get_existing(namespace, api_version, kind, list(pending.values()))
+            if items is None:
+                # Waiting out the deadline would only hide the error, which is reported with the objects
+                return
+            existing = dict(((item.get("kind", kind), item.get("metadata", dict()).get("name")),
+                             item.get("metadata", dict())) for item in items)
+            for obj_key, obj in list(pending.items()):
+                metadata = existing.get(obj_key)
+                if metadata is None:
+                    self._mark_gone(obj)
+                    del pending[obj_key]
+                else:
+                    self.remaining[str(obj)] = metadata
+            if len(pending) == 0 or time.time() + delay > self.deadline:
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, DeletionWatcher.MAX_DELAY)
+
+    def _get_existing(self, namespace, api_version, kind, objects):
+        """
+        The items of the objects that still exist, or None when they could not be listed. The error is then kept
+        for each of the objects.
+        """
+        if self.k8s.client is not None:
+            try:
+                items = list()
+                for page in self.k8s.client.list_pages(api_version, kind, namespace, metadata_only=True):
+                    for item in page.get("items") or list():
+                        item["kind"] = kind
+                        items.append(item)
+                return items
+            except KubernetesException as e:
+                if e.status == 404:
+                    # The namespace or the custom resource definition is gone along with everything in it
+                    return list()
+                Log.debug("Could not list {0} in {1}: {2}".format(kind, namespace, e.value))
+                self._set_error(objects, e.value)
+                return None
+
+        resources = [DeletionWatcher.get_resource(obj) for obj in objects]
+        while len(resources) > 0:
+            cmd = " ".join(resources)
+            if namespace is not None:
+                cmd = "{0} -n {1}".format(cmd, namespace)
+            response, status = self.k8s.run_get("{0} --ignore-not-found -o=json".format(cmd), False)
+            if status == 0:
+                return DeletionWatcher.get_items(response)
+
+            # The objects of a type that is no longer served are gone and the others are asked for again
+            missing = set(DeletionWatcher.MISSING_TYPE.findall(response))
+            if len(missing) == 0:
+                if "(NotFound)" in response:
+                    # Objects that are not found are ignored so it is their namespace that is gone
+                    return list()
+                Log.debug("Could not get {0}: {1}".format(cmd, response))
+                self._set_error(objects, response.strip())
+                return None
+            resources = [resource for resource in resources if resource.split("/", 1)[0] not in missing]
+        return list()
+
+    def _set_error(self, objects, error):
+        for obj in objects:
+            self.errors[str(obj)] = error
+
+    def _mark_gone(self, obj):
+        elapsed = time.time() - self._started
+        self.gone_times[str(obj)] = elapsed
+        self.remaining.pop(str(obj), None)
+        Log.info("{0} is gone after {1:.1f}s".format(obj, elapsed))
@@ -1,19 +1,90 @@
+import json
 import os
+import time
 
+from common.apply_cache import ApplyCache
 from common.const import Constants
+from common.dependency_graph import DependencyGraph
 from common.file_utils import FileUtils
+from common.install_journal import InstallJournal
+from common.manifest import Manifest, ManifestObject
 from common.mapr_logger.log import Log
 from common.os_command import OSCommand
-from mapr_exceptions.ex import NotFoundException
+from common.tracer import Tracer
+from common.worker_pool import WorkerPool
+from common.yaml_template import TemplateCache
+from k8s_deletion import DeletionWatcher
+from k8s_readiness import ReadinessWatcher
+from k8s_rollback import InstallPhase
+from node_inventory import NodeInventory
+from mapr_exceptions.ex import KubernetesException, NotFoundException
 
 
 class K8SOperations(object):
     KUBECTL_APPLY = "kubectl apply -f"
     OC_APPLY = "oc apply -f"
+    STDIN = "-"
+    YAML_SEPARATOR = "\n---\n"
+    KUBECTL_CREATE = "kubectl create -f"
+    OC_CREATE = "oc create -f"
     KUBECTL_DELETE = "kubectl delete -f"
     OC_DELETE = "oc delete -f"
+    # Deletes made by the concurrent uninstall do not wait for finalizers; DeletionWatcher waits for all of them
+    DELETE_NO_WAIT = "--wait=false"
+    IGNORE_NOT_FOUND = "--ignore-not-found"
     KUBECTL_GET = "kubectl get"
-    KUBECTL_LABEL_NODE = "kubectl label node --overwrite {0} \"{1}={2}\""
+    KUBECTL_SERVER = "kubectl config view --minify -o jsonpath={.clusters[0].cluster.server}"
+    KUBECTL_CLUSTER_UID = "kubectl get namespace kube-system -o jsonpath={.metadata.uid}"
+    KUBECTL_LABEL_NODES = "kubectl label node --overwrite {0} {1}"
+    # Nodes per kubectl label command so the command line stays well under the shell limit
+    LABEL_BATCH_SIZE = 100
+    NODE_PAGE_SIZE = 500
+
+    # The yaml keys of each component that can be installed with the dependency graph installer. The lists are in
+    # the same order the install_*_components methods apply them. The order of the graph itself comes from the
+    # kinds in each manifest so these lists only decide which keys belong to a component.
+    COMPONENT_KEYS = {
+        "cspaces_configuration": ["configuration-namespace", "configuration-hivemeta-cm", "configuration-ldapclient-cm",
+                                  "configuration-sssdsecret", "configuration-sparkhistory-cm",
+                                  "configuration-cspaceterminal-cm", "configuration-psp-cspace",
+                                  "configuration-role-cspace", "configuration-role-cspace-terminal",
+                                  "configuration-role-cspace-user"],
+        "csi": ["csi-namespace", "csi-nodeplugin-sa", "csi-provisioner-sa", "csi-attacher-cr", "csi-attacher-crb",
+                "csi-nodeplugin-cr", "csi-nodeplugin-crb", "csi-provisioner-cr", "csi-provisioner-crb", "csi-scc",
+                "csi-imagepullsecret", "csi-openshift-nodeplugin", "csi-nodeplugin", "csi-openshift-provisioner",
+                "csi-provisioner"],
+        "external": ["external-namespace"],
+        "system_cspace": ["system-namespace", "system-imagepullsecret", "system-sa-cspace", "system-cr-cspace",
+                          "system-crb-cspace", "system-crd-cspace", "system-cspaceoperator-openshift",
+                          "system-scc-cspace", "system-cspaceoperator", "system-cr-pv", "system-priorityclass-admin",
+                          "system-priorityclass-clusterservices", "system-priorityclass-compute",
+                          "system-priorityclass-critical", "system-priorityclass-gateways",
+                          "system-priorityclass-metrics", "system-priorityclass-mfs",
+                          "system-priorityclass-cspaceservices", "system-storageclass-hdd", "system-storageclass-nvme",
+                          "system-storageclass-ssd"],
+        "spark": ["spark-namespace", "spark-sa", "spark-cr", "spark-crb", "spark-scc", "spark-imagepullsecret",
+                  "spark-crd-sparkapplication", "spark-crd-sparkscheduledapplication", "spark-sparkoperator",
+                  "spark-svc", "spark-job"],
+        "drill": ["drill-namespace", "drill-sa", "drill-cr", "drill-role", "drill-crb", "drill-rb", "drill-scc",
+                  "drill-imagepullsecret", "drill-crd", "drill-drilloperator"]
+    }
+    READY_NODE = "{0}-ready"
+    OPENSHIFT_ONLY_KEYS = ("csi-scc", "csi-openshift-nodeplugin", "csi-openshift-provisioner", "drill-scc", "spark-scc",
+                           "system-cspaceoperator-openshift", "system-scc-cspace")
+    KUBERNETES_ONLY_KEYS = ("csi-nodeplugin", "csi-provisioner", "system-cspaceoperator")
+    # SCC keys are applied with oc and followed by the policy method that binds them
+    OPENSHIFT_POLICY_ADD = {
+        "csi-scc": "csi_openshift_policy_add",
+        "drill-scc": "drill_openshift_policy_add",
+        "spark-scc": "spark_openshift_policy_add",
+        "system-scc-cspace": "cspace_openshift_policy_add"
+    }
+    OPENSHIFT_POLICY_REMOVE = {
+        "csi-scc": "csi_openshift_policy_remove",
+        "drill-scc": "drill_openshift_policy_remove",
+        "spark-scc": "spark_openshift_policy_remove",
+        "system-scc-cspace": "cspace_openshift_policy_remove"
+    }
 
     def __init__(self, prompts, base_dir):
         self.is_mke   = True
@@ -30,6 +101,27 @@ class K8SOperations(object):
         self.ldapbind_user = Constants.LDAPBIND_USER
         self.ldapbind_pass = Constants.LDAPBIND_PASS
         self.is_openshift = False
+        self.parallel = False
+        self.batch_apply = False
+        self.max_workers = WorkerPool.DEFAULT_MAX_WORKERS
+        self.wait_ready = False
+        self.apply_cache = None
+        self.journal = None
+        # When set a failed install phase deletes what it created. See InstallPhase
+        self.rollback = False
+        self._phase = None
+        self._cluster_id = None
+        # Values substituted into the yamls. See FileUtils.replace_yaml_value
+        self.template_values = dict()
+        self.skip_unchanged = False
+        self.ready_timeout = ReadinessWatcher.DEFAULT_TIMEOUT
+        self.delete_timeout = DeletionWatcher.DEFAULT_TIMEOUT
+        # Delete the namespaces of the components instead of each of their yamls
+        self.fast_teardown = False
+        # Set by the first concurrent uninstall so every wait for deleted objects shares one deadline
+        self._delete_deadline = None
+        # When set the Kubernetes API is called directly instead of running kubectl or oc
+        self.client = None
         # need to parameterize these and move prereqs out of the old bootstrapper
         self.prereq_dir = os.path.abspath(os.path.join(base_dir, "../prereqs"))
         self.csi_dir = os.path.abspath(os.path.join(self.prereq_dir, "csi"))
@@ -49,11 +141,12 @@ class K8SOperations(object):
         if not os.path.exists(self.prereq_dir):
             raise NotFoundException(self.prereq_dir)
         self.yamls = dict()
+        self.manifests = dict()
         self.load_yaml_dict()
 
     @staticmethod
-    def _run(cmd):
-        response, status = OSCommand.run2(cmd)
+    def _run(cmd, input_data=None):
+        response, status = OSCommand.run2(cmd, input_data=input_data)
         if status != 0:
             Log.error("Could not run {0}: {1}:{2}".format(cmd, str(status), response))
             return False
@@ -249,21 +342,182 @@ class K8SOperations(object):
 
         return True
 
-    def get_yaml(self, key):
-        # TODO: Need to load up a dict of keys and values to be replaced
+    def get_yaml_file(self, key):
         yaml_file = self.yamls.get(key)
         if yaml_file is None:
             raise NotFoundException("The key '{0}' does not have an entry in the yamls dictonary".format(key))
+        return yaml_file
 
-        yaml_file, changed = FileUtils.replace_yaml_value(yaml_file, dict())
+    def get_yaml(self, key):
+        """
+        Render the yaml of a key with the template values. Returns the text and if any value was substituted.
+        """
+        return FileUtils.replace_yaml_value(self.get_yaml_file(key), self.template_values)
+
+    def use_template_cache(self, state_dir):
+        FileUtils.set_template_cache(TemplateCache(state_dir))
+
+    def use_native_client(self, kubeconfig=None, context=None):
+        # Imported here so the kubectl engine does not pay for the http and ssl modules at startup
+        from k8s_client import K8SClient
+        try:
+            self.client = K8SClient.from_kubeconfig(kubeconfig, context)
+        except KubernetesException as e:
+            Log.warning("The native Kubernetes client cannot be used; kubectl will be used instead: {0}".format(e.value))
+            self.client = None
+            return False
 
-        return yaml_file, changed
+        Log.info("Using the native Kubernetes client for {0}".format(self.client.config.server))
+        return True
 
-    def delete_temp_yaml(self, yaml_file):
-        pass
+    def get_cluster_identity(self):
+        """
+        The API server URL and the UID of the kube-system namespace. The UID changes when a cluster is recreated
+        behind the same URL.
+        """
+        if self._cluster_id is not None:
+            return self._cluster_id
+        self._cluster_id = self._get_cluster_identity()
+        return self._cluster_id
+
+    def _get_cluster_identity(self):
+        if self.client is not None:
+            try:
+                namespace = self.client.request("GET", "/api/v1/namespaces/kube-system")
+            except KubernetesException as e:
+                Log.error("Could not get the cluster identity: {0}".format(e.value))
+                return None
+            return "{0}#{1}".format(self.client.config.server, namespace["metadata"]["uid"])
+
+        server = self._run_and_return_response(K8SOperations.KUBECTL_SERVER)
+        uid = self._run_and_return_response(K8SOperations.KUBECTL_CLUSTER_UID)
+        if server is None or uid is None:
+            return None
+        return "{0}#{1}".format(server.strip(), uid.strip())
 
-    @staticmethod
-    def run_get(cmd, print_error=True):
+    def use_apply_cache(self, state_dir, cluster_id, skip_unchanged=False):
+        """
+        Record the yamls applied to the cluster in the apply cache. Unchanged yamls are only skipped with
+        skip_unchanged; otherwise the cache is just kept up to date for a later run that skips them.
+        """
+        if cluster_id is None:
+            Log.warning("The cluster identity is not known; Every yaml will be applied")
+            return False
+
+        self.apply_cache = ApplyCache(state_dir, cluster_id)
+        self.skip_unchanged = skip_unchanged
+        Log.info("Using the apply cache {0} for cluster {1}".format(self.apply_cache.filename, cluster_id))
+        return True
+
+    def use_journal(self, state_dir, cluster_id, resume=False):
+        if cluster_id is None:
+            Log.warning("The cluster identity is not known; The install steps will not be journaled")
+            return False
+
+        self.journal = InstallJournal(state_dir, cluster_id, resume)
+        if resume:
+            Log.info("Resuming the install journaled in {0}; {1} completed step(s) will be skipped if they have not "
+                     "changed".format(self.journal.filename, self.journal.get_completed_count()), True)
+        return True
+
+    def read_yaml(self, key):
+        content, _ = self.get_yaml(key)
+        return content
+
+    def _run_yaml(self, operation, key, options=None):
+        """
+        Run a kubectl or oc -f operation on the rendered yaml of a key. The yaml is streamed to stdin so nothing is
+        read from or written to disk once the template is cached and rendered secrets never touch the filesystem.
+        """
+        return self.run_yaml_stream(operation, self.read_yaml(key), options)
+
+    def run_yaml_stream(self, operation, content, options=None):
+        cmd = "{0} {1}".format(operation, K8SOperations.STDIN)
+        if options is not None:
+            cmd = "{0} {1}".format(cmd, options)
+        return self._run(cmd, content)
+
+    def apply_yaml(self, name, content):
+        """
+        Apply rendered yaml text with the native client or by streaming it to kubectl/oc apply -f -
+        """
+        if self.client is not None:
+            return self._native_apply(name, content)
+        if self.is_openshift:
+            return self.run_yaml_stream(K8SOperations.OC_APPLY, content)
+        return self.run_yaml_stream(K8SOperations.KUBECTL_APPLY, content)
+
+    def create_object(self, obj):
+        """
+        Create one object that is not in a yaml with the native client or by streaming it to kubectl/oc create -f -.
+        An object created inside a phase is deleted when the phase is rolled back.
+        """
+        metadata = obj["metadata"]
+        if self.client is not None:
+            try:
+                self.client.create(obj)
+            except KubernetesException as e:
+                Log.error("Could not create {0}/{1}: {2}".format(obj["kind"], metadata["name"], e.value))
+                return False
+        else:
+            operation = K8SOperations.OC_CREATE if self.is_openshift else K8SOperations.KUBECTL_CREATE
+            if not self.run_yaml_stream(operation, json.dumps(obj)):
+                return False
+
+        if self._phase is not None:
+            self._phase.record_created(ManifestObject(obj["kind"], metadata["name"], metadata.get("namespace"),
+                                                      obj["apiVersion"]))
+        return True
+
+    def get_changed_digest(self, key, content):
+        """
+        Returns None when the rendered yaml is the same as the one last applied to this cluster or by the install
+        being resumed, otherwise the digest to record once it has been applied. Without an apply cache or a journal
+        every yaml is treated as changed.
+        """
+        if self.apply_cache is None and self.journal is None:
+            return ""
+        digest = ApplyCache.hash_content(content)
+        if self.journal is not None and self.journal.is_completed(key, digest):
+            Log.info("Skipping {0}; It was applied by the install that is being resumed".format(key))
+            return None
+        if self.apply_cache is not None and self.skip_unchanged and self.apply_cache.is_applied(key, digest):
+            Log.info("Skipping {0}; It has not changed since it was last applied".format(key))
+            return None
+        return digest
+
+    def record_applied(self, key, digest, result=True):
+        if self.journal is not None:
+            self.journal.record(key, digest, result)
+        if self.apply_cache is not None and digest:
+            if result:
+                self.apply_cache.record(key, digest)
+            else:
+                # A failed apply may have changed some of the objects
+                self.apply_cache.forget(key)
+        if self._phase is not None and result:
+            self._phase.record_applied(key)
+
+    def forget_applied(self, key):
+        # The yaml was deleted again so neither a re-run nor a resumed install may skip it
+        if self.apply_cache is not None:
+            self.apply_cache.forget(key)
+        if self.journal is not None:
+            self.journal.record(key, None, False)
+
+    def _apply_key(self, key, apply):
+        # The yaml is rendered once so the text that is hashed is the text that is applied
+        content = self.read_yaml(key)
+        digest = self.get_changed_digest(key, content)
+        if digest is None:
+            return True
+        if self._phase is not None:
+            self._phase.check_existing([key])
+        result = apply(key, content)
+        self.record_applied(key, digest, result)
+        return result
+
+    def run_get(self, cmd, print_error=True):
         cmd = "{0} {1}".format(K8SOperations.KUBECTL_GET, cmd)
         response, status = OSCommand.run2(cmd)
         if status != 0:
@@ -271,51 +525,127 @@ class K8SOperations(object):
                 Log.error("Could not run {0}: {1}:{2}".format(cmd, str(status), response))
         return response, status
 
-    @staticmethod
-    def run_label_mapr_node(node_name, label, is_mapr_node, print_error=True):
-        cmd = K8SOperations.KUBECTL_LABEL_NODE.format(node_name, label, str(is_mapr_node).lower())
-        response, status = OSCommand.run2(cmd)
+    def get_node_inventory(self):
+        """
+        Read the names and labels of all nodes a page at a time. The native client asks the API server for
+        metadata only and kubectl prints only the names and labels, so the full node objects are never loaded.
+        """
+        inventory = NodeInventory()
+        if self.client is not None:
+            try:
+                for page in self.client.list_pages("v1", "Node", limit=K8SOperations.NODE_PAGE_SIZE, metadata_only=True):
+                    inventory.add_page(page)
+            except KubernetesException as e:
+                Log.error("Could not get nodes: {0}".format(e.value))
+                return None
+            return inventory
+
+        cmd = "nodes --chunk-size={0} -o go-template={1}".format(K8SOperations.NODE_PAGE_SIZE,
+                                                                   NodeInventory.KUBECTL_TEMPLATE)
+        response, status = self.run_get(cmd)
         if status != 0:
-            if print_error:
-                Log.error("Could not run {0}: {1}:{2}".format(cmd, str(status), response))
-        return response, status
+            return None
+        for line in response.splitlines():
+            inventory.add_kubectl_line(line)
+        return inventory
 
-    def run_oc_apply(self, key):
-        yaml_file, changed = self.get_yaml(key)
-        if yaml_file is None:
-            raise NotFoundException("The key '{0}' does not have an entry in the yamls dictonary".format(key))
+    def label_nodes(self, node_labels):
+        """
+        Set labels on many nodes at once. node_labels maps a node name to a dict of label to value. With the native
+        client each node gets one merge patch with all its labels and the patches run concurrently. With kubectl
+        nodes that need the same labels share one kubectl label command and the commands run concurrently. Returns a
+        dict of node name to an error message, or None when the node was labelled.
+        """
+        results = dict()
+        if self.client is not None:
+            names = sorted(node_labels.keys())
+            with WorkerPool(self.max_workers, "label") as pool:
+                tasks = [pool.submit(self._native_label_node, name, node_labels[name]) for name in names]
+            for name, task in zip(names, tasks):
+                results[name] = str(task.exc_info[1]) if task.failed() else task.result
+            return results
+
+        groups = dict()
+        for name, labels in node_labels.items():
+            groups.setdefault(tuple(sorted(labels.items())), list()).append(name)
+        chunks = list()
+        cmds = list()
+        for labels, names in groups.items():
+            label_args = " ".join("\"{0}={1}\"".format(label, value) for label, value in labels)
+            names = sorted(names)
+            for i in range(0, len(names), K8SOperations.LABEL_BATCH_SIZE):
+                chunk = names[i:i + K8SOperations.LABEL_BATCH_SIZE]
+                chunks.append(chunk)
+                cmds.append(K8SOperations.KUBECTL_LABEL_NODES.format(" ".join(chunk), label_args))
+
+        for chunk, (response, status) in zip(chunks, OSCommand.run_many(cmds, max_workers=self.max_workers)):
+            # kubectl reports each node it labelled on its own line even when others failed
+            labelled = set(line.split()[0] for line in response.splitlines() if line.startswith("node/"))
+            for name in chunk:
+                if "node/{0}".format(name) in labelled:
+                    results[name] = None
+                else:
+                    results[name] = response.strip() if status != 0 else "Not reported as labelled"
+        return results
+
+    def _native_label_node(self, node_name, labels):
+        try:
+            self.client.label("v1", "Node", node_name, labels)
+        except KubernetesException as e:
+            return e.value
+        return None
+
+    def _native_apply(self, name, content):
+        try:
+            for obj in self.client.load_yaml(content):
+                self.client.apply(obj)
+        except KubernetesException as e:
+            Log.error("Could not apply {0}: {1}".format(name, e.value))
+            return False
+        return True
 
-        cmd = "{0} {1}".format(K8SOperations.OC_APPLY, yaml_file)
-        result = self._run(cmd)
-        if changed:
-            self.delete_temp_yaml(yaml_file)
+    def _native_delete(self, key, ignore_not_found=False, wait=True):
+        """
+        Delete the objects of a key. Like kubectl delete, with wait this returns once the objects are gone, so
+        whatever depends on them is not deleted while they are still terminating on a finalizer.
+        """
+        objects = self.client.load_yaml(self.read_yaml(key))
+
+        # Objects are deleted in the reverse of the order they were created in
+        try:
+            for obj in reversed(objects):
+                self.client.delete(obj, ignore_not_found)
+        except KubernetesException as e:
+            Log.error("Could not delete {0}: {1}".format(key, e.value))
+            return False
+        if not wait:
+            return True
 
-        return result
+        watcher = DeletionWatcher(self, self.get_manifest(key).get_objects(), time.time() + self.delete_timeout)
+        return watcher.wait()
 
-    def run_oc_delete(self, key):
-        yaml_file, changed = self.get_yaml(key)
-        if yaml_file is None:
-            raise NotFoundException("The key '{0}' does not have an entry in the yamls dictonary".format(key))
+    def run_oc_apply(self, key):
+        return self._apply_key(key, self._run_oc_apply)
 
-        cmd = "{0} {1}".format(K8SOperations.OC_DELETE, yaml_file)
-        result = self._run(cmd)
-        if changed:
-            self.delete_temp_yaml(yaml_file)
+    def _run_oc_apply(self, key, content):
+        if self.client is not None:
+            return self._native_apply(key, content)
 
-        return result
+        return self.run_yaml_stream(K8SOperations.OC_APPLY, content)
+
+    def run_oc_delete(self, key, ignore_not_found=False, wait=True):
+        if self.apply_cache is not None:
+            self.apply_cache.forget(key)
+        if self.client is not None:
+            return self._native_delete(key, ignore_not_found, wait)
+
+        return self._run_yaml(K8SOperations.OC_DELETE, key, K8SOperations.get_delete_options(ignore_not_found, wait))
 
     def run_kubectl_apply(self, key):
-        yaml_file, changed = self.get_yaml(key)
-        if self.is_openshift:
-            applyop = K8SOperations.OC_APPLY
-        else:
-            applyop = K8SOperations.KUBECTL_APPLY
-        cmd = "{0} {1}".format(applyop, yaml_file)
-        result = self._run(cmd)
-        if changed:
-            self.delete_temp_yaml(yaml_file)
+        return self._apply_key(key, self._run_kubectl_apply)
 
-        return result
+    def _run_kubectl_apply(self, key, content):
+        return self.apply_yaml(key, content)
 
     def run_kubectl_get(self, get_str):
         cmd = "{0} {1}".format(K8SOperations.KUBECTL_GET, get_str)
@@ -323,39 +653,52 @@ class K8SOperations(object):
 
         return result
 
-    def run_kubectl_delete(self, key, ignore_not_found=False):
-        yaml_file, changed = self.get_yaml(key)
-        if yaml_file is None:
-            raise NotFoundException("The key '{0}' does not have an entry in the yamls dictonary".format(key))
+    @staticmethod
+    def get_delete_options(ignore_not_found, wait):
+        options = list()
+        if ignore_not_found:
+            options.append(K8SOperations.IGNORE_NOT_FOUND)
+        if not wait:
+            options.append(K8SOperations.DELETE_NO_WAIT)
+        if len(options) == 0:
+            return None
+        return " ".join(options)
+
+    def run_kubectl_delete(self, key, ignore_not_found=False, wait=True):
+        if self.apply_cache is not None:
+            self.apply_cache.forget(key)
+        # The native client deletes with background propagation and, like kubectl, waits for the objects only with wait
+        if self.client is not None:
+            return self._native_delete(key, ignore_not_found, wait)
+
         if self.is_openshift:
             deleteop = K8SOperations.OC_DELETE
         else:
             deleteop = K8SOperations.KUBECTL_DELETE
-        if ignore_not_found:
-            ignore_not_found_option = "--ignore-not-found"
-            cmd = "{0} {1} {2}".format(deleteop, yaml_file, ignore_not_found_option)
-        else:
-            cmd = "{0} {1}".format(deleteop, yaml_file)
-        result = self._run(cmd)
-        if changed:
-            self.delete_temp_yaml(yaml_file)
-
-        return result
+        return self._run_yaml(deleteop, key, K8SOperations.get_delete_options(ignore_not_found, wait))
 
     def run_kubectl_create_secret(self):
-        cmd = 'kubectl create secret generic system-user-secrets -n mapr-system ' \
-              '--from-literal="MAPR_USER=' + self.username + '" ' \
-              '--from-literal="MAPR_PASSWORD=' + self.password + '" ' \
-              '--from-literal="MAPR_GROUP=' + self.groupname + '" ' \
-              '--from-literal="MAPR_UID=' + str(self.userid) + '" ' \
-              '--from-literal="MAPR_GID=' + str(self.groupid) + '" ' \
-              '--from-literal="MYSQL_USER=' + self.mysql_user + '" ' \
-              '--from-literal="MYSQL_PASSWORD=' + self.mysql_pass + '" ' \
-              '--from-literal="LDAPADMIN_USER=' + self.ldapadmin_user + '" ' \
-              '--from-literal="LDAPADMIN_PASSWORD=' + self.ldapadmin_pass + '" ' \
-              '--from-literal="LDAPBIND_USER=' + self.ldapbind_user + '" ' \
-              '--from-literal="LDAPBIND_PASSWORD=' + self.ldapbind_pass + '"'
-        return self._run(cmd)
+        # The secret is streamed to stdin so the passwords are not on a command line or in the debug log
+        secret = {
+            "apiVersion": "v1",
+            "kind": "Secret",
+            "type": "Opaque",
+            "metadata": {"name": "system-user-secrets", "namespace": "mapr-system"},
+            "stringData": {
+                "MAPR_USER": self.username,
+                "MAPR_PASSWORD": self.password,
+                "MAPR_GROUP": self.groupname,
+                "MAPR_UID": str(self.userid),
+                "MAPR_GID": str(self.groupid),
+                "MYSQL_USER": self.mysql_user,
+                "MYSQL_PASSWORD": self.mysql_pass,
+                "LDAPADMIN_USER": self.ldapadmin_user,
+                "LDAPADMIN_PASSWORD": self.ldapadmin_pass,
+                "LDAPBIND_USER": self.ldapbind_user,
+                "LDAPBIND_PASSWORD": self.ldapbind_pass
+            }
+        }
+        return self.create_object(secret)
 
     def run_kubectl_delete_secret(self):
         cmd = 'kubectl delete secret system-user-secrets -n mapr-system '
@@ -364,6 +707,425 @@ class K8SOperations(object):
     def switch_to_oc(self):
         self.is_openshift = True
 
+    def get_manifest(self, key):
+        manifest = self.manifests.get(key)
+        if manifest is None:
+            manifest = Manifest(key, self.get_yaml_file(key), self.read_yaml(key))
+            self.manifests[key] = manifest
+        return manifest
+
+    def get_component_keys(self, component):
+        keys = K8SOperations.COMPONENT_KEYS.get(component)
+        if keys is None:
+            raise NotFoundException("The component '{0}' does not have an entry in the component keys".format(component))
+
+        if self.is_openshift:
+            return [key for key in keys if key not in K8SOperations.KUBERNETES_ONLY_KEYS]
+        return [key for key in keys if key not in K8SOperations.OPENSHIFT_ONLY_KEYS]
+
+    def get_component_graph(self, components, action, ready_action=None):
+        """
+        Build a dependency graph of all the yaml keys in the components. Inside a component a manifest depends on
+        every manifest of an earlier kind rank (namespace -> service account/role -> binding -> workload). Across
+        components a manifest depends on the manifest that creates its namespace. When a ready_action is given each
+        component with workloads gets a ready node after all its keys and manifests in other components that need
+        it wait for that node instead, so they start once the component is running rather than just applied.
+        """
+        graph = DependencyGraph()
+        namespace_keys = dict()
+        key_components = dict()
+        component_keys = list()
+
+        for component in components:
+            keys = self.get_component_keys(component)
+            component_keys.append(keys)
+            for key in keys:
+                graph.add_node(key, action, key)
+                key_components[key] = component
+                for namespace in self.get_manifest(key).get_created_namespaces():
+                    namespace_keys[namespace] = key
+
+        if ready_action is not None:
+            for component, keys in zip(components, component_keys):
+                if len(self.get_component_workloads(component)) == 0:
+                    continue
+                ready_node = K8SOperations.READY_NODE.format(component)
+                graph.add_node(ready_node, ready_action, component)
+                for key in keys:
+                    graph.add_dependency(ready_node, key)
+
+        for keys in component_keys:
+            for key in keys:
+                manifest = self.get_manifest(key)
+                rank = manifest.get_rank()
+                for other_key in keys:
+                    if self.get_manifest(other_key).get_rank() < rank:
+                        graph.add_dependency(key, other_key)
+                for namespace in manifest.get_namespaces():
+                    namespace_key = namespace_keys.get(namespace)
+                    if namespace_key is None:
+                        continue
+                    ready_node = K8SOperations.READY_NODE.format(key_components[namespace_key])
+                    if key_components[namespace_key] != key_components[key] and graph.has_node(ready_node):
+                        graph.add_dependency(key, ready_node)
+                    else:
+                        graph.add_dependency(key, namespace_key)
+
+        return graph
+
+    def get_component_workloads(self, component):
+        workloads = list()
+        for key in self.get_component_keys(component):
+            for obj in self.get_manifest(key).get_objects():
+                if obj.kind in ReadinessWatcher.WORKLOAD_KINDS:
+                    workloads.append(obj)
+        return workloads
+
+    def wait_for_component(self, component):
+        workloads = self.get_component_workloads(component)
+        if len(workloads) == 0:
+            return True
+
+        # A resumed install does not wait again for a component that was ready with the same yamls
+        step = K8SOperations.READY_NODE.format(component)
+        digest = None
+        if self.journal is not None:
+            digest = ApplyCache.hash_content(self.get_yaml_stream(self.get_component_keys(component)))
+            if self.journal.is_completed(step, digest):
+                Log.info("Skipping the wait for {0}; It was ready in the install that is being resumed".format(
+                    component), True)
+                return True
+
+        Log.info("Waiting up to {0}s for {1} workload(s) of {2} to be ready...".format(
+            self.ready_timeout, len(workloads), component), True)
+        watcher = ReadinessWatcher(self, workloads, self.ready_timeout)
+        ready = watcher.wait()
+        Log.info("Time to ready for {0}:".format(component), True)
+        watcher.log_summary()
+        if self.journal is not None:
+            self.journal.record(step, digest, ready)
+        return ready
+
+    def install_components(self, components):
+        """
+        Install the components. With rollback each component, or each segment of components that is installed
+        together, is a phase; When a phase fails what it created is deleted and the components after it are not
+        installed. Returns False when a phase was rolled back.
+        """
+        if not self.parallel and not self.batch_apply:
+            for component in components:
+                if not self.run_phase([component], self._install_component, component):
+                    return False
+            return True
+
+        # Components that are not described in COMPONENT_KEYS keep their install method and split the others
+        segment = list()
+        for component in components:
+            if component in K8SOperations.COMPONENT_KEYS:
+                segment.append(component)
+                continue
+            if not self.run_phase(segment, self._install_component_segment, segment):
+                return False
+            segment = list()
+            if not self.run_phase([component], self._install_component, component):
+                return False
+        return self.run_phase(segment, self._install_component_segment, segment)
+
+    def run_phase(self, components, install, *args):
+        """
+        Run install(*args) as one phase. Without rollback it is just run. With rollback the phase fails when install
+        returns False or logs an error and what it created is then deleted.
+        """
+        if not self.rollback or len(components) == 0:
+            install(*args)
+            return True
+
+        name = "The install of {0}".format(", ".join(components))
+        keys = list()
+        for component in components:
+            if component in K8SOperations.COMPONENT_KEYS:
+                keys.extend(self.get_component_keys(component))
+        errors = Log.get_error_count()
+        self._phase = InstallPhase(self, name, keys)
+        try:
+            result = install(*args)
+        finally:
+            phase = self._phase
+            self._phase = None
+        if result is not False and Log.get_error_count() == errors:
+            return True
+
+        phase.rollback()
+        return False
+
+    def _install_component(self, component):
+        getattr(self, "install_{0}_components".format(component))()
+        if self.wait_ready and component in K8SOperations.COMPONENT_KEYS:
+            return self.wait_for_component(component)
+        return True
+
+    def _install_component_segment(self, components):
+        if self.batch_apply:
+            return self.install_components_batch(components)
+        return self.install_components_graph(components)
+
+    def install_components_graph(self, components):
+        if len(components) == 0:
+            return True
+
+        ready_action = self.wait_for_component if self.wait_ready else None
+        graph = self.get_component_graph(components, self._install_component_key, ready_action)
+        Log.info(os.linesep + "Installing {0} components with up to {1} concurrent operations...".format(
+            ", ".join(components), self.max_workers), True)
+
+        with WorkerPool(self.max_workers, "install") as pool:
+            results = graph.run(pool)
+
+        failed = [key for key in graph.get_nodes() if results.get(key) != DependencyGraph.SUCCEEDED]
+        if len(failed) == 0:
+            Log.info("Installed {0} yaml(s) for {1}".format(len(results), ", ".join(components)), True)
+        else:
+            Log.warning("{0} of {1} yaml(s) were not installed: {2}".format(len(failed), len(results), ", ".join(failed)))
+        return len(failed) == 0
+
+    def install_components_batch(self, components):
+        if len(components) == 0:
+            return True
+
+        if not self.parallel:
+            results = [self.install_component_batch(component) for component in components]
+            return all(results)
+
+        # Each component is one batch. A component only waits for another one when it uses a namespace it creates
+        graph = DependencyGraph()
+        namespace_components = dict()
+        for component in components:
+            graph.add_node(component, self.install_component_batch, component)
+            for key in self.get_component_keys(component):
+                for namespace in self.get_manifest(key).get_created_namespaces():
+                    namespace_components[namespace] = component
+        for component in components:
+            for key in self.get_component_keys(component):
+                for namespace in self.get_manifest(key).get_namespaces():
+                    if namespace in namespace_components:
+                        graph.add_dependency(component, namespace_components[namespace])
+
+        with WorkerPool(self.max_workers, "install") as pool:
+            results = graph.run(pool)
+        return all(results.get(component) == DependencyGraph.SUCCEEDED for component in components)
+
+    def install_component_batch(self, component):
+        if not self.apply_component_batch(component):
+            return False
+        if self.wait_ready:
+            return self.wait_for_component(component)
+        return True
+
+    def apply_component_batch(self, component):
+        """
+        Apply all the yamls of a component with one kubectl invocation. The yamls are streamed to stdin in kind
+        rank order. If the batch fails each yaml is applied by itself so the error can be attributed to a key.
+        """
+        keys = self.sort_keys_by_rank(self.get_component_keys(component))
+        contents = dict((key, self.read_yaml(key)) for key in keys)
+        digests = dict((key, self.get_changed_digest(key, contents[key])) for key in keys)
+        changed_keys = [key for key in keys if digests[key] is not None]
+        if len(changed_keys) == 0:
+            Log.info(os.linesep + "All {0} yaml(s) for {1} are unchanged since they were last applied".format(
+                len(keys), component), True)
+            return True
+        Log.info(os.linesep + "Applying {0} yaml(s) for {1} in a single batch...".format(len(changed_keys), component),
+                 True)
+
+        if not self.apply_yaml(component, K8SOperations.join_yamls([contents[key] for key in changed_keys])):
+            Log.info("The batch apply for {0} failed; Applying each yaml separately...".format(component), True)
+            results = [self._install_component_key(key) for key in changed_keys]
+            return all(results)
+
+        for key in changed_keys:
+            self.record_applied(key, digests[key])
+        for key in keys:
+            policy_add = K8SOperations.OPENSHIFT_POLICY_ADD.get(key)
+            if policy_add is not None:
+                getattr(self, policy_add)()
+        Log.info("Created {0} yaml(s) for {1}".format(len(changed_keys), component), True)
+        return True
+
+    def uninstall_components(self, components):
+        """
+        Delete the components in order. Without --parallel or --fast each uninstall_*_components method is run and
+        every delete waits for its objects to be gone. With --parallel all the yamls of a component described in
+        COMPONENT_KEYS are deleted concurrently without waiting. With --fast those components are removed together by
+        teardown_components. The deleted objects are returned so wait_for_deletion can wait for all of them at once.
+        """
+        pending = list()
+        teardown = list()
+        for component in components:
+            if component not in K8SOperations.COMPONENT_KEYS or not (self.parallel or self.fast_teardown):
+                getattr(self, "uninstall_{0}_components".format(component))()
+                continue
+            if self._delete_deadline is None:
+                self._delete_deadline = time.time() + self.delete_timeout
+            if self.fast_teardown:
+                teardown.append(component)
+            else:
+                pending.extend(self.delete_component(component))
+        if len(teardown) > 0:
+            pending.extend(self.teardown_components(teardown))
+        return pending
+
+    def teardown_components(self, components):
+        """
+        The fast uninstall. The namespaces of the components are deleted and Kubernetes deletes everything in them.
+        The objects outside those namespaces, such as cluster roles, CRDs and priority classes, are deleted with one
+        command per kind and namespace that names all of them. Nothing waits for finalizers; the deleted namespaces
+        and objects are returned for wait_for_deletion.
+        """
+        keys = list()
+        for component in components:
+            keys.extend(self.get_component_keys(component))
+        objects = list()
+        for key in keys:
+            if self.apply_cache is not None:
+                self.apply_cache.forget(key)
+            objects.extend(self.get_manifest(key).get_objects())
+
+        namespaces = set(obj.name for obj in objects if obj.kind == "Namespace")
+        Log.info(os.linesep + "Deleting {0} namespace(s) and the other objects of {1}...".format(
+            len(namespaces), ", ".join(components)), True)
+        for key in keys:
+            policy_remove = K8SOperations.OPENSHIFT_POLICY_REMOVE.get(key)
+            if policy_remove is not None:
+                getattr(self, policy_remove)()
+
+        pending, failed = self.delete_objects(objects)
+        if failed > 0:
+            Log.warning("{0} delete(s) for {1} failed".format(failed, ", ".join(components)))
+        return pending
+
+    def delete_objects(self, objects):
+        """
+        Delete the objects without waiting for finalizers. Objects in a namespace that is deleted too are left to
+        Kubernetes to delete with it. The others are deleted with one command per kind and namespace that names all
+        of them. Kinds are deleted in the reverse of the order they are created in and the commands for the same
+        rank run concurrently. Returns the deleted objects and the number of commands that failed.
+        """
+        namespaces = set(obj.name for obj in objects if obj.kind == "Namespace")
+        batches = dict()
+        for obj in objects:
+            if obj.kind is None or (obj.kind not in Manifest.CLUSTER_KINDS and obj.namespace in namespaces):
+                continue
+            namespace = None if obj.kind in Manifest.CLUSTER_KINDS else obj.namespace
+            batch = batches.setdefault((obj.kind, namespace), list())
+            if obj.name not in [other.name for other in batch]:
+                batch.append(obj)
+
+        ranks = dict()
+        for kind, namespace in batches:
+            rank = Manifest.KIND_RANKS.get(kind, Manifest.WORKLOAD_RANK)
+            ranks.setdefault(rank, list()).append((kind, namespace))
+
+        failed = 0
+        with WorkerPool(self.max_workers, "delete") as pool:
+            for rank in sorted(ranks, reverse=True):
+                tasks = list()
+                for kind, namespace in sorted(ranks[rank], key=lambda item: (item[0], item[1] or "")):
+                    batch = batches[(kind, namespace)]
+                    if self.client is not None:
+                        tasks.extend(pool.submit(self._native_delete_object, obj) for obj in batch)
+                    else:
+                        tasks.append(pool.submit(self.delete_batch, kind, namespace, [obj.name for obj in batch]))
+                WorkerPool.wait_all(tasks)
+                failed += len([task for task in tasks if task.failed() or task.result is False])
+
+        pending = list()
+        for batch in batches.values():
+            pending.extend(batch)
+        return pending, failed
+
+    def _native_delete_object(self, obj):
+        try:
+            self.client.delete(obj.to_reference(), True)
+        except KubernetesException as e:
+            Log.error("Could not delete {0}: {1}".format(obj, e.value))
+            return False
+        return True
+
+    def delete_batch(self, kind, namespace, names):
+        if self.is_openshift:
+            cmd = "oc delete {0} {1}".format(kind.lower(), " ".join(names))
+        else:
+            cmd = "kubectl delete {0} {1}".format(kind.lower(), " ".join(names))
+        if namespace is not None:
+            cmd = "{0} -n {1}".format(cmd, namespace)
+        return self._run("{0} {1}".format(cmd, K8SOperations.get_delete_options(True, False)))
+
+    def delete_component(self, component):
+        keys = self.get_component_keys(component)
+        Log.info(os.linesep + "Deleting {0} yaml(s) for {1} with up to {2} concurrent operations...".format(
+            len(keys), component, self.max_workers), True)
+
+        # The Openshift policies bind the SCCs so they are removed before any SCC is deleted
+        for key in keys:
+            policy_remove = K8SOperations.OPENSHIFT_POLICY_REMOVE.get(key)
+            if policy_remove is not None:
+                getattr(self, policy_remove)()
+
+        with WorkerPool(self.max_workers, "uninstall") as pool:
+            tasks = [(key, pool.submit(self._delete_component_key, key)) for key in reversed(keys)]
+            WorkerPool.wait_all([task for _, task in tasks])
+
+        pending = list()
+        failed = list()
+        for key, task in tasks:
+            if task.failed() or not task.result:
+                failed.append(key)
+            else:
+                pending.extend(self.get_manifest(key).get_objects())
+        if len(failed) == 0:
+            Log.info("Deleted {0} yaml(s) for {1}".format(len(keys), component), True)
+        else:
+            Log.warning("{0} of {1} yaml(s) were not deleted: {2}".format(len(failed), len(keys), ", ".join(failed)))
+        return pending
+
+    def _delete_component_key(self, key):
+        if key in K8SOperations.OPENSHIFT_POLICY_REMOVE:
+            return self.run_oc_delete(key, True, False)
+        return self.run_kubectl_delete(key, True, False)
+
+    def wait_for_deletion(self, objects):
+        """
+        Wait until the deleted objects are gone, up to the deadline shared by the whole uninstall. Objects that are
+        still there are reported with the finalizers they are waiting for.
+        """
+        if len(objects) == 0:
+            return True
+        watcher = DeletionWatcher(self, objects, self._delete_deadline)
+        return watcher.wait()
+
+    def sort_keys_by_rank(self, keys):
+        # sorted is stable so keys of the same rank keep the order of the component
+        return sorted(keys, key=lambda k: self.get_manifest(k).get_rank())
+
+    def get_yaml_stream(self, keys):
+        return K8SOperations.join_yamls([self.read_yaml(key) for key in keys])
+
+    @staticmethod
+    def join_yamls(contents):
+        return K8SOperations.YAML_SEPARATOR.join(content.strip() for content in contents) + "\n"
+
+    def _install_component_key(self, key):
+        policy_add = K8SOperations.OPENSHIFT_POLICY_ADD.get(key)
+        if policy_add is not None:
+            if not self.run_oc_apply(key):
+                return False
+            getattr(self, policy_add)()
+        elif not self.run_kubectl_apply(key):
+            return False
+
+        Log.info("Created {0}".format(key), True)
+        return True
+
     def bootstrap_openshift_policy_add(self):
         cmd = 'oc adm policy add-cluster-role-to-user maprbootstrap-cr ' \
               ' system:serviceaccount:mapr-bootstrap:maprbootstrap-sa'
@@ -1705,3 +2467,7 @@ class K8SOperations(object):
         Log.info(os.linesep + "Deleting UI Namespace...", True)
         if self.run_kubectl_delete("ui-namespace"):
             Log.info("Deleted UI Namespace.")
+
+
+Tracer.trace_methods(K8SOperations, ("install_", "uninstall_", "_install_component_key", "apply_component_batch",
+                                     "wait_for_component", "label_nodes", "get_node_inventory"), "phase")
@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+
+from common.const import Constants
+from common.mapr_logger.log import Log
+from common.worker_pool import WorkerPool
+from mapr_exceptions.ex import KubernetesException
+
+
+class ReadinessWatcher(object):
+    """
+    Waits for the workloads applied by a phase to finish rolling out and records how long each one took.
+
+    With the native client each namespace and kind is followed by one watch stream. The API server only watches
+    one resource type per stream, so a namespace with deployments and daemonsets has two. With kubectl every
+    namespace is polled with one get of all the pending kinds. Polls and watch reconnects back off exponentially
+    instead of sleeping for a fixed time.
+    """
+    WORKLOAD_KINDS = ("Deployment", "StatefulSet", "DaemonSet")
+    KIND_RESOURCES = {"Deployment": "deployments", "StatefulSet": "statefulsets", "DaemonSet": "daemonsets"}
+    API_VERSION = "apps/v1"
+    DEFAULT_TIMEOUT = Constants.READY_TIMEOUT
+    INITIAL_DELAY = 1
+    MAX_DELAY = 30
+    MAX_WATCH = 60
+
+    def __init__(self, k8s, objects, timeout=DEFAULT_TIMEOUT):
+        self.k8s = k8s
+        self.timeout = timeout
+        self.objects = [obj for obj in objects if obj.kind in ReadinessWatcher.WORKLOAD_KINDS]
+        self.ready_times = dict()
+        self._started = time.time()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_ready(kind, item):
+        metadata = item.get("metadata", dict())
+        spec = item.get("spec", dict())
+        status = item.get("status") or dict()
+        if status.get("observedGeneration", 0) < metadata.get("generation", 0):
+            return False
+
+        if kind == "Deployment":
+            replicas = spec.get("replicas", 1)
+            updated = status.get("updatedReplicas", 0)
+            return updated >= replicas and status.get("replicas", 0) <= updated and \
+                status.get("availableReplicas", 0) >= updated
+        if kind == "StatefulSet":
+            replicas = spec.get("replicas", 1)
+            if status.get("readyReplicas", 0) < replicas:
+                return False
+            if spec.get("updateStrategy", dict()).get("type") == "OnDelete":
+                return True
+            return status.get("updateRevision") is None or status.get("currentRevision") == status.get("updateRevision")
+        if kind == "DaemonSet":
+            desired = status.get("desiredNumberScheduled", 0)
+            return status.get("updatedNumberScheduled", 0) >= desired and status.get("numberAvailable", 0) >= desired
+        return True
+
+    def _mark_ready(self, obj):
+        with self._lock:
+            if str(obj) in self.ready_times:
+                return
+            elapsed = time.time() - self._started
+            self.ready_times[str(obj)] = elapsed
+        Log.info("{0} is ready after {1:.1f}s".format(obj, elapsed))
+
+    def _groups(self):
+        groups = dict()
+        for obj in self.objects:
+            namespace = obj.namespace or "default"
+            if self.k8s.client is not None:
+                group = (namespace, obj.kind)
+            else:
+                group = (namespace, None)
+            groups.setdefault(group, list()).append(obj)
+        return groups
+
+    def wait(self):
+        """
+        Wait until all the workloads are ready or the timeout passes. Returns True when all are ready.
+        """
+        if len(self.objects) == 0:
+            return True
+
+        deadline = self._started + self.timeout
+        groups = self._groups()
+        if len(groups) == 1:
+            (namespace, kind), objects = list(groups.items())[0]
+            self._wait_group(namespace, kind, objects, deadline)
+        else:
+            with WorkerPool(len(groups), "ready") as pool:
+                tasks = [pool.submit(self._wait_group, namespace, kind, objects, deadline)
+                         for (namespace, kind), objects in groups.items()]
+                WorkerPool.wait_all(tasks)
+
+        not_ready = [str(obj) for obj in self.objects if str(obj) not in self.ready_times]
+        if len(not_ready) > 0:
+            Log.warning("{0} workload(s) were not ready after {1}s: {2}".format(len(not_ready), self.timeout,
+                                                                               ", ".join(not_ready)))
+            return False
+        return True
+
+    def _wait_group(self, namespace, kind, objects, deadline):
+        if kind is None:
+            self._poll_namespace(namespace, objects, deadline)
+        else:
+            self._watch_kind(namespace, kind, objects, deadline)
+
+    def _check(self, kind, item, pending):
+        obj = pending.get((kind, item.get("metadata", dict()).get("name")))
+        if obj is not None and ReadinessWatcher.is_ready(kind, item):
+            self._mark_ready(obj)
+            del pending[(kind, obj.name)]
+
+    def _poll_namespace(self, namespace, objects, deadline):
+        pending = dict(((obj.kind, obj.name), obj) for obj in objects)
+        delay = ReadinessWatcher.INITIAL_DELAY
+
+        while True:
+            kinds = sorted(set(ReadinessWatcher.KIND_RESOURCES[kind] for kind, _ in pending))
+            response, status = self.k8s.run_get("{0} -n {1} -o=json".format(",".join(kinds), namespace), False)
+            if status == 0:
+                for item in json.loads(response).get("items", list()):
+                    self._check(item.get("kind"), item, pending)
+            if len(pending) == 0 or time.time() + delay > deadline:
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, ReadinessWatcher.MAX_DELAY)
+
+    def _watch_kind(self, namespace, kind, objects, deadline):
+        pending = dict(((obj.kind, obj.name), obj) for obj in objects)
+        client = self.k8s.client
+        delay = ReadinessWatcher.INITIAL_DELAY
+
+        while len(pending) > 0 and time.time() < deadline:
+            try:
+                # Each (re)connect lists first so no change between two watches is missed
+                resource_version = None
+                for page in client.list_pages(ReadinessWatcher.API_VERSION, kind, namespace):
+                    resource_version = page.get("metadata", dict()).get("resourceVersion")
+                    for item in page.get("items") or list():
+                        self._check(kind, item, pending)
+
+                timeout = min(deadline - time.time(), ReadinessWatcher.MAX_WATCH)
+                while len(pending) > 0 and timeout > 0:
+                    for event_type, item in client.watch(ReadinessWatcher.API_VERSION, kind, namespace,
+                                                         resource_version, timeout):
+                        if event_type == "ERROR":
+                            # The resource version is too old; start again with a fresh list
+                            resource_version = None
+                            break
+                        resource_version = item.get("metadata", dict()).get("resourceVersion", resource_version)
+                        if event_type in ("ADDED", "MODIFIED"):
+                            self._check(kind, item, pending)
+                        if len(pending) == 0:
+                            break
+                    if resource_version is None:
+                        break
+                    timeout = min(deadline - time.time(), ReadinessWatcher.MAX_WATCH)
+                delay = ReadinessWatcher.INITIAL_DELAY
+            except KubernetesException as e:
+                Log.debug("Watch of {0} in {1} failed: {2}".format(kind, namespace, e.value))
+                time.sleep(min(delay, max(deadline - time.time(), 0)))
+                delay = min(delay * 2, ReadinessWatcher.MAX_DELAY)
+
+    def log_summary(self):
+        for name, elapsed in sorted(self.ready_times.items(), key=lambda item: item[1]):
+            Log.info("  {0:6.1f}s {1}".format(elapsed, name), True)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from common.mapr_logger.log import Log
+from k8s_deletion import DeletionWatcher
+
+
+class InstallPhase(object):
+    """
+    One install phase that can be rolled back when it fails. The objects of the yamls in the phase that already
+    exist are found before anything is applied, so a rollback only deletes what the phase created and never an
+    object that was there before it. Yamls that are not known when the phase starts are checked just before they
+    are applied.
+    """
+    def __init__(self, k8s, name, keys=None):
+        self.k8s = k8s
+        self.name = name
+        # The keys applied by the phase, in the order they were applied
+        self.applied = list()
+        # Objects the phase created that are not in a yaml; They did not exist or creating them would have failed
+        self.created = list()
+        self.existing = set()
+        self._checked = set()
+        self._lock = threading.Lock()
+        if keys:
+            self.check_existing(keys)
+
+    def check_existing(self, keys):
+        with self._lock:
+            keys = [key for key in keys if key not in self._checked]
+            self._checked.update(keys)
+        if len(keys) == 0:
+            return
+
+        objects = list()
+        for key in keys:
+            objects.extend(self.k8s.get_manifest(key).get_objects())
+        existing = DeletionWatcher(self.k8s, objects, None).find_existing()
+        with self._lock:
+            self.existing.update(existing)
+
+    def record_applied(self, key):
+        with self._lock:
+            if key not in self.applied:
+                self.applied.append(key)
+
+    def record_created(self, obj):
+        with self._lock:
+            self.created.append(obj)
+
+    def get_created_objects(self):
+        objects = list()
+        names = set()
+        with self._lock:
+            for obj in self.created:
+                names.add(str(obj))
+                objects.append(obj)
+            for key in self.applied:
+                for obj in self.k8s.get_manifest(key).get_objects():
+                    if str(obj) not in self.existing and str(obj) not in names:
+                        names.add(str(obj))
+                        objects.append(obj)
+        return objects
+
+    def rollback(self):
+        """
+        Delete the objects the phase created, in the reverse of the order they are created in, and wait for them to
+        be gone. Returns True when all of them are gone.
+        """
+        objects = self.get_created_objects()
+        if len(objects) == 0:
+            Log.info("{0} failed before it created anything; There is nothing to roll back".format(self.name), True)
+            return True
+
+        Log.warning("{0} failed; Rolling back the {1} object(s) it created...".format(self.name, len(objects)))
+        with self._lock:
+            keys = list(self.applied)
+        for key in keys:
+            self.k8s.forget_applied(key)
+
+        pending, failed = self.k8s.delete_objects(objects)
+        if failed > 0:
+            Log.warning("{0} delete(s) of the rollback of {1} failed".format(failed, self.name))
+        watcher = DeletionWatcher(self.k8s, pending, time.time() + self.k8s.delete_timeout)
+        gone = watcher.wait()
+        if gone and failed == 0:
+            Log.info("Rolled back {0}".format(self.name), True)
+        return gone and failed == 0
@@ -4,6 +4,7 @@ from mapr.clouds.cloud import Cloud
 
 class AWSCloud(Cloud):
     NAME = "AWS"
+    ENABLED = False
 
     def __init__(self):
         super(AWSCloud, self).__init__()
@@ -12,7 +13,7 @@ class AWSCloud(Cloud):
         return AWSCloud.NAME
 
     def is_enabled(self):
-        self.enabled = False
+        self.enabled = AWSCloud.ENABLED
         return self.enabled
 
     def is_available(self):
@@ -2,12 +2,22 @@ from azure.mgmt.compute.models import DiskCreateOptionTypes
 from azure.mgmt.compute.models import StorageAccountTypes
 
 from common.mapr_logger.log import Log
+from common.worker_pool import WorkerPool
+from mapr_exceptions.ex import AzureException
 
 
 class AddDataDisks(object):
-    def __init__(self, env, compute_client):
+    MAX_WORKERS = 16
+    REPORT_NOTHING_TO_DO = "already has its data disks"
+    REPORT_ATTACHED = "attached {0} data disk(s)"
+
+    def __init__(self, env, compute_client, max_workers=MAX_WORKERS):
         self.env = env
         self.compute_client = compute_client
+        self.max_workers = max_workers
+        self.report = dict()
+        # The VMs whose disks were not created or attached
+        self.failed = list()
 
         self.aks_rg = self.env.get("RESOURCE_GROUP")
         self.aks_name = self.env.get("AKS_NAME")
@@ -30,12 +40,18 @@ class AddDataDisks(object):
             Log.info("Creating data disks of type; {0}".format(self.data_disk_type), True)
 
     def run(self):
+        """
+        Create the missing data disks of every VM as concurrent long running operations, wait for all of them, then
+        attach each VM's disks with one concurrent update per VM. A failure only affects its own VM. Returns the
+        report of what happened to each VM. Raises AzureException once the others are done when any VM failed.
+        """
         Log.info("Checking disks in resource group: {0}...".format(self.resource_group), True)
 
         existing_disks = self.compute_client.disks.list_by_resource_group(self.resource_group)
         for disk in existing_disks:
             Log.info("Found managed disk: {0}".format(disk.name), True)
 
+        plans = list()
         vms = self.compute_client.virtual_machines.list(self.resource_group)
         for vm in vms:
             Log.info("Checking VM: {0} for data disks".format(vm.name), True)
@@ -45,22 +61,70 @@ class AddDataDisks(object):
             if len(attached_disks) >= self.data_disk_count:
                 Log.info("There are already {0} data disk(s) attached when only {1} were required".format(len(attached_disks),
                                                                                                           self.data_disk_count), True)
+                self.report[vm.name] = AddDataDisks.REPORT_NOTHING_TO_DO
                 continue
 
-            disks = list()
-            for i in range(len(attached_disks), self.data_disk_count):
-                data_disk_name = "{0}_DataDisk_{1}".format(vm.name, i)
-                Log.info("Creating or updating data disk: {0}...".format(data_disk_name), True)
-
-                disk = self.create_disk(data_disk_name)
-                disks.append(disk)
-                Log.info("The data disk is: {0}".format(disk.name), True)
-
-            Log.info("Attaching the data disks to the vm...", True)
-            self.attach_disks(vm, disks, len(attached_disks))
-
-    def create_disk(self, name):
-        async_creation = self.compute_client.disks.create_or_update(
+            names = ["{0}_DataDisk_{1}".format(vm.name, i) for i in range(len(attached_disks), self.data_disk_count)]
+            plans.append((vm, names, len(attached_disks)))
+
+        with WorkerPool(self.max_workers, "azure-disk") as pool:
+            # Every disk of every VM is started before any is waited for so the creations run together
+            pollers = dict()
+            for vm, names, _ in plans:
+                for name in names:
+                    Log.info("Creating or updating data disk: {0}...".format(name), True)
+                    pollers[name] = pool.submit(self.begin_create_disk, name)
+
+            attach_tasks = list()
+            for vm, names, lun in plans:
+                disks = self.wait_for_disks(vm, names, pollers)
+                if disks is not None:
+                    Log.info("Attaching the data disks to the vm {0}...".format(vm.name), True)
+                    attach_tasks.append((vm, pool.submit(self.attach_disks, vm, disks, lun)))
+
+            for vm, task in attach_tasks:
+                task.wait()
+                if task.failed():
+                    Log.error("Could not attach the data disks of VM {0}: {1}".format(vm.name, str(task.exc_info[1])))
+                    self.report[vm.name] = "attach failed: {0}".format(str(task.exc_info[1]))
+                    self.failed.append(vm.name)
+                else:
+                    self.report[vm.name] = AddDataDisks.REPORT_ATTACHED.format(len(task.result))
+
+        self.log_report()
+        if len(self.failed) > 0:
+            raise AzureException("The data disks of {0} of {1} VM(s) were not provisioned: {2}".format(
+                len(self.failed), len(self.report), ", ".join(sorted(self.failed))))
+        return self.report
+
+    def wait_for_disks(self, vm, names, pollers):
+        disks = list()
+        for name in names:
+            task = pollers[name]
+            task.wait()
+            try:
+                if task.failed():
+                    raise task.exc_info[1]
+                disk = task.result.result()
+            except Exception as e:
+                Log.error("Could not create data disk {0} for VM {1}: {2}".format(name, vm.name, str(e)))
+                self.report[vm.name] = "create failed: {0}".format(str(e))
+                self.failed.append(vm.name)
+                return None
+            Log.info("The data disk is: {0}".format(disk.name), True)
+            disks.append(disk)
+        return disks
+
+    def log_report(self):
+        Log.info("Data disks by VM:", True)
+        for vm_name, result in sorted(self.report.items()):
+            Log.info("  {0}: {1}".format(vm_name, result), True)
+
+    def begin_create_disk(self, name):
+        """
+        Start creating the disk and return the poller of the long running operation without waiting for it
+        """
+        return self.compute_client.disks.create_or_update(
             self.resource_group,
             name,
             {
@@ -74,8 +138,6 @@ class AddDataDisks(object):
                 }
             }
         )
-        disk_resource = async_creation.result()
-        return disk_resource
 
     def attach_disks(self, vm, disks, lun):
         vm = self.compute_client.virtual_machines.get(
@@ -101,3 +163,4 @@ class AddDataDisks(object):
             vm
         )
         async_update.wait()
+        return disks
@@ -1,11 +1,21 @@
 from common.mapr_logger.log import Log
+from common.worker_pool import WorkerPool
+from mapr_exceptions.ex import AzureException
 
 
 class AddPublicIp(object):
-    def __init__(self, env, compute_client, network_client):
+    MAX_WORKERS = 16
+    REPORT_EXISTING = "already has a public ip address"
+    REPORT_ASSOCIATED = "public ip address associated"
+
+    def __init__(self, env, compute_client, network_client, max_workers=MAX_WORKERS):
         self.env = env
         self.compute_client = compute_client
         self.network_client = network_client
+        self.max_workers = max_workers
+        self.report = dict()
+        # The NICs that did not get a public ip address
+        self.failed = list()
 
         self.aks_rg = self.env.get("RESOURCE_GROUP")
         self.aks_name = self.env.get("AKS_NAME")
@@ -14,37 +24,80 @@ class AddPublicIp(object):
         self.resource_group = "MC_{0}_{1}_{2}".format(self.aks_rg, self.aks_name, self.location)
 
     def run(self):
+        """
+        Create a public ip for every NIC that does not have one, then associate each ip with its NIC. Both steps
+        fan out over a bounded pool of workers and a NIC's association starts as soon as its ip exists. A failure
+        only affects its own NIC. Returns the report of what happened to each NIC. Raises AzureException once the
+        others are done when any NIC failed.
+        """
         # vms = self.compute_client.virtual_machines.list(self.resource_group)
         # for vm in vms:
         #     nic = vm.network_profile.network_interfaces
         #     pass
 
-        nics = self.network_client.network_interfaces.list(self.resource_group)
-        for nic in nics:
-            ipconfig = nic.ip_configurations[0]
+        # The single list call has the ip configuration of every NIC so no NIC is fetched on its own
+        pending = list()
+        for nic in self.network_client.network_interfaces.list(self.resource_group):
+            if nic.ip_configurations[0].public_ip_address is not None:
+                Log.info("{0} NIC already has a public ip address".format(nic.name), True)
+                self.report[nic.name] = AddPublicIp.REPORT_EXISTING
+            else:
+                pending.append(nic)
 
-            public_ip_name = "{0}-publicip".format(nic.name)
-            public_ip = {
-                'location': self.location,
-                'public_ip_allocation_method': 'Dynamic'
-            }
+        with WorkerPool(self.max_workers, "azure-ip") as pool:
+            ip_tasks = [(nic, pool.submit(self.create_public_ip, nic)) for nic in pending]
 
-            if ipconfig.public_ip_address is not None:
-                Log.info("{0} NIC already has a public ip address".format(nic.name), True)
-                continue
+            associate_tasks = list()
+            for nic, task in ip_tasks:
+                task.wait()
+                if task.failed():
+                    Log.error("Could not create the public ip of NIC {0}: {1}".format(nic.name, str(task.exc_info[1])))
+                    self.report[nic.name] = "public ip failed: {0}".format(str(task.exc_info[1]))
+                    self.failed.append(nic.name)
+                else:
+                    associate_tasks.append((nic, pool.submit(self.associate_public_ip, nic, task.result)))
 
-            Log.info("Creating or updating public ip address {0}...".format(public_ip_name), True)
-            ip_rslt = self.network_client.public_ip_addresses.create_or_update(self.resource_group, public_ip_name, public_ip)
-            ip_rslt.wait()
+            for nic, task in associate_tasks:
+                task.wait()
+                if task.failed():
+                    Log.error("Could not associate the public ip of NIC {0}: {1}".format(nic.name,
+                                                                                       str(task.exc_info[1])))
+                    self.report[nic.name] = "association failed: {0}".format(str(task.exc_info[1]))
+                    self.failed.append(nic.name)
+                else:
+                    self.report[nic.name] = AddPublicIp.REPORT_ASSOCIATED
 
+        Log.info("Public ip addresses by NIC:", True)
+        for nic_name, result in sorted(self.report.items()):
+            Log.info("  {0}: {1}".format(nic_name, result), True)
+        if len(self.failed) > 0:
+            raise AzureException("The public ip addresses of {0} of {1} NIC(s) were not set up: {2}".format(
+                len(self.failed), len(self.report), ", ".join(sorted(self.failed))))
+        return self.report
+
+    def create_public_ip(self, nic):
+        public_ip_name = "{0}-publicip".format(nic.name)
+        public_ip = {
+            'location': self.location,
+            'public_ip_allocation_method': 'Dynamic'
+        }
+
+        Log.info("Creating or updating public ip address {0}...".format(public_ip_name), True)
+        ip_rslt = self.network_client.public_ip_addresses.create_or_update(self.resource_group, public_ip_name, public_ip)
+        public_ip = ip_rslt.result()
+        if public_ip is None:
             public_ip = self.network_client.public_ip_addresses.get(self.resource_group, public_ip_name)
-            ipconfig.public_ip_address = public_ip
+        return public_ip
+
+    def associate_public_ip(self, nic, public_ip):
+        ipconfig = nic.ip_configurations[0]
+        ipconfig.public_ip_address = public_ip
 
-            params = {
-                'location': self.location,
-                'ip_configurations': [ipconfig]
-            }
+        params = {
+            'location': self.location,
+            'ip_configurations': [ipconfig]
+        }
 
-            Log.info("Associate public ip address {0} with NIC {1}".format(public_ip_name, nic.name), True)
-            ip_rslt = self.network_client.network_interfaces.create_or_update(self.resource_group, nic.name, params)
-            ip_rslt.wait()
+        Log.info("Associate public ip address {0} with NIC {1}".format(public_ip.name, nic.name), True)
+        ip_rslt = self.network_client.network_interfaces.create_or_update(self.resource_group, nic.name, params)
+        ip_rslt.wait()
@@ -1,5 +1,10 @@
 import time
 
+try:
+    from importlib.util import find_spec
+except ImportError:
+    from pkgutil import find_loader as find_spec
+
 from bootstrapbase import BootstrapBase
 from common.mapr_logger.log import Log
 from common.os_command import OSCommand
@@ -9,6 +14,10 @@ from mapr.clouds.cloud import Cloud
 
 class AzureCloud(Cloud):
     NAME = "Azure"
+    ENABLED = False
+    # The Azure SDK is only imported by build_cloud. Availability only checks that these modules can be found
+    SDK_MODULES = ("azure.mgmt.compute", "azure.mgmt.network", "azure.mgmt.resource", "azure.monitor",
+                   "msrestazure.azure_active_directory")
 
     def __init__(self):
         super(AzureCloud, self).__init__()
@@ -23,7 +32,7 @@ class AzureCloud(Cloud):
         return AzureCloud.NAME
 
     def is_enabled(self):
-        self.enabled = False
+        self.enabled = AzureCloud.ENABLED
         return self.enabled
 
     def is_available(self):
@@ -34,15 +43,15 @@ class AzureCloud(Cloud):
             Log.info("Checking Azure cloud availability. One moment...", True)
 
             if self.available is None:
-                try:
-                    from mapr.clouds.azure.mapr_azure import MapRAzure
-                    from mapr.clouds.azure.create_aks import CreateAKS
-                    from mapr.clouds.azure.add_data_disks import AddDataDisks
-                    from mapr.clouds.azure.add_public_ip import AddPublicIp
-                    self.available = True
-                except ImportError as ie:
-                    Log.error("Azure verification error: {0}".format(str(ie)))
-                    self.available = False
+                self.available = True
+                for module in AzureCloud.SDK_MODULES:
+                    try:
+                        found = find_spec(module) is not None
+                    except ImportError:
+                        found = False
+                    if not found:
+                        Log.error("Azure verification error: No module named {0}".format(module))
+                        self.available = False
 
         return self.available
 
@@ -1,15 +1,21 @@
-import imp
-import inspect
+import importlib
 import os
 import sys
 
 from common.environment import Environment
 from common.mapr_logger.log import Log
+from common.tracer import Tracer
+from common.worker_pool import WorkerPool
+from mapr.clouds.cloud_index import CloudIndex
 from mapr_exceptions.ex import NotImplementedException, NotFoundException
 
 
 class Cloud(object):
     DIR = os.path.dirname(__file__)
+    # Providers set NAME and ENABLED as literals in their class body so the plugin index can read them without
+    # importing the provider
+    NAME = None
+    ENABLED = False
     ALPHA = False
     DISK_SIZE_ON_NODE = 500
     BLOCK_DISK_SIZE = 375
@@ -17,8 +23,11 @@ class Cloud(object):
     CLUSTER_NAME = "{0}-cluster"
     NODES = 5
     DISKS = 3
+    # The steps of a cloud provider that are timed when tracing
+    TRACED_METHODS = ("build_cloud", "configure_cloud", "is_available", "create_", "invoke_")
 
     _clouds = None
+    _cloud_entries = None
     _cloud_instances = None
     prompts = None
 
@@ -55,66 +64,79 @@ class Cloud(object):
         raise NotImplementedException("is_available method must be implemented")
 
     @staticmethod
-    def initialize(prompts):
+    def initialize(prompts, state_dir=None):
+        """
+        Find the cloud providers from the plugin index. A provider module is only imported when its instance is
+        needed, see get_instance, so providers that are never chosen cost nothing at startup.
+        """
         Cloud.prompts = prompts
         Cloud._clouds = list()
+        Cloud._cloud_entries = dict()
         Cloud._cloud_instances = dict()
-        files = os.listdir(Cloud.DIR)
 
         Log.info("Initializing cloud support. One moment please...")
 
-        for afile in files:
-            full_file = os.path.join(Cloud.DIR, afile)
-            if not full_file.endswith(".py"):
-                Log.debug("Not inspecting: {0} because it is not a py file".format(full_file))
-                continue
-            if not os.path.isfile(full_file):
-                Log.debug("Not inspecting: {0} because it is not a file".format(full_file))
-                continue
-            if afile == "cloud.py" or afile == "__init__.py":
-                Log.debug("Not inspecting: {0} because it is not a file".format(full_file))
-                continue
-
-            module_name = full_file[:full_file.index(".")]
-            file_module = imp.load_source(module_name, os.path.join(Cloud.DIR, full_file))
-            class_members = inspect.getmembers(file_module, inspect.isclass)
-            Log.debug("class_members for file_module {0} is: {1}".format(str(file_module), str(class_members)))
-
-            for clazz in class_members:
-                # if the class is of the correct subclass add it to the list of tests
-                if not issubclass(clazz[1], Cloud) or clazz[1] == Cloud or clazz[1] in Cloud._clouds:
-                    continue
-
-                Cloud._clouds.append(clazz[1])
-                instance = clazz[1]()
+        entries = CloudIndex(Cloud.DIR, state_dir).get_entries()
+        for entry in entries:
+            if entry["name"] is None or entry["enabled"] is None:
+                # The name or enabled flag is not a literal so the plugin has to be loaded to ask it
+                instance = Cloud._load(entry)
                 name = instance.get_name()
-                if instance.is_enabled():
+                enabled = instance.is_enabled()
+                if enabled:
                     Cloud._cloud_instances[name] = instance
-                    Log.debug("Cloud {0} was added to list because it is enabled".format(name))
-                else:
-                    Log.debug("Cloud {0} was not added to list because it is not enabled".format(name))
+            else:
+                name = entry["name"]
+                enabled = entry["enabled"]
+
+            if enabled:
+                Cloud._cloud_entries[name] = entry
+                Log.debug("Cloud {0} was added to list because it is enabled".format(name))
+            else:
+                Log.debug("Cloud {0} was not added to list because it is not enabled".format(name))
 
-        Log.debug("There were {0} cloud providers found".format(len(Cloud._clouds)))
+        Log.debug("There were {0} cloud providers found".format(len(entries)))
+
+    @staticmethod
+    def _load(entry):
+        module = importlib.import_module(entry["module"])
+        clazz = getattr(module, entry["class"])
+        Log.debug("Loaded cloud class {0} from {1}".format(entry["class"], str(module)))
+        if clazz not in Cloud._clouds:
+            Cloud._clouds.append(clazz)
+            Tracer.trace_methods(clazz, Cloud.TRACED_METHODS, "cloud")
+        instance = clazz()
+        instance.is_enabled()
+        return instance
 
     @staticmethod
     def check_available():
-        available_instances = dict()
-        for cloud_name, cloud_instance in Cloud._cloud_instances.items():
-            if cloud_instance.is_available():
+        # The availability checks run cloud CLIs that can take seconds each so the clouds are checked concurrently
+        cloud_names = Cloud.get_cloud_names()
+        if len(cloud_names) == 0:
+            return
+        cloud_instances = [Cloud.get_instance(cloud_name) for cloud_name in cloud_names]
+        with WorkerPool(len(cloud_instances), "cloud") as pool:
+            tasks = pool.map(lambda instance: instance.is_available(), cloud_instances)
+
+        for cloud_name, task in zip(cloud_names, tasks):
+            if not task.failed() and task.result:
                 Log.debug("{0} cloud is available".format(cloud_name))
-                available_instances[cloud_name] = cloud_instance
             else:
                 Log.warning("{0} cloud was enabled but did not pass availability tests".format(cloud_name))
-
-        Cloud._cloud_instances = available_instances
+                del Cloud._cloud_entries[cloud_name]
 
     @staticmethod
     def get_instance(name):
+        entry = Cloud._cloud_entries.get(name)
+        if entry is None:
+            raise NotFoundException("Could not find an instance with a name of {0}".format(name))
         instance = Cloud._cloud_instances.get(name)
         if instance is None:
-            raise NotFoundException("Could not find an instance with a name of {0}".format(name))
+            instance = Cloud._load(entry)
+            Cloud._cloud_instances[name] = instance
         return instance
 
     @staticmethod
     def get_cloud_names():
-        return sorted(Cloud._cloud_instances.keys())
+        return sorted(Cloud._cloud_entries.keys())
@@ -0,0 +1,122 @@
+import ast
+import json
+import os
+
+from common.mapr_logger.log import Log
+
+
+class CloudIndex(object):
+    """
+    An index of the cloud provider plugins in mapr/clouds built without importing them. Each plugin file is parsed
+    for classes that derive from Cloud and their NAME and ENABLED class attributes are recorded with the module
+    and class name. Entries are kept per file with the file's size and modification time and a file is only
+    parsed again when those change.
+    """
+    FILENAME = "cloud-index.json"
+    PACKAGE = "mapr.clouds"
+    SKIP_FILES = ("__init__.py", "cloud.py", "cloud_index.py")
+
+    def __init__(self, directory, state_dir=None):
+        self.directory = directory
+        self.filename = None if state_dir is None else os.path.join(state_dir, CloudIndex.FILENAME)
+        self._files = self._load()
+        self._changed = False
+
+    def _load(self):
+        if self.filename is None or not os.path.exists(self.filename):
+            return dict()
+        try:
+            with open(self.filename) as fp:
+                return json.load(fp)
+        except (IOError, ValueError):
+            return dict()
+
+    def _save(self):
+        if self.filename is None or not self._changed:
+            return
+        directory = os.path.dirname(self.filename)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "w") as fp:
+            json.dump(self._files, fp, indent=2, sort_keys=True)
+        os.rename(temp_filename, self.filename)
+        self._changed = False
+
+    @staticmethod
+    def _stamp(filename):
+        stat = os.stat(filename)
+        return [stat.st_size, stat.st_mtime]
+
+    @staticmethod
+    def _literal(node):
+        try:
+            return ast.literal_eval(node)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _base_names(class_node):
+        names = list()
+        for base in class_node.bases:
+            if isinstance(base, ast.Name):
+                names.append(base.id)
+            elif isinstance(base, ast.Attribute):
+                names.append(base.attr)
+        return names
+
+    @staticmethod
+    def parse(filename):
+        """
+        Return an entry for every class in the file that derives from Cloud. NAME or ENABLED is None when it is
+        not a literal in the class body.
+        """
+        with open(filename) as fp:
+            tree = ast.parse(fp.read(), filename)
+
+        module = "{0}.{1}".format(CloudIndex.PACKAGE, os.path.splitext(os.path.basename(filename))[0])
+        entries = list()
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef) or "Cloud" not in CloudIndex._base_names(node):
+                continue
+            attributes = dict()
+            for statement in node.body:
+                if isinstance(statement, ast.Assign) and len(statement.targets) == 1 and \
+                        isinstance(statement.targets[0], ast.Name):
+                    attributes[statement.targets[0].id] = CloudIndex._literal(statement.value)
+            entries.append({
+                "module": module,
+                "class": node.name,
+                "name": attributes.get("NAME"),
+                "enabled": attributes.get("ENABLED")
+            })
+        return entries
+
+    def get_entries(self):
+        entries = list()
+        found = set()
+        for afile in sorted(os.listdir(self.directory)):
+            full_file = os.path.join(self.directory, afile)
+            if not afile.endswith(".py") or afile in CloudIndex.SKIP_FILES or not os.path.isfile(full_file):
+                continue
+
+            found.add(afile)
+            stamp = CloudIndex._stamp(full_file)
+            cached = self._files.get(afile)
+            if cached is None or cached["stamp"] != stamp:
+                Log.debug("Indexing cloud plugin file {0}".format(full_file))
+                try:
+                    cached = {"stamp": stamp, "classes": CloudIndex.parse(full_file)}
+                except (SyntaxError, IOError) as e:
+                    Log.warning("Could not index the cloud plugin file {0}: {1}".format(full_file, str(e)))
+                    continue
+                self._files[afile] = cached
+                self._changed = True
+            entries.extend(cached["classes"])
+
+        for afile in set(self._files.keys()) - found:
+            del self._files[afile]
+            self._changed = True
+
+        self._save()
+        return entries
@@ -0,0 +1,131 @@
+import threading
+import time
+
+from common.mapr_logger.log import Log
+from common.os_command import OSCommand
+from common.worker_pool import WorkerPool
+
+
+class NodeDiskPipeline(object):
+    """
+    Provisions the disks of each node of a new cluster as soon as the node is Ready instead of waiting for all of
+    them. The nodes are polled for readiness and every node that becomes Ready is handed to a bounded pool of
+    workers. Each node has its own deadline for its disks, which starts when a worker picks the node up rather than
+    when it is queued behind other nodes.
+    """
+    # One line per node: the name, a tab and the status of its Ready condition
+    KUBECTL_NODE_READY = "kubectl get nodes -o go-template='{{range .items}}{{.metadata.name}}{{\"\\t\"}}" \
+                         "{{range .status.conditions}}{{if eq .type \"Ready\"}}{{.status}}{{end}}{{end}}" \
+                         "{{\"\\n\"}}{{end}}'"
+    POLL_INTERVAL = 5
+    WAIT_INTERVAL = 1
+    READY_TIMEOUT = 15 * 60
+    NODE_TIMEOUT = 10 * 60
+    MAX_WORKERS = 8
+
+    DONE = "done"
+    FAILED = "failed"
+    TIMED_OUT = "timed out"
+    NOT_READY = "not ready"
+
+    def __init__(self, expected_nodes, provision, max_workers=MAX_WORKERS, ready_timeout=READY_TIMEOUT,
+                 node_timeout=NODE_TIMEOUT):
+        """
+        provision - called with the node name and its deadline; returns True when the node's disks are ready
+        """
+        self.expected_nodes = expected_nodes
+        self.provision = provision
+        self.max_workers = max_workers
+        self.ready_timeout = ready_timeout
+        self.node_timeout = node_timeout
+        self.results = dict()
+        # The deadline of every node a worker has started on, and of the ones still being provisioned
+        self._deadlines = dict()
+        self._running = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_node_readiness():
+        """
+        Return a dictionary of node name to whether the node is Ready, or None when the nodes cannot be listed
+        """
+        response, status = OSCommand.run2(NodeDiskPipeline.KUBECTL_NODE_READY)
+        if status != 0:
+            Log.warning("Could not get the status of the nodes: {0}: {1}".format(status, response))
+            return None
+
+        readiness = dict()
+        for line in response.splitlines():
+            name, _, condition = line.strip().partition("\t")
+            if len(name) > 0:
+                readiness[name] = condition == "True"
+        return readiness
+
+    def _provision(self, node):
+        deadline = time.time() + self.node_timeout
+        with self._lock:
+            self._deadlines[node] = deadline
+            self._running[node] = deadline
+        # noinspection PyBroadException
+        try:
+            succeeded = self.provision(node, deadline)
+        except Exception as e:
+            Log.error("Provisioning the disks of node {0} failed: {1}".format(node, str(e)))
+            succeeded = False
+        finally:
+            with self._lock:
+                del self._running[node]
+        if succeeded:
+            return NodeDiskPipeline.DONE
+        return NodeDiskPipeline.TIMED_OUT if time.time() > deadline else NodeDiskPipeline.FAILED
+
+    def _is_overdue(self, node):
+        """
+        True when the node is past its deadline, or is still queued behind workers that are all past theirs and so
+        may never get to it
+        """
+        now = time.time()
+        with self._lock:
+            deadline = self._deadlines.get(node)
+            if deadline is not None:
+                return now > deadline
+            return sum(1 for running_deadline in self._running.values() if now > running_deadline) >= self.max_workers
+
+    def run(self):
+        """
+        Return a dictionary of node name to DONE, FAILED, TIMED_OUT or NOT_READY
+        """
+        ready_deadline = time.time() + self.ready_timeout
+        tasks = dict()
+        seen = set()
+
+        pool = WorkerPool(self.max_workers, "disks")
+        while len(tasks) < self.expected_nodes and time.time() < ready_deadline:
+            readiness = NodeDiskPipeline.get_node_readiness()
+            if readiness is not None:
+                seen.update(readiness.keys())
+                ready = set(node for node, is_ready in readiness.items() if is_ready)
+                for node in sorted(ready - set(tasks.keys())):
+                    Log.info("Node {0} is Ready; provisioning its disks".format(node), True)
+                    tasks[node] = pool.submit(self._provision, node)
+            if len(tasks) < self.expected_nodes:
+                time.sleep(NodeDiskPipeline.POLL_INTERVAL)
+
+        if len(tasks) < self.expected_nodes:
+            Log.error("Only {0} of {1} node(s) became Ready within {2} seconds"
+                      .format(len(tasks), self.expected_nodes, self.ready_timeout))
+
+        for node, task in sorted(tasks.items()):
+            while not task.wait(NodeDiskPipeline.WAIT_INTERVAL) and not self._is_overdue(node):
+                pass
+            if task.wait(0):
+                self.results[node] = task.result
+            else:
+                Log.error("The disks of node {0} were not provisioned in {1} seconds".format(node, self.node_timeout))
+                self.results[node] = NodeDiskPipeline.TIMED_OUT
+        for node in seen - set(tasks.keys()):
+            self.results[node] = NodeDiskPipeline.NOT_READY
+
+        # Workers still running past their deadline are not waited for
+        pool.shutdown(False)
+        return self.results
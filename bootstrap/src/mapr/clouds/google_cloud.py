@@ -1,14 +1,20 @@
+import random
+import threading
 import time
-from threading import Thread
 
 from bootstrapbase import BootstrapBase
 from common.mapr_logger.log import Log
 from common.os_command import OSCommand
+from common.worker_pool import WorkerPool
 from mapr.clouds.cloud import Cloud
+from mapr.clouds.gke.node_disk_pipeline import NodeDiskPipeline
+from validators.gcloud_validator import GcloudValidator
+from validators.validator import Validator
 
 
 class GoogleCloud(Cloud):
     NAME = "Google"
+    ENABLED = True
     CMD_ROLE_BINDING = "kubectl create clusterrolebinding user-cluster-admin-binding --clusterrole=cluster-admin --user={0}"
     INSTANCE_TYPE = "n1-standard-32"
     K8S_VERSION = "latest"
@@ -17,6 +23,19 @@ class GoogleCloud(Cloud):
     PROJECT = "myproject"
     IMAGE_TYPE = "COS"
     DISK_TYPE_ON_NODE = "pd-ssd"
+    # gcloud errors that pass: API rate limits and an instance that is busy with another disk operation.
+    # Resource quotas such as SSD_TOTAL_GB are not retried
+    RETRY_ERRORS = ("rateLimitExceeded", "RATE_LIMIT_EXCEEDED", "Quota exceeded for quota metric",
+                    "Too Many Requests", "RESOURCE_EXHAUSTED", "code=429", "resourceNotReady", "is not ready")
+    RETRY_INITIAL_DELAY = 2
+    RETRY_MAX_DELAY = 60
+    # The most gcloud commands that run at once across all nodes and disks, unless GKE_GCLOUD_MAX_CONCURRENT is set.
+    # They are also bounded by --max-commands. With 0.3 second commands 40 nodes of 8 disks take 3.9 seconds at 64
+    # against 13.5 at 16; above 64 the time of starting the processes dominates
+    GCLOUD_MAX_CONCURRENT = 64
+    NODE_MAX_WORKERS = 64
+
+    _gcloud_semaphore = threading.BoundedSemaphore(GCLOUD_MAX_CONCURRENT)
 
     def __init__(self):
         super(GoogleCloud, self).__init__()
@@ -28,7 +47,12 @@ class GoogleCloud(Cloud):
         self.user = self.env.get("GCE_USER", GoogleCloud.CLOUD_USER)
         self.image_type = GoogleCloud.IMAGE_TYPE
         self.disk_type_on_node = GoogleCloud.DISK_TYPE_ON_NODE
-        self.enabled = True
+        self.enabled = GoogleCloud.ENABLED
+        self.disk_results = list()
+        self._disk_results_lock = threading.Lock()
+        max_concurrent = self.env.get("GKE_GCLOUD_MAX_CONCURRENT")
+        self.gcloud_max_concurrent_set = bool(max_concurrent)
+        self.gcloud_max_concurrent = int(max_concurrent) if max_concurrent else GoogleCloud.GCLOUD_MAX_CONCURRENT
 
     def get_name(self):
         return GoogleCloud.NAME
@@ -42,14 +66,14 @@ class GoogleCloud(Cloud):
 
         if self.available is None:
             Log.info("Checking Google cloud availability. One moment...", True)
-            results, status = OSCommand.run2(["command -v gcloud", "gcloud compute instances list"])
-            self.available = True if status == 0 else False
+            gcloud_validator = Validator.get_collected(GcloudValidator)
+            self.available = gcloud_validator.operation == Validator.OPERATION_OK
 
             if not self.available:
                 Log.warning("Google Cloud SDK not found or not configured correctly. Quit bootstrapper, install and "
                             "confgure Google Cloud SDK and restart bootstrapper. See: https://cloud.google.com/sdk/. "
                             "More information on the error in the bootstrapper log here: " + Log.get_log_filename())
-                Log.warning(results)
+                Log.warning(gcloud_validator.get(Validator.ERROR))
 
         return self.available
 
@@ -111,53 +135,80 @@ class GoogleCloud(Cloud):
         result, status = self.invoke_gcloud(cmd)
         Log.info(result, True)
 
-        # TODO Got to be a better way to get this filtered list
-        result, status = OSCommand.run2("kubectl get nodes | grep Ready | cut -d' ' -f1")
-        if status != 0:
-            Log.error("Could not get list of nodes: {0}: {1}".format(status, result))
-            BootstrapBase.exit_application(103)
-
-        nodes = result.split("\n")
-        if len(nodes[-1]) == 0:
-            nodes = nodes[:-1]
-
-        Log.info("After cluster creation, {0} node(s) were found".format(len(nodes)), True)
-
-        all_threads = list()
-        for node in nodes:
-            t = Thread(target=self.create_disks_and_attach, args=(node,), name=node)
-            all_threads.append(t)
-            t.start()
-            time.sleep(0.05)
-
-        for thread in all_threads:
-            thread.join(timeout=10 * 60)
-            if thread.is_alive():
-                Log.error("Thread for node {0} did not complete in the supplied time limit".format(thread.name))
-
-    def create_disks_and_attach(self, node):
-        # Create a disk list
-        disk_list = ""
-        for i in range(0, self.disks):
-            disk_list += "{0}-disk-{1} ".format(node, i)
+        # Node workers spend their time waiting on their disks so there is one per node; the gcloud commands
+        # themselves are bounded by gcloud_max_concurrent. The semaphore is replaced before any worker starts
+        GoogleCloud.set_gcloud_max_concurrent(self.gcloud_max_concurrent)
+        if self.gcloud_max_concurrent > OSCommand.max_concurrent:
+            msg = "At most {0} gcloud commands run at once; Run with --max-commands {1} to run {1}".format(
+                OSCommand.max_concurrent, self.gcloud_max_concurrent)
+            if self.gcloud_max_concurrent_set:
+                Log.warning(msg)
+            else:
+                Log.info(msg)
+        pipeline = NodeDiskPipeline(self.nodes, self.create_disks_and_attach,
+                                    max_workers=min(self.nodes, GoogleCloud.NODE_MAX_WORKERS))
+        results = pipeline.run()
+        provisioned = [node for node, result in results.items() if result == NodeDiskPipeline.DONE]
+        Log.info("Disks were provisioned on {0} of {1} node(s)".format(len(provisioned), self.nodes), True)
+        for node, result in sorted(results.items()):
+            if result != NodeDiskPipeline.DONE:
+                Log.error("The disks of node {0} were not provisioned: {1}".format(node, result))
+        self.log_disk_results()
+
+    def _record_disk_result(self, node, disk_name, result, start):
+        with self._disk_results_lock:
+            self.disk_results.append((node, disk_name, result, time.time() - start))
+
+    def log_disk_results(self):
+        Log.info("{0:<40} {1:<48} {2:>8}  {3}".format("Node", "Disk", "Seconds", "Result"), True)
+        for node, disk_name, result, seconds in sorted(self.disk_results):
+            Log.info("{0:<40} {1:<48} {2:>8.1f}  {3}".format(node, disk_name, seconds, result), True)
+
+    def create_disks_and_attach(self, node, deadline):
+        """
+        Create the node's disks with a single gcloud command, then attach each disk and set it to be deleted with
+        the node concurrently. Returns True when every disk is attached.
+        """
+        start = time.time()
+        disk_names = ["{0}-disk-{1}".format(node, i) for i in range(0, self.disks)]
 
         Log.info("Creating and attaching disk(s) for node {0}. One moment...".format(node), True)
 
-        result, status = self.invoke_gcloud("compute disks create --size {0}GB --type pd-ssd --project {1} --zone {2} {3}".format(self.block_disk_size, self.project, self.zone, disk_list))
+        result, status = self.invoke_gcloud_retry("compute disks create --size {0}GB --type pd-ssd --project {1} --zone {2} {3}".format(self.block_disk_size, self.project, self.zone, " ".join(disk_names)), deadline, exists_ok=True)
+        if status != 0:
+            Log.error("Could not create the disk(s) for node {0}: {1}: {2}".format(node, status, result))
+            for disk_name in disk_names:
+                self._record_disk_result(node, disk_name, "create failed", start)
+            return False
         Log.info("Created {0} disk(s) for node {1}".format(self.disks, node))
         Log.debug(result)
 
-        for i in range(0, self.disks):
-            disk_name = "{0}-disk-{1} ".format(node, i)
-            result, status = self.invoke_gcloud("compute instances attach-disk {0} --disk {1} --project {2} --zone {3}".format(node, disk_name, self.project, self.zone))
-            Log.info("Added disk {0} to node {1}".format(disk_name, node))
-            Log.debug(result)
-
-            result, status = self.invoke_gcloud("compute instances set-disk-auto-delete {0} --disk {1} --project {2} --zone {3}".format(node, disk_name, self.project, self.zone))
-            Log.info("Set set-disk-auto-delete on disk {0}".format(disk_name))
-            Log.debug(result)
+        with WorkerPool(len(disk_names), "disk") as pool:
+            tasks = pool.map(lambda disk_name: self.attach_disk(node, disk_name, deadline, start), disk_names)
+        if not all(not task.failed() and task.result for task in tasks):
+            return False
 
         Log.info("Created and attached disk(s) for node {0}".format(node), True)
+        return True
+
+    def attach_disk(self, node, disk_name, deadline, start):
+        result, status = self.invoke_gcloud_retry("compute instances attach-disk {0} --disk {1} --project {2} --zone {3}".format(node, disk_name, self.project, self.zone), deadline)
+        if status != 0:
+            Log.error("Could not add disk {0} to node {1}: {2}: {3}".format(disk_name, node, status, result))
+            self._record_disk_result(node, disk_name, "attach failed", start)
+            return False
+        Log.info("Added disk {0} to node {1}".format(disk_name, node))
+        Log.debug(result)
+
+        result, status = self.invoke_gcloud_retry("compute instances set-disk-auto-delete {0} --disk {1} --project {2} --zone {3}".format(node, disk_name, self.project, self.zone), deadline)
+        if status != 0:
+            Log.error("Could not set set-disk-auto-delete on disk {0}: {1}: {2}".format(disk_name, status, result))
+            self._record_disk_result(node, disk_name, "auto-delete failed", start)
+            return False
+        Log.info("Set set-disk-auto-delete on disk {0}".format(disk_name))
+        Log.debug(result)
+        self._record_disk_result(node, disk_name, "attached", start)
+        return True
 
     def configure_cloud(self):
         cmd = GoogleCloud.CMD_ROLE_BINDING.format(self.user)
@@ -174,8 +225,7 @@ class GoogleCloud(Cloud):
         Log.info("kubernetes version = {0}".format(self.k8s_version), True)
         Log.info("Creating GKE environment via the following command: gcloud {0}".format(cmd), True)
         Log.info("Create log follows...")
-        result, status = self.invoke_gcloud(cmd)
-        Log.info(result, True)
+        self.invoke_gcloud(cmd, stream_output=True)
 
     def invoke_stable_cluster(self, args):
         cmd = "container --project {0} clusters create {1} {2}".format(self.project, self.cluster_name, args)
@@ -183,12 +233,55 @@ class GoogleCloud(Cloud):
         Log.info("kubernetes version = {0}".format(self.k8s_version), True)
         Log.info("Creating GKE environment via the following command: gcloud {0}".format(cmd), True)
         Log.info("Create log follows...")
-        result, status = self.invoke_gcloud(cmd)
-        Log.info(result, True)
+        self.invoke_gcloud(cmd, stream_output=True)
+
+    @staticmethod
+    def set_gcloud_max_concurrent(max_concurrent):
+        # Only gcloud is limited here; every command also waits for OSCommand, whose limit is --max-commands
+        GoogleCloud._gcloud_semaphore = threading.BoundedSemaphore(max(max_concurrent, 1))
+
+    @staticmethod
+    def is_retryable(response):
+        return any(error in response for error in GoogleCloud.RETRY_ERRORS)
+
+    @staticmethod
+    def invoke_gcloud_retry(cmd, deadline, exists_ok=False):
+        """
+        Run a gcloud command that is one of many running at once. See set_gcloud_max_concurrent.
+        Rate limit and busy instance errors are retried with exponential backoff and jitter until the deadline.
+        Failures are returned rather than ending the bootstrapper.
+        exists_ok - a create that fails because an earlier, rate limited attempt created the resources succeeded
+        """
+        delay = GoogleCloud.RETRY_INITIAL_DELAY
+        retried = False
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return "Deadline passed before gcloud {0}".format(cmd), OSCommand.TIMEOUT_STATUS
+
+            with GoogleCloud._gcloud_semaphore:
+                remaining = deadline - time.time()
+                response, status = OSCommand.run2("gcloud {0}".format(cmd), timeout=max(remaining, 1))
+            if status == 0:
+                return response, status
+            if exists_ok and retried and "already exists" in response:
+                return response, 0
+            if not GoogleCloud.is_retryable(response):
+                return response, status
+
+            sleep = min(delay, GoogleCloud.RETRY_MAX_DELAY) * random.uniform(0.5, 1.0)
+            if time.time() + sleep >= deadline:
+                return response, status
+            Log.warning("gcloud was rate limited or the instance was busy; retrying in {0:.1f} seconds".format(sleep))
+            time.sleep(sleep)
+            delay *= 2
+            retried = True
 
     @staticmethod
-    def invoke_gcloud(cmd):
-        response, status = OSCommand.run2("gcloud {0}".format(cmd))
+    def invoke_gcloud(cmd, stream_output=False):
+        # Streamed output is shown as each line arrives rather than all at once when the command ends
+        on_line = (lambda line: Log.info(line, True)) if stream_output else None
+        response, status = OSCommand.run2("gcloud {0}".format(cmd), on_line=on_line)
         if status != 0:
             Log.error("Could not create GKE Cluster: {0}: {1}".format(status, response))
             BootstrapBase.exit_application(101)
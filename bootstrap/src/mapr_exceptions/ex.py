@@ -40,3 +40,9 @@ class InstallDirectoryExistsException(InstallException):
 class AzureException(InstallException):
     def __init__(self, value):
         InstallException.__init__(self, value)
+
+
+class KubernetesException(InstallException):
+    def __init__(self, value, status=None):
+        InstallException.__init__(self, value)
+        self.status = status
@@ -0,0 +1,52 @@
+class NodeInventory(object):
+    """
+    The names and labels of the nodes in a cluster and an index of label to value to node names. Only these
+    fields are kept so the inventory stays small on clusters with thousands of nodes.
+    """
+    # kubectl prints one node per line as name, then label=value pairs, separated by tabs. Label keys and values
+    # cannot contain tabs or '=' so no escaping is needed.
+    KUBECTL_TEMPLATE = "'{{range .items}}{{.metadata.name}}{{range $k, $v := .metadata.labels}}" \
+                       "{{\"\\t\"}}{{$k}}={{$v}}{{end}}{{\"\\n\"}}{{end}}'"
+
+    def __init__(self):
+        self.labels = dict()
+        self._index = dict()
+
+    def add_node(self, name, labels):
+        labels = labels or dict()
+        self.labels[name] = labels
+        for label, value in labels.items():
+            self._index.setdefault(label, dict()).setdefault(value, set()).add(name)
+
+    def add_kubectl_line(self, line):
+        fields = line.rstrip("\r\n").split("\t")
+        if len(fields[0]) == 0:
+            return
+        labels = dict()
+        for field in fields[1:]:
+            label, _, value = field.partition("=")
+            labels[label] = value
+        self.add_node(fields[0], labels)
+
+    def add_page(self, page):
+        for item in page.get("items") or list():
+            metadata = item.get("metadata", dict())
+            self.add_node(metadata.get("name"), metadata.get("labels"))
+
+    def get_node_count(self):
+        return len(self.labels)
+
+    def get_node_names(self):
+        return set(self.labels.keys())
+
+    def get_label_values(self, label):
+        return dict((value, set(names)) for value, names in self._index.get(label, dict()).items())
+
+    def get_nodes_with_label(self, label):
+        nodes = set()
+        for names in self._index.get(label, dict()).values():
+            nodes.update(names)
+        return nodes
+
+    def get_nodes_without_label(self, label):
+        return self.get_node_names() - self.get_nodes_with_label(label)
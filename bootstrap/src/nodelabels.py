@@ -1,6 +1,5 @@
-import json
-
 from common.mapr_logger.log import Log
+from common.tracer import Tracer
 
 
 class NodeLabels(object):
@@ -9,60 +8,57 @@ class NodeLabels(object):
 
     def __init__(self, k8s):
         self.k8s = k8s
-        self._node_count = 0
-        self._items = None
-        self._json = None
+        self._inventory = None
 
-    def _get_json(self):
+    def _get_inventory(self):
         Log.info("Retrieving node information...", stdout=True)
-        result, status = self.k8s.run_get("nodes -o=json")
-        if status != 0:
-            return None
-
-        self._json = json.loads(result)
-        if self._json is None:
-            Log.error("No JSON was returned from get nodes command")
-            return
-
-        self._items = self._json.get("items")
-        if self._items is None:
-            Log.error("No items dictonary in get nodes JSON")
-            return
-
-        self._node_count = len(self._items)
+        self._inventory = self.k8s.get_node_inventory()
+        if self._inventory is None:
+            Log.error("Could not retrieve the nodes")
 
     def get_mapr_use_node_labels(self, label):
-        nodes_set = 0
-        nodes_not_set = set()
+        if self._inventory is None:
+            return None
 
-        for node in self._items:
-            node_name = node["metadata"]["name"]
-            mapr_usenode = node["metadata"]["labels"].get(label)
-
-            if mapr_usenode is not None:
-                nodes_set += 1
-                Log.info("Node: {0} has {1} label set to: {2}".format(node_name, label, mapr_usenode))
-            else:
-                nodes_not_set.add(node_name)
-                Log.info("Node: {0} does not have {1} label set".format(node_name, label))
+        for value, nodes in self._inventory.get_label_values(label).items():
+            for node_name in sorted(nodes):
+                Log.info("Node: {0} has {1} label set to: {2}".format(node_name, label, value))
+        nodes_not_set = self._inventory.get_nodes_without_label(label)
+        for node_name in sorted(nodes_not_set):
+            Log.info("Node: {0} does not have {1} label set".format(node_name, label))
 
+        node_count = self._inventory.get_node_count()
         Log.info("{0} node(s) found, {1} node(s) tagged with the MapR usage tag {2} while {3} node(s) not"
-                 .format(self._node_count, nodes_set, label, len(nodes_not_set)), stdout=True)
+                 .format(node_count, node_count - len(nodes_not_set), label, len(nodes_not_set)), stdout=True)
         return nodes_not_set
 
     def process_labels(self):
-        self._get_json()
+        self._get_inventory()
 
-        nodes_not_set = self.get_mapr_use_node_labels(NodeLabels.MAPR_LABEL)
-        if nodes_not_set is not None and len(nodes_not_set) > 0:
-            Log.info("Setting MapR usage tag {0} for {1} nodes...".format(NodeLabels.MAPR_LABEL, len(nodes_not_set)),
-                     stdout=True)
+        # Every node gets one update with all of the labels it is missing
+        node_labels = dict()
+        for label, value in ((NodeLabels.MAPR_LABEL, True), (NodeLabels.EXCLUSIVE_LABEL, "None")):
+            nodes_not_set = self.get_mapr_use_node_labels(label)
+            if nodes_not_set is None:
+                continue
             for node_not_set in nodes_not_set:
-                self.k8s.run_label_mapr_node(node_not_set, NodeLabels.MAPR_LABEL, True)
+                node_labels.setdefault(node_not_set, dict())[label] = str(value).lower()
 
-        nodes_not_set = self.get_mapr_use_node_labels(NodeLabels.EXCLUSIVE_LABEL)
-        if nodes_not_set is not None and len(nodes_not_set) > 0:
-            Log.info("Setting MapR usage tag {0} for {1} nodes...".format(NodeLabels.EXCLUSIVE_LABEL, len(nodes_not_set)),
-                     stdout=True)
-            for node_not_set in nodes_not_set:
-                self.k8s.run_label_mapr_node(node_not_set, NodeLabels.EXCLUSIVE_LABEL, "None")
+        if len(node_labels) == 0:
+            return
+
+        Log.info("Setting MapR usage tags for {0} nodes...".format(len(node_labels)), stdout=True)
+        results = self.k8s.label_nodes(node_labels)
+
+        failed = 0
+        for node_name in sorted(results.keys()):
+            labels = ", ".join(sorted(node_labels[node_name].keys()))
+            if results[node_name] is None:
+                Log.info("Node: {0} labelled with {1}".format(node_name, labels))
+            else:
+                failed += 1
+                Log.error("Node: {0} could not be labelled with {1}: {2}".format(node_name, labels, results[node_name]))
+        Log.info("{0} node(s) labelled, {1} node(s) failed".format(len(results) - failed, failed), stdout=True)
+
+
+Tracer.trace_methods(NodeLabels, ("process_labels",), "phase")
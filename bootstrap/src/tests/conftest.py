@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The bootstrapper modules are imported the way the entry scripts import them, from the src directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,167 @@
+import json
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer  # Python 2
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer  # Python 3
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+
+
+class FakeApiServer(object):
+    """
+    A Kubernetes API server on a local port that is just enough for the native client. Objects are kept in memory
+    by path, every request is recorded and a watch replays the events that were queued for its path.
+    """
+    RESOURCES = {
+        "/api/v1": [
+            {"name": "namespaces", "kind": "Namespace", "namespaced": False},
+            {"name": "nodes", "kind": "Node", "namespaced": False},
+            {"name": "configmaps", "kind": "ConfigMap", "namespaced": True},
+            {"name": "secrets", "kind": "Secret", "namespaced": True}
+        ],
+        "/apis/apps/v1": [
+            {"name": "deployments", "kind": "Deployment", "namespaced": True},
+            {"name": "deployments/status", "kind": "Deployment", "namespaced": True}
+        ]
+    }
+
+    def __init__(self):
+        self.objects = dict()
+        self.requests = list()
+        self.watch_events = dict()
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{0}".format(self._server.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_object(self, collection, obj):
+        with self._lock:
+            self.objects["{0}/{1}".format(collection, obj["metadata"]["name"])] = obj
+
+    def get_requests(self, method=None):
+        with self._lock:
+            return [request for request in self.requests if method is None or request["method"] == method]
+
+    def list_collection(self, collection):
+        with self._lock:
+            prefix = collection + "/"
+            return [obj for path, obj in sorted(self.objects.items())
+                    if path.startswith(prefix) and "/" not in path[len(prefix):]]
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _record(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("UTF-8") if length else None
+        request = {"method": self.command, "path": url.path, "query": dict((k, v[0]) for k, v in parse_qs(url.query).items()),
+                   "content_type": self.headers.get("Content-Type"), "authorization": self.headers.get("Authorization"),
+                   "body": json.loads(body) if body else None}
+        fake = self.server.fake
+        with fake._lock:
+            fake.requests.append(request)
+        return fake, request
+
+    def _send(self, status, document):
+        payload = json.dumps(document).encode("UTF-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _not_found(self, path):
+        self._send(404, {"kind": "Status", "code": 404, "message": "{0} not found".format(path)})
+
+    def do_GET(self):
+        fake, request = self._record()
+        path = request["path"]
+        query = request["query"]
+        if path in FakeApiServer.RESOURCES:
+            self._send(200, {"kind": "APIResourceList", "resources": FakeApiServer.RESOURCES[path]})
+        elif query.get("watch") == "true":
+            self._watch(fake, path)
+        elif path in fake.objects:
+            self._send(200, fake.objects[path])
+        else:
+            items = fake.list_collection(path)
+            limit = int(query.get("limit", len(items) or 1))
+            start = int(query.get("continue", 0))
+            page = items[start:start + limit]
+            metadata = {"resourceVersion": "1"}
+            if start + limit < len(items):
+                metadata["continue"] = str(start + limit)
+            self._send(200, {"kind": "List", "metadata": metadata, "items": page})
+
+    def _watch(self, fake, path):
+        # The server ends the watch after the queued events, as it would when timeoutSeconds passes
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for event_type, obj in fake.watch_events.get(path, list()):
+            self.wfile.write((json.dumps({"type": event_type, "object": obj}) + "\n").encode("UTF-8"))
+            self.wfile.flush()
+        self.close_connection = True
+
+    def do_POST(self):
+        fake, request = self._record()
+        path = "{0}/{1}".format(request["path"], request["body"]["metadata"]["name"])
+        if path in fake.objects:
+            self._send(409, {"kind": "Status", "code": 409, "reason": "AlreadyExists",
+                             "message": "{0} already exists".format(path)})
+        else:
+            fake.objects[path] = request["body"]
+            self._send(201, request["body"])
+
+    def do_PATCH(self):
+        fake, request = self._record()
+        path = request["path"]
+        if request["content_type"] == "application/apply-patch+yaml":
+            fake.objects[path] = request["body"]
+            self._send(200, request["body"])
+        elif path not in fake.objects:
+            self._not_found(path)
+        else:
+            obj = fake.objects[path]
+            obj.setdefault("metadata", dict()).setdefault("labels", dict()).update(
+                request["body"]["metadata"]["labels"])
+            self._send(200, obj)
+
+    def do_DELETE(self):
+        fake, request = self._record()
+        obj = fake.objects.get(request["path"])
+        if obj is None:
+            self._not_found(request["path"])
+            return
+        # An object with a finalizer stays, marked as being deleted, until the finalizer is removed
+        if obj.get("metadata", dict()).get("finalizers"):
+            obj["metadata"]["deletionTimestamp"] = "2020-01-01T00:00:00Z"
+        else:
+            del fake.objects[request["path"]]
+        self._send(200, {"kind": "Status", "status": "Success"})
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from common.apply_cache import ApplyCache
+from common.file_utils import FileUtils
+from common.yaml_template import TemplateCache
+from fake_api_server import FakeApiServer
+from k8s_client import K8SClient
+from k8s_operations import K8SOperations
+from test_k8s_client import KUBECONFIG
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CLUSTER = "https://fake:6443#uid-1"
+CONFIGMAP = "apiVersion: v1\nkind: ConfigMap\nmetadata:\n  name: settings\n  namespace: mapr-system\ndata:\n  size: \"{0}\"\n"
+
+
+class TestApplyCache(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp(prefix="mapr-apply-cache-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+
+    def test_record_and_forget(self):
+        digest = ApplyCache.hash_content(CONFIGMAP.format(1))
+        cache = ApplyCache(self.state_dir, CLUSTER)
+        self.assertFalse(ApplyCache.exists(self.state_dir))
+
+        cache.record("settings", digest)
+
+        self.assertTrue(ApplyCache.exists(self.state_dir))
+        cache = ApplyCache(self.state_dir, CLUSTER)
+        self.assertTrue(cache.is_applied("settings", digest))
+        self.assertFalse(cache.is_applied("settings", ApplyCache.hash_content(CONFIGMAP.format(2))))
+
+        cache.forget("settings")
+        self.assertFalse(ApplyCache(self.state_dir, CLUSTER).is_applied("settings", digest))
+
+    def test_clusters_are_separate(self):
+        digest = ApplyCache.hash_content(CONFIGMAP.format(1))
+        ApplyCache(self.state_dir, CLUSTER).record("settings", digest)
+        ApplyCache(self.state_dir, "https://other:6443#uid-2").record("spark", digest)
+
+        cache = ApplyCache(self.state_dir, "https://other:6443#uid-2")
+        self.assertFalse(cache.is_applied("settings", digest))
+        self.assertTrue(cache.is_applied("spark", digest))
+        self.assertTrue(ApplyCache(self.state_dir, CLUSTER).is_applied("settings", digest))
+
+    def test_hash_content(self):
+        self.assertEqual(ApplyCache.hash_content(u"kind: ConfigMap"), ApplyCache.hash_content(b"kind: ConfigMap"))
+        self.assertEqual(len(ApplyCache.hash_content("")), 64)
+
+    def test_unreadable_file(self):
+        with open(os.path.join(self.state_dir, ApplyCache.FILENAME), "w") as fp:
+            fp.write("{not json")
+
+        cache = ApplyCache(self.state_dir, CLUSTER)
+        cache.record("settings", "digest")
+
+        with open(cache.filename) as fp:
+            self.assertEqual(json.load(fp), {CLUSTER: {"settings": "digest"}})
+
+
+class TestSkipUnchanged(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeApiServer().start()
+        self.temp_dir = tempfile.mkdtemp(prefix="mapr-apply-cache-test-")
+        kubeconfig = os.path.join(self.temp_dir, "kubeconfig")
+        with open(kubeconfig, "w") as fp:
+            fp.write(KUBECONFIG.format(server=self.server.url, user="token"))
+        self.yaml_file = os.path.join(self.temp_dir, "settings.yaml")
+        self.k8s = K8SOperations(None, SRC_DIR)
+        self.k8s.yamls["settings"] = self.yaml_file
+        self.k8s.client = K8SClient.from_kubeconfig(kubeconfig)
+
+    def tearDown(self):
+        FileUtils.set_template_cache(TemplateCache())
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def apply(self, size, skip_unchanged=True):
+        with open(self.yaml_file, "w") as fp:
+            fp.write(CONFIGMAP.format(size))
+        # Every run reads the yaml and the cache again
+        FileUtils.set_template_cache(TemplateCache())
+        self.k8s.use_apply_cache(self.temp_dir, CLUSTER, skip_unchanged)
+        return self.k8s.run_kubectl_apply("settings")
+
+    def count_patches(self):
+        return len(self.server.get_requests("PATCH"))
+
+    def test_unchanged_yaml_is_skipped(self):
+        self.assertTrue(self.apply(1))
+        self.assertTrue(self.apply(1))
+        self.assertEqual(self.count_patches(), 1)
+
+        self.assertTrue(self.apply(20))
+        self.assertEqual(self.count_patches(), 2)
+
+    def test_applied_without_skip_unchanged(self):
+        self.apply(1)
+        self.apply(1, skip_unchanged=False)
+
+        self.assertEqual(self.count_patches(), 2)
+
+    def test_deleted_yaml_is_applied_again(self):
+        self.apply(1)
+        self.k8s.run_kubectl_delete("settings", wait=False)
+        self.apply(1)
+
+        self.assertEqual(self.count_patches(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
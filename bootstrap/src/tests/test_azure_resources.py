@@ -0,0 +1,232 @@
+import threading
+import time
+import unittest
+
+from mapr.clouds.azure.add_public_ip import AddPublicIp
+from mapr_exceptions.ex import AzureException
+
+try:
+    from mapr.clouds.azure.add_data_disks import AddDataDisks
+except ImportError:
+    # The data disks are created with the models of the Azure SDK
+    AddDataDisks = None
+
+# How long each fake long running operation takes
+OPERATION_TIME = 0.1
+
+
+class Fake(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeEnv(object):
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def get_int(self, key):
+        return int(self.values[key])
+
+
+class FakePoller(object):
+    """
+    A long running operation that finishes OPERATION_TIME after it was started, or fails then with error
+    """
+    def __init__(self, operations, result=None, error=None):
+        self.operations = operations
+        self.finish = time.time() + OPERATION_TIME
+        self._result = result
+        self.error = error
+        operations.started()
+
+    def wait(self):
+        time.sleep(max(self.finish - time.time(), 0))
+        self.operations.finished()
+        if self.error is not None:
+            raise self.error
+
+    def result(self):
+        self.wait()
+        return self._result
+
+
+class Operations(object):
+    """
+    Counts the long running operations that run at the same time
+    """
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.calls = list()
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def finished(self):
+        with self._lock:
+            self.running -= 1
+
+    def record(self, *call):
+        with self._lock:
+            self.calls.append(call)
+
+
+class FakeDisks(object):
+    def __init__(self, operations, failing=()):
+        self.operations = operations
+        self.failing = failing
+
+    def list_by_resource_group(self, resource_group):
+        return list()
+
+    def create_or_update(self, resource_group, name, disk):
+        self.operations.record("create", name)
+        error = Exception("quota exceeded") if name in self.failing else None
+        return FakePoller(self.operations, Fake(name=name, id="/disks/{0}".format(name)), error)
+
+
+class FakeVirtualMachines(object):
+    def __init__(self, operations, vms, failing=()):
+        self.operations = operations
+        self.vms = dict((vm.name, vm) for vm in vms)
+        self.failing = failing
+
+    def list(self, resource_group):
+        return list(self.vms.values())
+
+    def get(self, resource_group, name):
+        vm = self.vms[name]
+        return Fake(name=name, storage_profile=Fake(data_disks=list(vm.storage_profile.data_disks)))
+
+    def create_or_update(self, resource_group, name, vm):
+        self.operations.record("update", name, len(vm.storage_profile.data_disks))
+        error = Exception("vm is busy") if name in self.failing else None
+        return FakePoller(self.operations, vm, error)
+
+
+@unittest.skipIf(AddDataDisks is None, "the Azure SDK is not installed")
+class TestAddDataDisks(unittest.TestCase):
+    VMS = 4
+    DISKS = 3
+
+    def create(self, failing_disks=(), failing_vms=()):
+        vms = [Fake(name="vm{0}".format(i), storage_profile=Fake(data_disks=[Fake(name="os")] if i == 0 else list()))
+               for i in range(TestAddDataDisks.VMS)]
+        self.operations = Operations()
+        compute_client = Fake(disks=FakeDisks(self.operations, failing_disks),
+                              virtual_machines=FakeVirtualMachines(self.operations, vms, failing_vms))
+        env = FakeEnv({"RESOURCE_GROUP": "rg", "AKS_NAME": "aks", "LOCATION": "eastus",
+                       "DATA_DISK_COUNT": str(TestAddDataDisks.DISKS), "DATA_DISK_SIZE": "100",
+                       "DATA_DISK_TYPE": "Premium_LRS"})
+        return AddDataDisks(env, compute_client)
+
+    def test_concurrent_create_and_attach(self):
+        add_data_disks = self.create()
+        started = time.time()
+
+        report = add_data_disks.run()
+
+        # The 11 creations and 4 attaches run together rather than one after the other
+        self.assertLess(time.time() - started, 8 * OPERATION_TIME)
+        self.assertGreater(self.operations.max_running, TestAddDataDisks.VMS)
+        self.assertEqual(report["vm0"], AddDataDisks.REPORT_ATTACHED.format(2))
+        for i in range(1, TestAddDataDisks.VMS):
+            self.assertEqual(report["vm{0}".format(i)], AddDataDisks.REPORT_ATTACHED.format(3))
+        updates = sorted(call for call in self.operations.calls if call[0] == "update")
+        self.assertEqual(updates, [("update", "vm0", 3), ("update", "vm1", 3), ("update", "vm2", 3),
+                                   ("update", "vm3", 3)])
+
+    def test_partial_failure(self):
+        add_data_disks = self.create(failing_disks=("vm1_DataDisk_2",), failing_vms=("vm2",))
+
+        with self.assertRaises(AzureException):
+            add_data_disks.run()
+
+        report = add_data_disks.report
+        self.assertIn("quota exceeded", report["vm1"])
+        self.assertIn("vm is busy", report["vm2"])
+        self.assertEqual(report["vm3"], AddDataDisks.REPORT_ATTACHED.format(3))
+        self.assertEqual(sorted(add_data_disks.failed), ["vm1", "vm2"])
+        # A VM is not updated when one of its disks could not be created
+        self.assertNotIn("vm1", [call[1] for call in self.operations.calls if call[0] == "update"])
+
+
+class FakePublicIpAddresses(object):
+    def __init__(self, operations, failing=()):
+        self.operations = operations
+        self.failing = failing
+
+    def create_or_update(self, resource_group, name, public_ip):
+        self.operations.record("create", name)
+        error = Exception("no addresses left") if name in self.failing else None
+        return FakePoller(self.operations, Fake(name=name), error)
+
+    def get(self, resource_group, name):
+        return Fake(name=name)
+
+
+class FakeNetworkInterfaces(object):
+    def __init__(self, operations, nics, failing=()):
+        self.operations = operations
+        self.nics = nics
+        self.failing = failing
+
+    def list(self, resource_group):
+        return self.nics
+
+    def create_or_update(self, resource_group, name, params):
+        self.operations.record("associate", name, params["ip_configurations"][0].public_ip_address.name)
+        error = Exception("nic is busy") if name in self.failing else None
+        return FakePoller(self.operations, None, error)
+
+
+class TestAddPublicIp(unittest.TestCase):
+    NICS = 6
+
+    def create(self, failing_ips=(), failing_nics=()):
+        nics = [Fake(name="nic{0}".format(i),
+                     ip_configurations=[Fake(public_ip_address=Fake(name="existing") if i == 0 else None)])
+                for i in range(TestAddPublicIp.NICS)]
+        self.operations = Operations()
+        network_client = Fake(public_ip_addresses=FakePublicIpAddresses(self.operations, failing_ips),
+                              network_interfaces=FakeNetworkInterfaces(self.operations, nics, failing_nics))
+        env = FakeEnv({"RESOURCE_GROUP": "rg", "AKS_NAME": "aks", "LOCATION": "eastus"})
+        return AddPublicIp(env, None, network_client)
+
+    def test_concurrent_create_and_associate(self):
+        add_public_ip = self.create()
+        started = time.time()
+
+        report = add_public_ip.run()
+
+        self.assertLess(time.time() - started, 5 * OPERATION_TIME)
+        self.assertGreater(self.operations.max_running, 1)
+        self.assertEqual(report["nic0"], AddPublicIp.REPORT_EXISTING)
+        for i in range(1, TestAddPublicIp.NICS):
+            self.assertEqual(report["nic{0}".format(i)], AddPublicIp.REPORT_ASSOCIATED)
+        associations = sorted(call for call in self.operations.calls if call[0] == "associate")
+        self.assertEqual(associations, [("associate", "nic{0}".format(i), "nic{0}-publicip".format(i))
+                                        for i in range(1, TestAddPublicIp.NICS)])
+
+    def test_partial_failure(self):
+        add_public_ip = self.create(failing_ips=("nic1-publicip",), failing_nics=("nic2",))
+
+        with self.assertRaises(AzureException):
+            add_public_ip.run()
+
+        report = add_public_ip.report
+        self.assertIn("no addresses left", report["nic1"])
+        self.assertIn("nic is busy", report["nic2"])
+        self.assertEqual(report["nic3"], AddPublicIp.REPORT_ASSOCIATED)
+        self.assertEqual(sorted(add_public_ip.failed), ["nic1", "nic2"])
+        self.assertNotIn("nic1", [call[1] for call in self.operations.calls if call[0] == "associate"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import json
+import os
+import re
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+RESPONSES = """OPENSHIFT_ENV=no
+INSTALL_CSI=yes
+PYTHON_INCOMPATIBLE_CONTINUE=yes
+"""
+
+# A kubectl that answers for whichever cluster the first line of its KUBECONFIG names and records the time
+# span of every call. kubectl get nodes fails for the cluster named in FAKE_KUBECTL_FAIL.
+KUBECTL = """#!{python}
+import json
+import os
+import sys
+import time
+
+started = time.time()
+args = sys.argv[1:]
+command = " ".join(args)
+cluster = ""
+if os.environ.get("KUBECONFIG") and os.path.exists(os.environ["KUBECONFIG"]):
+    with open(os.environ["KUBECONFIG"]) as fp:
+        cluster = fp.readline().strip()
+
+status = 0
+if command.startswith("config view --minify --flatten --context="):
+    sys.stdout.write("cluster-{{0}}\\n".format(args[-1].split("=", 1)[1]))
+elif command.startswith("version"):
+    version = {{"major": "1", "minor": "18", "gitVersion": "v1.18.0"}}
+    sys.stdout.write(json.dumps({{"clientVersion": version, "serverVersion": version}}))
+elif "jsonpath" in command and "server" in command:
+    sys.stdout.write("https://{{0}}:6443".format(cluster))
+elif "jsonpath" in command and "uid" in command:
+    sys.stdout.write("uid-{{0}}".format(cluster))
+elif command.startswith("get nodes"):
+    if cluster == os.environ.get("FAKE_KUBECTL_FAIL"):
+        sys.stderr.write("The connection to the server was refused\\n")
+        status = 1
+    elif "--chunk-size" in command:
+        sys.stdout.write("node1\\tmapr.com/usenode=true\\tmapr.com/exclusivecluster=none\\n")
+    else:
+        sys.stdout.write("NAME    STATUS   ROLES    AGE   VERSION\\nnode1   Ready    <none>   1d    v1.18.0\\n")
+if "-f -" in command:
+    sys.stdin.read()
+# Long enough for the installs that run at the same time to overlap
+time.sleep(0.05)
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "calls.jsonl"), "a") as fp:
+    fp.write(json.dumps({{"cluster": cluster, "args": args, "started": started, "ended": time.time()}}) + "\\n")
+sys.exit(status)
+"""
+
+
+class TestBootstrapFleet(unittest.TestCase):
+    CONTEXTS = ("east", "west", "north")
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="mapr-fleet-test-")
+        self.bin_dir = os.path.join(self.temp_dir, "bin")
+        self.fleet_dir = os.path.join(self.temp_dir, "fleet")
+        os.makedirs(self.bin_dir)
+        kubectl = os.path.join(self.bin_dir, "kubectl")
+        with open(kubectl, "w") as fp:
+            fp.write(KUBECTL.format(python=sys.executable))
+        os.chmod(kubectl, stat.S_IRWXU)
+        self.response_file = os.path.join(self.temp_dir, "responses.txt")
+        with open(self.response_file, "w") as fp:
+            fp.write(RESPONSES)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_fleet(self, max_concurrent, fail=None):
+        env = dict(os.environ)
+        env["PATH"] = self.bin_dir + os.pathsep + env.get("PATH", "")
+        env.pop("KUBECONFIG", None)
+        if fail is not None:
+            env["FAKE_KUBECTL_FAIL"] = "cluster-{0}".format(fail)
+        command = [sys.executable, os.path.join(SRC_DIR, "bootstrap_fleet.py"), "-r", self.response_file,
+                   "--max-concurrent", str(max_concurrent), "--fleet-dir", self.fleet_dir]
+        for context in TestBootstrapFleet.CONTEXTS:
+            command.extend(["--context", context])
+        command.extend(["--", "--parallel"])
+        process = subprocess.Popen(command, cwd=SRC_DIR, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        output, _ = process.communicate()
+        return process.returncode, output.decode("UTF-8")
+
+    def get_calls(self):
+        with open(os.path.join(self.bin_dir, "calls.jsonl")) as fp:
+            return [json.loads(line) for line in fp]
+
+    @staticmethod
+    def get_results(output):
+        results = dict()
+        for line in output.splitlines():
+            fields = line.split()
+            if len(fields) == 6 and fields[0] in TestBootstrapFleet.CONTEXTS:
+                results[fields[0]] = fields[1:]
+        return results
+
+    def test_targets_are_isolated(self):
+        status, output = self.run_fleet(3)
+
+        for context in TestBootstrapFleet.CONTEXTS:
+            target_dir = os.path.join(self.fleet_dir, context)
+            self.assertTrue(os.path.isdir(os.path.join(target_dir, "logs")), output)
+            self.assertTrue(os.path.isdir(os.path.join(target_dir, "state")), output)
+            with open(os.path.join(target_dir, "kubeconfig")) as fp:
+                self.assertEqual(fp.read().strip(), "cluster-{0}".format(context))
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.join(target_dir, "kubeconfig")).st_mode), 0o600)
+            self.assertTrue(os.path.exists(os.path.join(target_dir, "output.log")))
+
+        # Every call the installs made went to their own cluster
+        clusters = set(call["cluster"] for call in self.get_calls() if call["args"][:2] != ["config", "view"])
+        self.assertEqual(clusters, set("cluster-{0}".format(context) for context in TestBootstrapFleet.CONTEXTS))
+        self.assertEqual(sorted(self.get_results(output).keys()), sorted(TestBootstrapFleet.CONTEXTS))
+
+    def test_max_concurrent(self):
+        self.run_fleet(2)
+
+        windows = dict()
+        for call in self.get_calls():
+            if call["args"][:2] == ["config", "view"]:
+                continue
+            started, ended = windows.get(call["cluster"], (call["started"], call["ended"]))
+            windows[call["cluster"]] = (min(started, call["started"]), max(ended, call["ended"]))
+        self.assertEqual(len(windows), 3)
+
+        overlaps = [sum(1 for started, ended in windows.values() if started <= time < ended)
+                    for time, _ in windows.values()]
+        self.assertEqual(max(overlaps), 2)
+
+    def test_failed_target(self):
+        status, output = self.run_fleet(3, fail="west")
+
+        self.assertEqual(status, 1)
+        results = self.get_results(output)
+        self.assertEqual(results["west"][:2], ["FAILED", "4"])
+        for context in ("east", "north"):
+            self.assertEqual(results[context][:2], ["OK", "0"], output)
+        self.assertTrue(re.search(r"Finished west: FAILED", output))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mapr.clouds.cloud_index import CloudIndex
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PLUGIN = """from mapr.clouds.cloud import Cloud
+from mapr.clouds import cloud
+
+
+class TestCloud(Cloud):
+    NAME = "{0}"
+    ENABLED = True
+
+
+class OtherCloud(cloud.Cloud):
+    NAME = "Other"
+    ENABLED = Cloud.is_available()
+
+
+class Helper(object):
+    NAME = "Helper"
+"""
+
+
+class TestCloudIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="mapr-cloud-index-test-")
+        self.directory = os.path.join(self.temp_dir, "clouds")
+        self.state_dir = os.path.join(self.temp_dir, "state")
+        os.mkdir(self.directory)
+        self.write("test_cloud.py", PLUGIN.format("Test"))
+        # Not plugins
+        self.write("cloud.py", "class Cloud(object):\n    pass\n")
+        self.write("README.md", "class Fake(Cloud): pass\n")
+        self.parsed = list()
+        self.parse = CloudIndex.parse
+        CloudIndex.parse = staticmethod(self.count_parse)
+
+    def tearDown(self):
+        CloudIndex.parse = staticmethod(self.parse)
+        shutil.rmtree(self.temp_dir)
+
+    def count_parse(self, filename):
+        self.parsed.append(os.path.basename(filename))
+        return self.parse(filename)
+
+    def write(self, afile, text, modified=None):
+        filename = os.path.join(self.directory, afile)
+        with open(filename, "w") as fp:
+            fp.write(text)
+        if modified is not None:
+            os.utime(filename, (modified, modified))
+        return filename
+
+    def test_parse(self):
+        entries = self.parse(os.path.join(self.directory, "test_cloud.py"))
+
+        self.assertEqual(entries, [
+            {"module": "mapr.clouds.test_cloud", "class": "TestCloud", "name": "Test", "enabled": True},
+            # ENABLED is not a literal
+            {"module": "mapr.clouds.test_cloud", "class": "OtherCloud", "name": "Other", "enabled": None}
+        ])
+
+    def test_files_parsed_once(self):
+        first = CloudIndex(self.directory, self.state_dir).get_entries()
+        second = CloudIndex(self.directory, self.state_dir).get_entries()
+
+        self.assertEqual(self.parsed, ["test_cloud.py"])
+        self.assertEqual(first, second)
+        with open(os.path.join(self.state_dir, CloudIndex.FILENAME)) as fp:
+            self.assertEqual(list(json.load(fp).keys()), ["test_cloud.py"])
+
+    def test_changed_and_removed_files(self):
+        CloudIndex(self.directory, self.state_dir).get_entries()
+        filename = os.path.join(self.directory, "test_cloud.py")
+        self.write("test_cloud.py", PLUGIN.format("Changed"), os.stat(filename).st_mtime + 10)
+        self.write("more_cloud.py", PLUGIN.format("More"))
+
+        entries = CloudIndex(self.directory, self.state_dir).get_entries()
+
+        self.assertEqual(self.parsed, ["test_cloud.py", "more_cloud.py", "test_cloud.py"])
+        self.assertEqual([entry["name"] for entry in entries], ["More", "Other", "Changed", "Other"])
+
+        os.remove(filename)
+        entries = CloudIndex(self.directory, self.state_dir).get_entries()
+        self.assertEqual([entry["module"] for entry in entries], ["mapr.clouds.more_cloud"] * 2)
+        with open(os.path.join(self.state_dir, CloudIndex.FILENAME)) as fp:
+            self.assertEqual(list(json.load(fp).keys()), ["more_cloud.py"])
+
+    def test_invalid_file_is_skipped(self):
+        self.write("broken_cloud.py", "class BrokenCloud(Cloud)\n")
+
+        entries = CloudIndex(self.directory, self.state_dir).get_entries()
+
+        self.assertEqual([entry["class"] for entry in entries], ["TestCloud", "OtherCloud"])
+        # It is parsed again by the next run
+        CloudIndex(self.directory, self.state_dir).get_entries()
+        self.assertEqual(self.parsed.count("broken_cloud.py"), 2)
+
+    def test_unreadable_index(self):
+        os.mkdir(self.state_dir)
+        with open(os.path.join(self.state_dir, CloudIndex.FILENAME), "w") as fp:
+            fp.write("{not json")
+
+        entries = CloudIndex(self.directory, self.state_dir).get_entries()
+
+        self.assertEqual(len(entries), 2)
+
+    def test_without_state_dir(self):
+        CloudIndex(self.directory).get_entries()
+        CloudIndex(self.directory).get_entries()
+
+        self.assertEqual(self.parsed, ["test_cloud.py", "test_cloud.py"])
+        self.assertFalse(os.path.exists(self.state_dir))
+
+    def test_plugins(self):
+        entries = CloudIndex(os.path.join(SRC_DIR, "mapr", "clouds")).get_entries()
+
+        self.assertEqual(sorted((entry["name"], entry["class"]) for entry in entries),
+                         [("AWS", "AWSCloud"), ("Azure", "AzureCloud"), ("Google", "GoogleCloud")])
+
+
+if __name__ == "__main__":
+    unittest.main()
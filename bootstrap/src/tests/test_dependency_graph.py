@@ -0,0 +1,106 @@
+import threading
+import time
+import unittest
+
+from common.dependency_graph import DependencyGraph
+from common.worker_pool import WorkerPool
+from mapr_exceptions.ex import InstallException
+
+
+class Recorder(object):
+    """
+    Actions that record the order they ran in and fail when their name is in failing
+    """
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.order = list()
+        self._lock = threading.Lock()
+
+    def action(self, name):
+        time.sleep(0.01)
+        with self._lock:
+            self.order.append(name)
+        return name not in self.failing
+
+
+def create_graph(recorder, nodes, dependencies):
+    graph = DependencyGraph()
+    for name in nodes:
+        graph.add_node(name, recorder.action, name)
+    for name, depends_on in dependencies:
+        graph.add_dependency(name, depends_on)
+    return graph
+
+
+class TestDependencyGraph(unittest.TestCase):
+    # csi and the secrets are independent; spark and drill need both; the ui needs spark
+    NODES = ("csi", "secrets", "spark", "drill", "ui")
+    DEPENDENCIES = (("spark", "csi"), ("spark", "secrets"), ("drill", "csi"), ("drill", "secrets"), ("ui", "spark"))
+
+    def test_levels(self):
+        graph = create_graph(Recorder(), self.NODES, self.DEPENDENCIES)
+
+        self.assertEqual(graph.get_levels(), [["csi", "secrets"], ["spark", "drill"], ["ui"]])
+
+    def test_run_after_dependencies(self):
+        recorder = Recorder()
+        graph = create_graph(recorder, self.NODES, self.DEPENDENCIES)
+
+        with WorkerPool(4, "test") as pool:
+            results = graph.run(pool)
+
+        self.assertEqual(set(results.values()), set([DependencyGraph.SUCCEEDED]))
+        for name, depends_on in self.DEPENDENCIES:
+            self.assertLess(recorder.order.index(depends_on), recorder.order.index(name))
+
+    def test_failure_skips_dependents(self):
+        recorder = Recorder(failing=("spark",))
+        graph = create_graph(recorder, self.NODES, self.DEPENDENCIES)
+
+        with WorkerPool(4, "test") as pool:
+            results = graph.run(pool)
+
+        self.assertEqual(results, {"csi": DependencyGraph.SUCCEEDED, "secrets": DependencyGraph.SUCCEEDED,
+                                   "spark": DependencyGraph.FAILED, "drill": DependencyGraph.SUCCEEDED,
+                                   "ui": DependencyGraph.SKIPPED})
+        self.assertNotIn("ui", recorder.order)
+
+    def test_exception_fails_the_node(self):
+        def broken():
+            raise ValueError("broken")
+
+        graph = DependencyGraph()
+        graph.add_node("broken", broken)
+        graph.add_node("after", lambda: True)
+        graph.add_dependency("after", "broken")
+
+        with WorkerPool(2, "test") as pool:
+            results = graph.run(pool)
+
+        self.assertEqual(results, {"broken": DependencyGraph.FAILED, "after": DependencyGraph.SKIPPED})
+
+    def test_cycle(self):
+        recorder = Recorder()
+        graph = create_graph(recorder, ("a", "b", "c"), (("b", "a"), ("c", "b"), ("b", "c")))
+
+        with self.assertRaises(InstallException):
+            graph.get_levels()
+        with WorkerPool(2, "test") as pool:
+            with self.assertRaises(InstallException):
+                graph.run(pool)
+        # Nothing was started
+        self.assertEqual(recorder.order, list())
+
+    def test_invalid_nodes(self):
+        graph = create_graph(Recorder(), ("a",), ())
+
+        with self.assertRaises(InstallException):
+            graph.add_node("a", None)
+        with self.assertRaises(InstallException):
+            graph.add_dependency("a", "missing")
+        graph.add_dependency("a", "a")
+        self.assertEqual(graph.get_dependencies("a"), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from common.install_journal import InstallJournal
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CLUSTER = "https://fake:6443#uid-1"
+
+# Journals two steps, then is killed while it writes the third
+KILLED_INSTALL = """import os
+import signal
+import sys
+
+sys.path.insert(0, {src_dir!r})
+from common.install_journal import InstallJournal
+
+journal = InstallJournal({state_dir!r}, {cluster!r})
+journal.record("csi", "digest-csi", True)
+journal.record("spark", "digest-spark", True)
+with open(journal.filename, "a") as fp:
+    fp.write('{{"cluster": "{cluster}", "digest": "digest-dr')
+os.kill(os.getpid(), signal.SIGKILL)
+"""
+
+
+class TestInstallJournal(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp(prefix="mapr-journal-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+
+    def kill_install(self):
+        script = KILLED_INSTALL.format(src_dir=SRC_DIR, state_dir=self.state_dir, cluster=CLUSTER)
+        status = subprocess.call([sys.executable, "-c", script])
+        self.assertEqual(status, -signal.SIGKILL)
+
+    def read_lines(self):
+        with open(os.path.join(self.state_dir, InstallJournal.FILENAME)) as fp:
+            return fp.read().splitlines()
+
+    def test_resume_after_kill_mid_line(self):
+        self.kill_install()
+
+        journal = InstallJournal(self.state_dir, CLUSTER, resume=True)
+        self.assertEqual(journal.get_completed_count(), 2)
+        journal.record("drill", "digest-drill", True)
+
+        journal = InstallJournal(self.state_dir, CLUSTER, resume=True)
+        self.assertEqual(journal.get_completed_count(), 3)
+        journal.record("kubeflow", "digest-kubeflow", True)
+
+        journal = InstallJournal(self.state_dir, CLUSTER, resume=True)
+        self.assertEqual(journal.get_completed_count(), 4)
+        for step in ("csi", "spark", "drill", "kubeflow"):
+            self.assertTrue(journal.is_completed(step, "digest-{0}".format(step)))
+        self.assertEqual([json.loads(line)["step"] for line in self.read_lines()], ["csi", "spark", "drill", "kubeflow"])
+
+    def test_changed_and_failed_steps_are_not_completed(self):
+        journal = InstallJournal(self.state_dir, CLUSTER)
+        journal.record("csi", "digest-csi", True)
+        journal.record("spark", "digest-spark", True)
+        journal.record("spark", None, False)
+
+        journal = InstallJournal(self.state_dir, CLUSTER, resume=True)
+        self.assertFalse(journal.is_completed("csi", "digest-changed"))
+        self.assertTrue(journal.is_completed("csi", "digest-csi"))
+        self.assertFalse(journal.is_completed("spark", "digest-spark"))
+
+    def test_other_cluster(self):
+        InstallJournal(self.state_dir, CLUSTER).record("csi", "digest-csi", True)
+
+        journal = InstallJournal(self.state_dir, "https://other:6443#uid-2", resume=True)
+        self.assertEqual(journal.get_completed_count(), 0)
+
+    def test_new_install_starts_a_new_journal(self):
+        InstallJournal(self.state_dir, CLUSTER).record("csi", "digest-csi", True)
+
+        InstallJournal(self.state_dir, CLUSTER)
+        self.assertEqual(self.read_lines(), list())
+        self.assertEqual(InstallJournal(self.state_dir, CLUSTER, resume=True).get_completed_count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
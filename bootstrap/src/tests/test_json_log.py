@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from common.json_log import JsonLog, JsonLogIndex
+
+EVENTS = [
+    {"time": 100.0, "type": "phase", "phase": "install", "key": None, "operation": "install", "duration": 1.0},
+    {"time": 100.1, "type": "command", "phase": "install", "key": "csi", "command": "kubectl apply -f csi.yaml",
+     "status": 0, "duration": 0.5},
+    {"time": 100.2, "type": "command", "phase": "install", "key": "spark",
+     "command": "kubectl apply -f spark.yaml", "status": 1, "duration": 0.25},
+    {"time": 100.3, "type": "log", "phase": "install", "key": "spark", "level": "ERROR", "message": "spark failed"},
+    {"time": 100.4, "type": "log", "phase": "validate", "key": None, "level": "WARNING", "message": "old kubectl"},
+    {"time": 100.5, "type": "cloud", "phase": "cloud", "key": None, "operation": "create_disks", "duration": 2.0,
+     "error": "quota exceeded"},
+]
+
+
+class TestJsonLogIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="mapr-json-log-test-")
+        self.filename = os.path.join(self.temp_dir, "bootstrap.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_log(self, events=EVENTS):
+        json_log = JsonLog(self.filename)
+        for event in events:
+            json_log.write(event)
+        json_log.close()
+
+    def write_lines(self, text):
+        with open(self.filename, "w") as fp:
+            fp.write(text)
+
+    @staticmethod
+    def get_lines(events):
+        return "".join(json.dumps(event, sort_keys=True) + "\n" for event in events)
+
+    def test_index_written_on_close(self):
+        self.write_log()
+
+        index_filename = JsonLogIndex.get_filename(self.filename)
+        self.assertEqual(index_filename, os.path.join(self.temp_dir, "bootstrap.index.json"))
+        with open(index_filename) as fp:
+            index = json.load(fp)
+        self.assertEqual(index["events"], len(EVENTS))
+        self.assertEqual(index["size"], os.path.getsize(self.filename))
+        self.assertEqual(index["started"], 100.0)
+        self.assertEqual(sorted(index["keys"].keys()), ["csi", "spark"])
+        self.assertEqual(len(index["errors"]), 3)
+
+    def test_query(self):
+        self.write_log()
+
+        self.assertEqual(JsonLogIndex.query(self.filename), EVENTS)
+        self.assertEqual(JsonLogIndex.query(self.filename, key="spark"), EVENTS[2:4])
+        self.assertEqual(JsonLogIndex.query(self.filename, errors=True), [EVENTS[2], EVENTS[3], EVENTS[5]])
+        # Every filter has to match and a pattern matches any name that contains it
+        self.assertEqual(JsonLogIndex.query(self.filename, phase="install", command="apply"), EVENTS[1:3])
+        self.assertEqual(JsonLogIndex.query(self.filename, phase="validate", errors=True), list())
+        self.assertEqual(JsonLogIndex.query(self.filename, key="drill"), list())
+
+    def test_saved_index_is_used(self):
+        self.write_log()
+        index_filename = JsonLogIndex.get_filename(self.filename)
+        with open(index_filename) as fp:
+            index = json.load(fp)
+        index["keys"] = {"spark": index["keys"]["csi"]}
+        JsonLogIndex.save(index, index_filename)
+
+        self.assertEqual(JsonLogIndex.query(self.filename, key="spark"), [EVENTS[1]])
+
+    def test_stale_index_is_rebuilt(self):
+        self.write_log()
+        with open(self.filename, "a") as fp:
+            fp.write(self.get_lines([dict(EVENTS[3], message="spark failed again")]))
+
+        index = JsonLogIndex.load(self.filename)
+
+        self.assertEqual(index["events"], len(EVENTS) + 1)
+        self.assertEqual(len(JsonLogIndex.query(self.filename, key="spark")), 3)
+
+    def test_log_without_index(self):
+        # The run was killed while it wrote its last line
+        self.write_lines(self.get_lines(EVENTS[:3]) + '{"time": 100.3, "type": "lo')
+
+        index = JsonLogIndex.load(self.filename)
+
+        self.assertEqual(index["events"], 3)
+        self.assertEqual(index["started"], 100.0)
+        # The phase span ends after the commands in it
+        self.assertEqual(index["ended"], 101.0)
+        self.assertEqual(JsonLogIndex.query(self.filename, errors=True), [EVENTS[2]])
+        self.assertFalse(os.path.exists(JsonLogIndex.get_filename(self.filename)))
+
+    def test_is_error(self):
+        self.assertFalse(JsonLogIndex.is_error(EVENTS[1]))
+        self.assertTrue(JsonLogIndex.is_error(EVENTS[2]))
+        self.assertTrue(JsonLogIndex.is_error(EVENTS[3]))
+        self.assertFalse(JsonLogIndex.is_error(EVENTS[4]))
+        self.assertTrue(JsonLogIndex.is_error(EVENTS[5]))
+        self.assertTrue(JsonLogIndex.is_error({"type": "log", "level": "CRITICAL"}))
+
+    def test_write_after_close(self):
+        json_log = JsonLog(self.filename)
+        json_log.write(EVENTS[0])
+        json_log.close()
+        json_log.write(EVENTS[1])
+        json_log.close()
+
+        self.assertEqual(JsonLogIndex.query(self.filename), EVENTS[:1])
+
+
+if __name__ == "__main__":
+    unittest.main()
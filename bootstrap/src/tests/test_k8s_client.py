@@ -0,0 +1,277 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fake_api_server import FakeApiServer
+from k8s_client import K8SClient, KubeConfig
+from k8s_operations import K8SOperations
+from k8s_rollback import InstallPhase
+from mapr_exceptions.ex import KubernetesException
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+KUBECONFIG = """apiVersion: v1
+kind: Config
+current-context: fake
+clusters:
+- name: fake
+  cluster:
+    server: {server}
+contexts:
+- name: fake
+  context:
+    cluster: fake
+    user: {user}
+    namespace: mapr-system
+users:
+- name: token
+  user:
+    token: secret-token
+- name: exec
+  user:
+    exec:
+      apiVersion: client.authentication.k8s.io/v1beta1
+      command: aws
+- name: auth-provider
+  user:
+    auth-provider:
+      name: gcp
+"""
+
+
+class K8SClientTestBase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeApiServer().start()
+        self.temp_dir = tempfile.mkdtemp(prefix="mapr-k8s-test-")
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def write_kubeconfig(self, user="token"):
+        path = os.path.join(self.temp_dir, "kubeconfig-{0}".format(user))
+        with open(path, "w") as fp:
+            fp.write(KUBECONFIG.format(server=self.server.url, user=user))
+        return path
+
+    def create_client(self):
+        return K8SClient.from_kubeconfig(self.write_kubeconfig())
+
+    def add_nodes(self, count):
+        for i in range(count):
+            self.server.add_object("/api/v1/nodes", {"apiVersion": "v1", "kind": "Node",
+                                                     "metadata": {"name": "node{0}".format(i)}})
+
+
+class TestApply(K8SClientTestBase):
+    def test_server_side_apply(self):
+        client = self.create_client()
+        obj = {"apiVersion": "apps/v1", "kind": "Deployment",
+               "metadata": {"name": "admission", "namespace": "mapr-system"}, "spec": {"replicas": 1}}
+
+        client.apply(obj)
+
+        patches = self.server.get_requests("PATCH")
+        self.assertEqual(len(patches), 1)
+        self.assertEqual(patches[0]["path"], "/apis/apps/v1/namespaces/mapr-system/deployments/admission")
+        self.assertEqual(patches[0]["query"], {"fieldManager": "mapr-bootstrap", "force": "true"})
+        self.assertEqual(patches[0]["content_type"], "application/apply-patch+yaml")
+        self.assertEqual(patches[0]["authorization"], "Bearer secret-token")
+        self.assertEqual(patches[0]["body"], obj)
+        self.assertEqual(client.get(obj), obj)
+
+    def test_namespace_defaults_to_the_context(self):
+        client = self.create_client()
+        client.apply({"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "settings"}})
+
+        self.assertEqual(self.server.get_requests("PATCH")[0]["path"],
+                         "/api/v1/namespaces/mapr-system/configmaps/settings")
+
+    def test_unknown_kind(self):
+        client = self.create_client()
+        with self.assertRaises(KubernetesException):
+            client.apply({"apiVersion": "v1", "kind": "Widget", "metadata": {"name": "w"}})
+
+
+class TestList(K8SClientTestBase):
+    def test_paginated_list(self):
+        self.add_nodes(5)
+        client = self.create_client()
+
+        pages = list(client.list_pages("v1", "Node", limit=2))
+
+        self.assertEqual([len(page["items"]) for page in pages], [2, 2, 1])
+        gets = [request for request in self.server.get_requests("GET") if request["path"] == "/api/v1/nodes"]
+        self.assertEqual([request["query"].get("continue") for request in gets], [None, "2", "4"])
+        self.assertTrue(all(request["query"]["limit"] == "2" for request in gets))
+
+    def test_list_items(self):
+        self.add_nodes(3)
+        client = self.create_client()
+
+        names = [item["metadata"]["name"] for item in client.list_items("v1", "Node")]
+
+        self.assertEqual(names, ["node0", "node1", "node2"])
+
+
+class TestWatch(K8SClientTestBase):
+    def test_watch_stream(self):
+        events = [("ADDED", {"kind": "Node", "metadata": {"name": "node0"}}),
+                  ("MODIFIED", {"kind": "Node", "metadata": {"name": "node0", "labels": {"a": "b"}}}),
+                  ("DELETED", {"kind": "Node", "metadata": {"name": "node0"}})]
+        self.server.watch_events["/api/v1/nodes"] = events
+        client = self.create_client()
+
+        received = list(client.watch("v1", "Node", resource_version="7", timeout_seconds=5))
+
+        self.assertEqual(received, [(event_type, obj) for event_type, obj in events])
+        watch = [request for request in self.server.get_requests("GET") if "watch" in request["query"]][0]
+        self.assertEqual(watch["query"], {"watch": "true", "timeoutSeconds": "5", "allowWatchBookmarks": "true",
+                                          "resourceVersion": "7"})
+
+
+class TestLabelNodes(K8SClientTestBase):
+    def test_label_nodes(self):
+        self.add_nodes(3)
+        k8s = K8SOperations(None, SRC_DIR)
+        k8s.client = self.create_client()
+
+        results = k8s.label_nodes({"node0": {"mapr.com/usenode": "true"},
+                                   "node1": {"mapr.com/usenode": "true", "mapr.com/exclusivecluster": "none"},
+                                   "missing": {"mapr.com/usenode": "true"}})
+
+        self.assertIsNone(results["node0"])
+        self.assertIsNone(results["node1"])
+        self.assertIn("404", results["missing"])
+        patches = dict((request["path"], request) for request in self.server.get_requests("PATCH"))
+        self.assertEqual(len(patches), 3)
+        self.assertEqual(patches["/api/v1/nodes/node1"]["content_type"], "application/merge-patch+json")
+        self.assertEqual(patches["/api/v1/nodes/node1"]["body"],
+                         {"metadata": {"labels": {"mapr.com/usenode": "true", "mapr.com/exclusivecluster": "none"}}})
+        self.assertEqual(self.server.objects["/api/v1/nodes/node0"]["metadata"]["labels"],
+                         {"mapr.com/usenode": "true"})
+
+
+class TestDelete(K8SClientTestBase):
+    CONFIGMAP = "/api/v1/namespaces/mapr-system/configmaps/settings"
+
+    def create_operations(self, finalizers=None):
+        metadata = {"name": "settings", "namespace": "mapr-system"}
+        if finalizers is not None:
+            metadata["finalizers"] = finalizers
+        self.server.add_object("/api/v1/namespaces/mapr-system/configmaps",
+                               {"apiVersion": "v1", "kind": "ConfigMap", "metadata": metadata})
+        yaml_file = os.path.join(self.temp_dir, "settings.yaml")
+        with open(yaml_file, "w") as fp:
+            fp.write("apiVersion: v1\nkind: ConfigMap\nmetadata:\n  name: settings\n  namespace: mapr-system\n")
+        k8s = K8SOperations(None, SRC_DIR)
+        k8s.yamls["settings"] = yaml_file
+        k8s.client = self.create_client()
+        k8s.delete_timeout = 2
+        return k8s
+
+    def test_delete_waits_until_gone(self):
+        k8s = self.create_operations()
+
+        self.assertTrue(k8s.run_kubectl_delete("settings"))
+
+        self.assertNotIn(TestDelete.CONFIGMAP, self.server.objects)
+        delete = self.server.get_requests("DELETE")[0]
+        self.assertEqual(delete["body"]["propagationPolicy"], "Background")
+        # The watcher checked that the object is gone before returning
+        lists = [request for request in self.server.get_requests("GET")
+                 if request["path"] == "/api/v1/namespaces/mapr-system/configmaps"]
+        self.assertEqual(len(lists), 1)
+
+    def test_delete_reports_finalizer(self):
+        k8s = self.create_operations(["mapr.com/cleanup"])
+
+        self.assertFalse(k8s.run_kubectl_delete("settings"))
+        self.assertIn("deletionTimestamp", self.server.objects[TestDelete.CONFIGMAP]["metadata"])
+
+    def test_delete_objects(self):
+        k8s = self.create_operations()
+
+        pending, failed = k8s.delete_objects(k8s.get_manifest("settings").get_objects())
+
+        self.assertEqual(failed, 0)
+        self.assertEqual([str(obj) for obj in pending], ["ConfigMap/settings in mapr-system"])
+        self.assertNotIn(TestDelete.CONFIGMAP, self.server.objects)
+
+    def test_delete_without_wait(self):
+        k8s = self.create_operations(["mapr.com/cleanup"])
+
+        self.assertTrue(k8s.run_kubectl_delete("settings", wait=False))
+        self.assertEqual(len(self.server.get_requests("DELETE")), 1)
+        self.assertEqual(len(self.server.get_requests("GET")), 1)
+
+
+class TestCreate(K8SClientTestBase):
+    SECRET = "/api/v1/namespaces/mapr-system/secrets/system-user-secrets"
+
+    def create_operations(self):
+        k8s = K8SOperations(None, SRC_DIR)
+        k8s.client = self.create_client()
+        k8s.delete_timeout = 2
+        for name in ("username", "password", "groupname", "userid", "groupid", "mysql_user", "mysql_pass",
+                     "ldapadmin_user", "ldapadmin_pass", "ldapbind_user", "ldapbind_pass"):
+            setattr(k8s, name, name)
+        return k8s
+
+    def test_create_secret(self):
+        k8s = self.create_operations()
+
+        self.assertTrue(k8s.run_kubectl_create_secret())
+        # Like kubectl create a second create fails rather than changing the secret
+        self.assertFalse(k8s.run_kubectl_create_secret())
+
+        posts = self.server.get_requests("POST")
+        self.assertEqual([request["path"] for request in posts], ["/api/v1/namespaces/mapr-system/secrets"] * 2)
+        self.assertEqual(self.server.objects[TestCreate.SECRET]["stringData"]["MAPR_PASSWORD"], "password")
+        self.assertEqual(self.server.get_requests("PATCH"), list())
+
+    def test_rollback_deletes_the_secret(self):
+        k8s = self.create_operations()
+        phase = InstallPhase(k8s, "The install of cluster")
+        k8s._phase = phase
+
+        self.assertTrue(k8s.run_kubectl_create_secret())
+        self.assertEqual([str(obj) for obj in phase.get_created_objects()],
+                         ["Secret/system-user-secrets in mapr-system"])
+
+        self.assertTrue(phase.rollback())
+        self.assertNotIn(TestCreate.SECRET, self.server.objects)
+        self.assertEqual([request["path"] for request in self.server.get_requests("DELETE")], [TestCreate.SECRET])
+
+
+class TestKubeConfig(K8SClientTestBase):
+    def test_token_user(self):
+        config = KubeConfig(self.write_kubeconfig())
+
+        self.assertEqual(config.server, self.server.url)
+        self.assertEqual(config.token, "secret-token")
+        self.assertEqual(config.namespace, "mapr-system")
+
+    def test_credential_plugins_are_not_supported(self):
+        for user in ("exec", "auth-provider"):
+            with self.assertRaises(KubernetesException):
+                KubeConfig(self.write_kubeconfig(user))
+
+    def test_fallback_to_kubectl(self):
+        for user in ("exec", "auth-provider"):
+            k8s = K8SOperations(None, SRC_DIR)
+
+            self.assertFalse(k8s.use_native_client(self.write_kubeconfig(user)))
+            self.assertIsNone(k8s.client)
+        self.assertEqual(self.server.get_requests(), list())
+
+    def test_native_client(self):
+        k8s = K8SOperations(None, SRC_DIR)
+
+        self.assertTrue(k8s.use_native_client(self.write_kubeconfig()))
+        self.assertEqual(k8s.client.config.server, self.server.url)
+
+
+if __name__ == "__main__":
+    unittest.main()
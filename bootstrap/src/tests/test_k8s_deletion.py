@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+import unittest
+
+from common.manifest import ManifestObject
+from k8s_deletion import DeletionWatcher
+
+
+class FakeKubectl(object):
+    """
+    Stands in for K8SOperations with kubectl. Each get is answered by the next of the responses, the last one
+    answering every get after it.
+    """
+    def __init__(self, responses):
+        self.client = None
+        self.max_workers = 4
+        self.responses = list(responses)
+        self.cmds = list()
+        self._lock = threading.Lock()
+
+    def run_get(self, cmd, print_error=True):
+        with self._lock:
+            self.cmds.append(cmd)
+            if len(self.responses) > 1:
+                return self.responses.pop(0)
+            return self.responses[0]
+
+
+def get_response(*objects):
+    items = [{"kind": obj.kind, "metadata": {"name": obj.name, "namespace": obj.namespace,
+                                             "deletionTimestamp": "2020-01-01T00:00:00Z",
+                                             "finalizers": ["mapr.com/cleanup"]}} for obj in objects]
+    return json.dumps({"kind": "List", "items": items}), 0
+
+
+class TestDeletionWatcher(unittest.TestCase):
+    CONFIGMAP = ManifestObject("ConfigMap", "settings", "mapr-system", "v1")
+    CLUSTER = ManifestObject("MapRCluster", "mycluster", "mapr-system", "mapr.com/v1")
+
+    def setUp(self):
+        self.initial_delay = DeletionWatcher.INITIAL_DELAY
+        DeletionWatcher.INITIAL_DELAY = 0.01
+
+    def tearDown(self):
+        DeletionWatcher.INITIAL_DELAY = self.initial_delay
+
+    def test_gone_after_polls(self):
+        k8s = FakeKubectl([get_response(self.CONFIGMAP, self.CLUSTER), get_response(self.CLUSTER), ("", 0)])
+        watcher = DeletionWatcher(k8s, [self.CONFIGMAP, self.CLUSTER, self.CONFIGMAP], time.time() + 10)
+
+        self.assertTrue(watcher.wait())
+
+        self.assertEqual(len(k8s.cmds), 3)
+        self.assertEqual(k8s.cmds[0], "configmap/settings maprcluster.mapr.com/mycluster -n mapr-system "
+                                      "--ignore-not-found -o=json")
+        self.assertEqual(k8s.cmds[2], "maprcluster.mapr.com/mycluster -n mapr-system --ignore-not-found -o=json")
+        self.assertEqual(sorted(watcher.gone_times.keys()), sorted([str(self.CONFIGMAP), str(self.CLUSTER)]))
+
+    def test_missing_resource_type_is_gone(self):
+        error = 'error: the server doesn\'t have a resource type "maprcluster.mapr.com"'
+        k8s = FakeKubectl([(error, 1), ("", 0)])
+        watcher = DeletionWatcher(k8s, [self.CONFIGMAP, self.CLUSTER], time.time() + 10)
+
+        self.assertTrue(watcher.wait())
+
+        # The objects whose type is still served are asked for again on their own
+        self.assertEqual(k8s.cmds[1], "configmap/settings -n mapr-system --ignore-not-found -o=json")
+
+    def test_missing_namespace_is_gone(self):
+        k8s = FakeKubectl([('Error from server (NotFound): namespaces "mapr-system" not found', 1)])
+        watcher = DeletionWatcher(k8s, [self.CONFIGMAP], time.time() + 10)
+
+        self.assertTrue(watcher.wait())
+        self.assertEqual(len(k8s.cmds), 1)
+
+    def test_error_stops_the_wait(self):
+        error = "The connection to the server localhost:8080 was refused"
+        k8s = FakeKubectl([(error, 1)])
+        started = time.time()
+        watcher = DeletionWatcher(k8s, [self.CONFIGMAP], started + 10)
+
+        self.assertFalse(watcher.wait())
+
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(len(k8s.cmds), 1)
+        self.assertEqual(watcher.errors, {str(self.CONFIGMAP): error})
+
+    def test_stuck_on_finalizer(self):
+        k8s = FakeKubectl([get_response(self.CONFIGMAP)])
+        watcher = DeletionWatcher(k8s, [self.CONFIGMAP], time.time() + 0.2)
+
+        self.assertFalse(watcher.wait())
+
+        self.assertEqual(watcher.remaining[str(self.CONFIGMAP)]["finalizers"], ["mapr.com/cleanup"])
+        self.assertGreater(len(k8s.cmds), 1)
+
+    def test_find_existing(self):
+        k8s = FakeKubectl([get_response(self.CLUSTER)])
+        existing = DeletionWatcher(k8s, [self.CONFIGMAP, self.CLUSTER], None).find_existing()
+
+        self.assertEqual(list(existing.keys()), [str(self.CLUSTER)])
+
+
+if __name__ == "__main__":
+    unittest.main()
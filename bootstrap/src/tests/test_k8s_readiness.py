@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from common.manifest import ManifestObject
+from fake_api_server import FakeApiServer
+from k8s_client import K8SClient
+from k8s_readiness import ReadinessWatcher
+from test_k8s_client import KUBECONFIG
+from test_k8s_deletion import FakeKubectl
+
+DEPLOYMENTS = "/apis/apps/v1/namespaces/mapr-system/deployments"
+
+
+def deployment(name, available, generation=1, observed=1):
+    return {"apiVersion": "apps/v1", "kind": "Deployment",
+            "metadata": {"name": name, "namespace": "mapr-system", "generation": generation, "resourceVersion": "1"},
+            "spec": {"replicas": 2},
+            "status": {"observedGeneration": observed, "replicas": 2, "updatedReplicas": 2,
+                       "availableReplicas": available}}
+
+
+class TestIsReady(unittest.TestCase):
+    def test_deployment(self):
+        self.assertTrue(ReadinessWatcher.is_ready("Deployment", deployment("admission", 2)))
+        self.assertFalse(ReadinessWatcher.is_ready("Deployment", deployment("admission", 1)))
+        # The status is of an older spec
+        self.assertFalse(ReadinessWatcher.is_ready("Deployment", deployment("admission", 2, generation=2)))
+        self.assertFalse(ReadinessWatcher.is_ready("Deployment", {"spec": {"replicas": 1}}))
+
+    def test_statefulset(self):
+        statefulset = {"spec": {"replicas": 3}, "status": {"readyReplicas": 3, "currentRevision": "r1",
+                                                          "updateRevision": "r2"}}
+        self.assertFalse(ReadinessWatcher.is_ready("StatefulSet", statefulset))
+        statefulset["status"]["currentRevision"] = "r2"
+        self.assertTrue(ReadinessWatcher.is_ready("StatefulSet", statefulset))
+        statefulset["status"]["readyReplicas"] = 2
+        self.assertFalse(ReadinessWatcher.is_ready("StatefulSet", statefulset))
+
+    def test_daemonset(self):
+        daemonset = {"status": {"desiredNumberScheduled": 4, "updatedNumberScheduled": 4, "numberAvailable": 3}}
+        self.assertFalse(ReadinessWatcher.is_ready("DaemonSet", daemonset))
+        daemonset["status"]["numberAvailable"] = 4
+        self.assertTrue(ReadinessWatcher.is_ready("DaemonSet", daemonset))
+
+
+class TestReadinessWatcher(unittest.TestCase):
+    ADMISSION = ManifestObject("Deployment", "admission", "mapr-system", "apps/v1")
+    LDAP = ManifestObject("StatefulSet", "ldap", "mapr-system", "apps/v1")
+
+    def setUp(self):
+        self.initial_delay = ReadinessWatcher.INITIAL_DELAY
+        ReadinessWatcher.INITIAL_DELAY = 0.01
+
+    def tearDown(self):
+        ReadinessWatcher.INITIAL_DELAY = self.initial_delay
+
+    @staticmethod
+    def get_response(*items):
+        return json.dumps({"kind": "List", "items": list(items)}), 0
+
+    def test_poll_until_ready(self):
+        ldap = {"kind": "StatefulSet", "metadata": {"name": "ldap"}, "spec": {"replicas": 1},
+                "status": {"readyReplicas": 1}}
+        not_ready = dict(deployment("admission", 0), kind="Deployment")
+        ready = dict(deployment("admission", 2), kind="Deployment")
+        k8s = FakeKubectl([self.get_response(not_ready, ldap), self.get_response(ready)])
+        # Only the workloads are waited for
+        objects = [self.ADMISSION, self.LDAP, ManifestObject("ConfigMap", "settings", "mapr-system", "v1")]
+        watcher = ReadinessWatcher(k8s, objects, timeout=10)
+
+        self.assertTrue(watcher.wait())
+
+        self.assertEqual(k8s.cmds, ["deployments,statefulsets -n mapr-system -o=json",
+                                    "deployments -n mapr-system -o=json"])
+        self.assertEqual(sorted(watcher.ready_times.keys()), sorted([str(self.ADMISSION), str(self.LDAP)]))
+
+    def test_timeout(self):
+        k8s = FakeKubectl([self.get_response(dict(deployment("admission", 0), kind="Deployment"))])
+        started = time.time()
+
+        self.assertFalse(ReadinessWatcher(k8s, [self.ADMISSION], timeout=0.2).wait())
+        self.assertLess(time.time() - started, 2)
+
+    def test_nothing_to_wait_for(self):
+        k8s = FakeKubectl([("", 1)])
+
+        self.assertTrue(ReadinessWatcher(k8s, [ManifestObject("Service", "admission", "mapr-system")]).wait())
+        self.assertEqual(k8s.cmds, list())
+
+
+class TestReadinessWatch(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeApiServer().start()
+        self.temp_dir = tempfile.mkdtemp(prefix="mapr-readiness-test-")
+        kubeconfig = os.path.join(self.temp_dir, "kubeconfig")
+        with open(kubeconfig, "w") as fp:
+            fp.write(KUBECONFIG.format(server=self.server.url, user="token"))
+        self.k8s = FakeKubectl([("", 1)])
+        self.k8s.client = K8SClient.from_kubeconfig(kubeconfig)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def test_watch_until_ready(self):
+        self.server.add_object(DEPLOYMENTS, deployment("admission", 0))
+        self.server.add_object(DEPLOYMENTS, deployment("webhook", 2))
+        self.server.watch_events[DEPLOYMENTS] = [("MODIFIED", deployment("admission", 1)),
+                                                 ("MODIFIED", deployment("admission", 2))]
+        objects = [ManifestObject("Deployment", name, "mapr-system", "apps/v1") for name in ("admission", "webhook")]
+        watcher = ReadinessWatcher(self.k8s, objects, timeout=10)
+
+        self.assertTrue(watcher.wait())
+
+        # One list and one watch, and no kubectl
+        gets = [request for request in self.server.get_requests("GET") if request["path"] == DEPLOYMENTS]
+        self.assertEqual([request["query"].get("watch") for request in gets], [None, "true"])
+        self.assertEqual(gets[1]["query"]["resourceVersion"], "1")
+        self.assertEqual(self.k8s.cmds, list())
+        self.assertLessEqual(watcher.ready_times["Deployment/webhook in mapr-system"],
+                             watcher.ready_times["Deployment/admission in mapr-system"])
+
+
+if __name__ == "__main__":
+    unittest.main()
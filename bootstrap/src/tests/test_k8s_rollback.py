@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from common.file_utils import FileUtils
+from common.mapr_logger.log import Log
+from common.yaml_template import TemplateCache
+from fake_api_server import FakeApiServer
+from k8s_client import K8SClient
+from k8s_operations import K8SOperations
+from k8s_rollback import InstallPhase
+from test_k8s_client import KUBECONFIG
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CONFIGMAPS = "/api/v1/namespaces/mapr-system/configmaps"
+CONFIGMAP = "apiVersion: v1\nkind: ConfigMap\nmetadata:\n  name: {0}\n  namespace: mapr-system\ndata:\n  size: \"1\"\n"
+
+
+def configmap(name):
+    return {"apiVersion": "v1", "kind": "ConfigMap",
+            "metadata": {"name": name, "namespace": "mapr-system", "resourceVersion": "1"}, "data": {"size": "0"}}
+
+
+class TestInstallPhase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeApiServer().start()
+        self.temp_dir = tempfile.mkdtemp(prefix="mapr-rollback-test-")
+        kubeconfig = os.path.join(self.temp_dir, "kubeconfig")
+        with open(kubeconfig, "w") as fp:
+            fp.write(KUBECONFIG.format(server=self.server.url, user="token"))
+        FileUtils.set_template_cache(TemplateCache())
+        self.k8s = K8SOperations(None, SRC_DIR)
+        self.k8s.client = K8SClient.from_kubeconfig(kubeconfig)
+        self.k8s.delete_timeout = 10
+        for name in ("settings", "limits"):
+            filename = os.path.join(self.temp_dir, "{0}.yaml".format(name))
+            with open(filename, "w") as fp:
+                fp.write(CONFIGMAP.format(name))
+            self.k8s.yamls[name] = filename
+        # The limits were there before the phase
+        self.server.add_object(CONFIGMAPS, configmap("limits"))
+
+    def tearDown(self):
+        FileUtils.set_template_cache(TemplateCache())
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def get_names(self):
+        return [obj["metadata"]["name"] for obj in self.server.list_collection(CONFIGMAPS)]
+
+    def apply_all(self):
+        return self.k8s.run_kubectl_apply("settings") and self.k8s.run_kubectl_apply("limits")
+
+    def test_rollback_keeps_existing_objects(self):
+        self.k8s.use_apply_cache(self.temp_dir, "https://fake:6443#uid-1", True)
+        phase = InstallPhase(self.k8s, "The install of test", ["settings", "limits"])
+        self.k8s._phase = phase
+        self.assertTrue(self.apply_all())
+        self.k8s._phase = None
+        self.assertEqual(self.get_names(), ["limits", "settings"])
+
+        self.assertEqual([str(obj) for obj in phase.get_created_objects()], ["ConfigMap/settings in mapr-system"])
+        self.assertTrue(phase.rollback())
+
+        self.assertEqual(self.get_names(), ["limits"])
+        # Both are forgotten by the apply cache and applied again by the next run
+        patches = len(self.server.get_requests("PATCH"))
+        self.assertTrue(self.apply_all())
+        self.assertEqual(len(self.server.get_requests("PATCH")), patches + 2)
+
+    def test_yamls_checked_when_applied(self):
+        # Keys that are not known up front are checked just before they are applied
+        phase = InstallPhase(self.k8s, "The install of test")
+        self.k8s._phase = phase
+        self.assertTrue(self.apply_all())
+        self.k8s._phase = None
+
+        self.assertTrue(phase.rollback())
+        self.assertEqual(self.get_names(), ["limits"])
+
+    def test_nothing_to_roll_back(self):
+        phase = InstallPhase(self.k8s, "The install of test", ["limits"])
+        self.k8s._phase = phase
+        self.assertTrue(self.k8s.run_kubectl_apply("limits"))
+        self.k8s._phase = None
+
+        self.assertEqual(phase.get_created_objects(), list())
+        self.assertTrue(phase.rollback())
+        self.assertEqual(len(self.server.get_requests("DELETE")), 0)
+
+    def test_run_phase(self):
+        self.k8s.rollback = True
+
+        self.assertTrue(self.k8s.run_phase(["test"], self.apply_all))
+        self.assertEqual(self.get_names(), ["limits", "settings"])
+        self.assertEqual(len(self.server.get_requests("DELETE")), 0)
+        self.assertIsNone(self.k8s._phase)
+
+    def test_run_phase_rolls_back_on_error(self):
+        self.k8s.rollback = True
+
+        def install():
+            self.apply_all()
+            Log.error("The install of test failed")
+
+        self.assertFalse(self.k8s.run_phase(["test"], install))
+        self.assertEqual(self.get_names(), ["limits"])
+
+        self.assertFalse(self.k8s.run_phase(["test"], lambda: False))
+
+    def test_run_phase_without_rollback(self):
+        self.assertTrue(self.k8s.run_phase(["test"], lambda: False))
+        self.assertIsNone(self.k8s._phase)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import threading
+import time
+import unittest
+
+from common.os_command import OSCommand
+from mapr.clouds.gke.node_disk_pipeline import NodeDiskPipeline
+
+
+class FakeNodes(object):
+    """
+    The readiness of the nodes at each poll; the last one is repeated
+    """
+    def __init__(self, polls):
+        self.polls = list(polls)
+        self.count = 0
+
+    def get_node_readiness(self):
+        self.count += 1
+        if len(self.polls) > 1:
+            return self.polls.pop(0)
+        return self.polls[0]
+
+
+class Provisioner(object):
+    def __init__(self, duration=0.0, failing=(), broken=()):
+        self.duration = duration
+        self.failing = failing
+        self.broken = broken
+        self.started = dict()
+        self.deadlines = dict()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def provision(self, node, deadline):
+        with self._lock:
+            self.started[node] = time.time()
+            self.deadlines[node] = deadline
+        if node in self.broken:
+            raise ValueError("no quota")
+        self.release.wait(self.duration)
+        return node not in self.failing
+
+
+class TestNodeDiskPipeline(unittest.TestCase):
+    def setUp(self):
+        self.intervals = NodeDiskPipeline.POLL_INTERVAL, NodeDiskPipeline.WAIT_INTERVAL
+        self.get_node_readiness = NodeDiskPipeline.get_node_readiness
+        NodeDiskPipeline.POLL_INTERVAL = 0.01
+        NodeDiskPipeline.WAIT_INTERVAL = 0.01
+        self.run2 = OSCommand.run2
+
+    def tearDown(self):
+        NodeDiskPipeline.POLL_INTERVAL, NodeDiskPipeline.WAIT_INTERVAL = self.intervals
+        NodeDiskPipeline.get_node_readiness = self.get_node_readiness
+        OSCommand.run2 = self.run2
+
+    @staticmethod
+    def use_nodes(polls):
+        nodes = FakeNodes(polls)
+        NodeDiskPipeline.get_node_readiness = staticmethod(nodes.get_node_readiness)
+        return nodes
+
+    def test_get_node_readiness(self):
+        OSCommand.run2 = staticmethod(lambda cmd: ("node-1\tTrue\nnode-2\tFalse\nnode-3\t\n\n", 0))
+        self.assertEqual(NodeDiskPipeline.get_node_readiness(), {"node-1": True, "node-2": False, "node-3": False})
+
+        OSCommand.run2 = staticmethod(lambda cmd: ("connection refused", 1))
+        self.assertIsNone(NodeDiskPipeline.get_node_readiness())
+
+    def test_nodes_provisioned_as_they_become_ready(self):
+        self.use_nodes([None, {"node-1": True, "node-2": False}, {"node-1": True, "node-2": False},
+                        {"node-1": True, "node-2": True}])
+        provisioner = Provisioner()
+
+        results = NodeDiskPipeline(2, provisioner.provision, ready_timeout=10).run()
+
+        self.assertEqual(results, {"node-1": NodeDiskPipeline.DONE, "node-2": NodeDiskPipeline.DONE})
+        self.assertLess(provisioner.started["node-1"], provisioner.started["node-2"])
+
+    def test_failures(self):
+        self.use_nodes([{"node-1": True, "node-2": True, "node-3": True}])
+        provisioner = Provisioner(failing=("node-2",), broken=("node-3",))
+
+        results = NodeDiskPipeline(3, provisioner.provision, ready_timeout=10).run()
+
+        self.assertEqual(results, {"node-1": NodeDiskPipeline.DONE, "node-2": NodeDiskPipeline.FAILED,
+                                   "node-3": NodeDiskPipeline.FAILED})
+
+    def test_node_never_ready(self):
+        nodes = self.use_nodes([{"node-1": True, "node-2": False}])
+        started = time.time()
+
+        results = NodeDiskPipeline(2, Provisioner().provision, ready_timeout=0.2).run()
+
+        self.assertLess(time.time() - started, 2)
+        self.assertGreater(nodes.count, 1)
+        self.assertEqual(results, {"node-1": NodeDiskPipeline.DONE, "node-2": NodeDiskPipeline.NOT_READY})
+
+    def test_deadline_starts_with_the_worker(self):
+        self.use_nodes([{"node-1": True, "node-2": True}])
+        provisioner = Provisioner(duration=0.2)
+
+        # The second node waits for the only worker longer than its own timeout
+        results = NodeDiskPipeline(2, provisioner.provision, max_workers=1, ready_timeout=10, node_timeout=0.3).run()
+
+        self.assertEqual(results, {"node-1": NodeDiskPipeline.DONE, "node-2": NodeDiskPipeline.DONE})
+        self.assertGreaterEqual(provisioner.deadlines["node-2"] - provisioner.started["node-1"], 0.5)
+
+    def test_hung_worker_is_not_waited_for(self):
+        self.use_nodes([{"node-1": True, "node-2": True}])
+        provisioner = Provisioner(duration=30)
+        started = time.time()
+
+        try:
+            results = NodeDiskPipeline(2, provisioner.provision, max_workers=1, ready_timeout=10,
+                                       node_timeout=0.2).run()
+            provisioned = list(provisioner.started.keys())
+        finally:
+            provisioner.release.set()
+
+        self.assertLess(time.time() - started, 5)
+        # The second node never got a worker since the first one hung
+        self.assertEqual(results, {"node-1": NodeDiskPipeline.TIMED_OUT, "node-2": NodeDiskPipeline.TIMED_OUT})
+        self.assertEqual(provisioned, ["node-1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
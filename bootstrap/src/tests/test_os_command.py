@@ -0,0 +1,88 @@
+import threading
+import time
+import unittest
+
+from common.os_command import OSCommand
+
+
+class TestOSCommand(unittest.TestCase):
+    def tearDown(self):
+        OSCommand._cancelled = False
+        OSCommand.set_max_concurrent(OSCommand.DEFAULT_MAX_CONCURRENT)
+        OSCommand.set_default_timeout(None)
+
+    def test_timeout(self):
+        started = time.time()
+        # The shell and the sleep it starts are killed together
+        response, status = OSCommand.run2("sh -c 'sleep 10; echo finished'", timeout=0.3)
+
+        self.assertEqual(status, OSCommand.TIMEOUT_STATUS)
+        self.assertLess(time.time() - started, 5)
+        self.assertNotIn("finished", response)
+
+    def test_default_timeout(self):
+        OSCommand.set_default_timeout(0.3)
+
+        self.assertEqual(OSCommand.run2("sleep 10")[1], OSCommand.TIMEOUT_STATUS)
+        self.assertEqual(OSCommand.run2("true", timeout=5)[1], 0)
+
+    def test_cancel_all(self):
+        results = list()
+        thread = threading.Thread(target=lambda: results.append(OSCommand.run2("sleep 10")))
+        started = time.time()
+        thread.start()
+        while len(OSCommand._processes) == 0 and time.time() - started < 5:
+            time.sleep(0.01)
+
+        OSCommand.cancel_all()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(results[0][1], OSCommand.CANCELLED_STATUS)
+        # Nothing starts once the commands were cancelled
+        self.assertEqual(OSCommand.run2("true"), ("Cancelled before it started", OSCommand.CANCELLED_STATUS))
+
+    def test_stdin(self):
+        # More than a pipe holds in both directions, so writing it all before reading would deadlock
+        content = "apiVersion: v1\n" * 100000
+
+        response, status = OSCommand.run2("cat", input_data=content, timeout=30)
+
+        self.assertEqual(status, 0)
+        self.assertEqual(response, content)
+
+    def test_stdin_not_read(self):
+        response, status = OSCommand.run2("head -c 3", input_data="x" * 1000000, timeout=30)
+
+        self.assertEqual((response, status), ("xxx", 0))
+
+    def test_on_line(self):
+        lines = list()
+
+        response, status = OSCommand.run2("printf 'first\\nsecond\\n'", on_line=lines.append)
+
+        self.assertEqual(lines, ["first", "second"])
+        self.assertEqual(response, "first\nsecond\n")
+
+    def test_max_concurrent(self):
+        OSCommand.set_max_concurrent(2)
+        started = time.time()
+
+        results = OSCommand.run_many(["sleep 0.3"] * 4, max_workers=4)
+
+        self.assertEqual([status for _, status in results], [0, 0, 0, 0])
+        self.assertGreaterEqual(time.time() - started, 0.6)
+
+    def test_run_many(self):
+        results = OSCommand.run_many(["echo one", "echo two; exit 3", None, "echo four"])
+
+        self.assertEqual(results[0], ("one\n", 0))
+        self.assertEqual(results[1], ("two\n", 3))
+        # A statement that could not be run reports why instead of an empty response
+        self.assertEqual(results[2][1], 1)
+        self.assertIn("NoneType", results[2][0])
+        self.assertEqual(results[3], ("four\n", 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
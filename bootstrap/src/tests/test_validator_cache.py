@@ -0,0 +1,126 @@
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+from validators.gcloud_validator import GcloudValidator
+from validators.validator import Validator
+from validators.validator_cache import ValidatorCache
+
+# A gcloud that counts the instance lists and fails them when FAKE_GCLOUD_FAIL is set
+GCLOUD = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls"
+test -z "$FAKE_GCLOUD_FAIL"
+"""
+
+CONFIGURATION = """[core]
+account = {account}
+project = {project}
+"""
+
+
+class TestValidatorCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="mapr-validator-test-")
+        self.bin_dir = os.path.join(self.temp_dir, "bin")
+        self.config_dir = os.path.join(self.temp_dir, "gcloud")
+        os.makedirs(self.bin_dir)
+        os.makedirs(os.path.join(self.config_dir, "configurations"))
+        self.gcloud = os.path.join(self.bin_dir, "gcloud")
+        with open(self.gcloud, "w") as fp:
+            fp.write(GCLOUD)
+        os.chmod(self.gcloud, stat.S_IRWXU)
+        self.write_configuration("default", "admin@example.com", "project-a")
+
+        self.environ = dict(os.environ)
+        os.environ["PATH"] = self.bin_dir + os.pathsep + os.environ.get("PATH", "")
+        os.environ["CLOUDSDK_CONFIG"] = self.config_dir
+        for name in ("CLOUDSDK_ACTIVE_CONFIG_NAME", "CLOUDSDK_CORE_ACCOUNT", "CLOUDSDK_CORE_PROJECT", "FAKE_GCLOUD_FAIL"):
+            os.environ.pop(name, None)
+        self.cache = ValidatorCache(os.path.join(self.temp_dir, "state"))
+        Validator.set_cache(self.cache)
+        self.checkers = len(Validator.get_checkers_list())
+
+    def tearDown(self):
+        Validator.set_cache(None)
+        del Validator.get_checkers_list()[self.checkers:]
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.temp_dir)
+
+    def write_configuration(self, name, account, project):
+        with open(os.path.join(self.config_dir, "configurations", "config_{0}".format(name)), "w") as fp:
+            fp.write(CONFIGURATION.format(account=account, project=project))
+
+    def count_lists(self):
+        calls = os.path.join(self.bin_dir, "calls")
+        if not os.path.exists(calls):
+            return 0
+        with open(calls) as fp:
+            return len([line for line in fp if line.startswith("compute instances list")])
+
+    def collect(self):
+        validator = GcloudValidator()
+        validator.collect_cached()
+        return validator
+
+    def test_success_is_reused(self):
+        self.assertEqual(self.collect().operation, Validator.OPERATION_OK)
+        validator = self.collect()
+
+        self.assertEqual(validator.operation, Validator.OPERATION_OK)
+        self.assertTrue(validator.collected)
+        self.assertEqual(self.count_lists(), 1)
+        # The cache is kept between runs
+        self.assertIsNotNone(ValidatorCache(os.path.join(self.temp_dir, "state")).get(
+            "gcloud", self.cache.get_stamp("gcloud") + ["admin@example.com", "project-a"], GcloudValidator.CACHE_TTL))
+
+    def test_failure_is_not_cached(self):
+        os.environ["FAKE_GCLOUD_FAIL"] = "1"
+        self.assertEqual(self.collect().operation, Validator.OPERATION_INSTALL)
+        del os.environ["FAKE_GCLOUD_FAIL"]
+
+        self.assertEqual(self.collect().operation, Validator.OPERATION_OK)
+        self.assertEqual(self.count_lists(), 2)
+
+    def test_account_or_project_change(self):
+        self.collect()
+        self.write_configuration("default", "other@example.com", "project-a")
+        self.collect()
+        os.environ["CLOUDSDK_CORE_PROJECT"] = "project-b"
+        self.collect()
+        self.write_configuration("staging", "other@example.com", "project-b")
+        with open(os.path.join(self.config_dir, "active_config"), "w") as fp:
+            fp.write("staging")
+        del os.environ["CLOUDSDK_CORE_PROJECT"]
+        # The same account and project in another configuration
+        self.collect()
+
+        self.assertEqual(self.count_lists(), 3)
+
+    def test_binary_change(self):
+        self.collect()
+        modified = os.stat(self.gcloud).st_mtime + 10
+        os.utime(self.gcloud, (modified, modified))
+        self.collect()
+
+        self.assertEqual(self.count_lists(), 2)
+
+    def test_time_to_live(self):
+        stamp = ["/usr/bin/gcloud", 1.0]
+        self.cache.put("gcloud", stamp, Validator.OPERATION_OK, dict())
+
+        self.assertIsNotNone(self.cache.get("gcloud", stamp, 60))
+        self.assertIsNone(self.cache.get("gcloud", ["/usr/bin/gcloud", 2.0], 60))
+        self.cache._entries["gcloud"]["time"] = time.time() - 61
+        self.assertIsNone(self.cache.get("gcloud", stamp, 60))
+
+    def test_missing_binary(self):
+        self.assertEqual(ValidatorCache.get_stamp(None), list())
+        self.assertIsNone(ValidatorCache.get_stamp("mapr-no-such-binary"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import threading
+import time
+import unittest
+
+from common.worker_pool import WorkerPool
+
+
+class TestWorkerPool(unittest.TestCase):
+    def test_map_keeps_order(self):
+        with WorkerPool(4, "test") as pool:
+            tasks = pool.map(lambda value: value * value, range(10))
+
+        self.assertEqual([task.result for task in tasks], [value * value for value in range(10)])
+        self.assertTrue(all(task.done() and not task.failed() for task in tasks))
+
+    def test_bounded(self):
+        lock = threading.Lock()
+        counts = {"running": 0, "max": 0}
+
+        def work():
+            with lock:
+                counts["running"] += 1
+                counts["max"] = max(counts["max"], counts["running"])
+            time.sleep(0.05)
+            with lock:
+                counts["running"] -= 1
+
+        with WorkerPool(3, "test") as pool:
+            WorkerPool.wait_all([pool.submit(work) for _ in range(12)])
+            # Threads are only started as work arrives and never more than max_workers
+            self.assertEqual(len(pool._threads), 3)
+
+        self.assertEqual(counts["max"], 3)
+
+    def test_threads_start_with_work(self):
+        with WorkerPool(16, "test") as pool:
+            pool.submit(lambda: None).wait()
+
+            self.assertEqual(len(pool._threads), 1)
+
+    def test_failure_is_kept(self):
+        def fail():
+            raise ValueError("broken")
+
+        with WorkerPool(2, "test") as pool:
+            failed = pool.submit(fail)
+            succeeded = pool.submit(lambda: "ok")
+            WorkerPool.wait_all([failed, succeeded])
+
+        self.assertTrue(failed.failed())
+        self.assertIsInstance(failed.exc_info[1], ValueError)
+        self.assertEqual(succeeded.result, "ok")
+
+    def test_callback(self):
+        done = list()
+        with WorkerPool(2, "test") as pool:
+            task = pool.submit_with_callback(done.append, lambda: 7)
+            task.wait()
+
+        self.assertEqual(done, [task])
+        self.assertEqual(done[0].result, 7)
+
+    def test_wait_all_shares_one_deadline(self):
+        with WorkerPool(4, "test") as pool:
+            tasks = [pool.submit(time.sleep, 0.5) for _ in range(4)]
+            started = time.time()
+
+            self.assertFalse(WorkerPool.wait_all(tasks, 0.2))
+            self.assertLess(time.time() - started, 0.4)
+            self.assertTrue(WorkerPool.wait_all(tasks, 5))
+
+    def test_submit_after_shutdown(self):
+        pool = WorkerPool(1, "test")
+        pool.shutdown()
+
+        with self.assertRaises(RuntimeError):
+            pool.submit(lambda: None)
+
+
+if __name__ == "__main__":
+    unittest.main()
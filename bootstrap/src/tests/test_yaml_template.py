@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import yaml
+
+from common.yaml_template import TemplateCache, YamlTemplate
+
+DEPLOYMENT = """# The admission controller
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: admission
+  namespace: mapr-system   # kept
+spec:
+  replicas: 1
+  template:
+    spec:
+      containers:
+      - name: admission
+        image: "mapr/admission:1.0"
+        env:
+        - name: DEBUG
+          value: "no"
+---
+apiVersion: v1
+kind: Service
+metadata:
+  name: admission
+  namespace: mapr-system
+"""
+
+
+class TestYamlTemplate(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="mapr-template-test-")
+        self.filename = os.path.join(self.temp_dir, "admission.yaml")
+        with open(self.filename, "w") as fp:
+            fp.write(DEPLOYMENT)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def render(self, values):
+        return YamlTemplate.compile(self.filename, values.keys()).render(values)
+
+    def test_plain_key_matches_everywhere(self):
+        text, changed = self.render({"namespace": "mapr-test"})
+
+        self.assertTrue(changed)
+        documents = list(yaml.safe_load_all(text))
+        self.assertEqual([document["metadata"]["namespace"] for document in documents], ["mapr-test", "mapr-test"])
+        # Formatting and comments are kept
+        self.assertTrue(text.startswith("# The admission controller\n"))
+        self.assertIn('namespace: "mapr-test"   # kept', text)
+
+    def test_path_suffix(self):
+        text, _ = self.render({"spec.replicas": 3, "containers.image": "mapr/admission:2.0"})
+
+        deployment = list(yaml.safe_load_all(text))[0]
+        self.assertEqual(deployment["spec"]["replicas"], 3)
+        self.assertEqual(deployment["spec"]["template"]["spec"]["containers"][0]["image"], "mapr/admission:2.0")
+        # The name of the container is not a metadata.name
+        text, _ = self.render({"metadata.name": "webhook"})
+        deployment = list(yaml.safe_load_all(text))[0]
+        self.assertEqual(deployment["metadata"]["name"], "webhook")
+        self.assertEqual(deployment["spec"]["template"]["spec"]["containers"][0]["name"], "admission")
+
+    def test_value_types(self):
+        text, _ = self.render({"replicas": 2, "value": "true"})
+
+        deployment = list(yaml.safe_load_all(text))[0]
+        self.assertEqual(deployment["spec"]["replicas"], 2)
+        # A string that looks like a boolean stays a string
+        self.assertEqual(deployment["spec"]["template"]["spec"]["containers"][0]["env"][0]["value"], "true")
+
+    def test_nothing_to_substitute(self):
+        self.assertEqual(self.render({"missing": "value"}), (DEPLOYMENT, False))
+        self.assertEqual(self.render(dict()), (DEPLOYMENT, False))
+
+
+class TestTemplateCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="mapr-template-test-")
+        self.state_dir = os.path.join(self.temp_dir, "state")
+        self.filename = os.path.join(self.temp_dir, "admission.yaml")
+        self.write(DEPLOYMENT)
+        self.compiled = 0
+        self.compile = YamlTemplate.compile
+        YamlTemplate.compile = staticmethod(self.count_compile)
+
+    def tearDown(self):
+        YamlTemplate.compile = staticmethod(self.compile)
+        shutil.rmtree(self.temp_dir)
+
+    def count_compile(self, filename, keys, text=None):
+        self.compiled += 1
+        return self.compile(filename, keys, text)
+
+    def write(self, text, modified=None):
+        with open(self.filename, "w") as fp:
+            fp.write(text)
+        if modified is not None:
+            os.utime(self.filename, (modified, modified))
+
+    def test_compiled_once_per_run(self):
+        cache = TemplateCache(self.state_dir)
+
+        first = cache.render(self.filename, {"namespace": "a"})
+        second = cache.render(self.filename, {"namespace": "b"})
+
+        self.assertEqual(self.compiled, 1)
+        self.assertIn('namespace: "a"', first[0])
+        self.assertIn('namespace: "b"', second[0])
+
+    def test_plan_is_kept_between_runs(self):
+        TemplateCache(self.state_dir).render(self.filename, {"namespace": "a"})
+        text, changed = TemplateCache(self.state_dir).render(self.filename, {"namespace": "b"})
+
+        self.assertEqual(self.compiled, 1)
+        self.assertTrue(changed)
+        self.assertIn('namespace: "b"', text)
+        with open(os.path.join(self.state_dir, TemplateCache.FILENAME)) as fp:
+            self.assertEqual(list(json.load(fp).keys()), [self.filename])
+
+    def test_changed_file_or_keys_compile_again(self):
+        TemplateCache(self.state_dir).render(self.filename, {"namespace": "a"})
+        TemplateCache(self.state_dir).render(self.filename, {"namespace": "a", "replicas": 2})
+        self.write(DEPLOYMENT.replace("replicas: 1", "replicas: 10"), os.stat(self.filename).st_mtime + 10)
+        text, _ = TemplateCache(self.state_dir).render(self.filename, {"namespace": "a", "replicas": 2})
+
+        self.assertEqual(self.compiled, 3)
+        self.assertEqual(list(yaml.safe_load_all(text))[0]["spec"]["replicas"], 2)
+
+    def test_no_values(self):
+        cache = TemplateCache(self.state_dir)
+
+        self.assertEqual(cache.render(self.filename, dict()), (DEPLOYMENT, False))
+        self.assertEqual(self.compiled, 0)
+        self.assertFalse(os.path.exists(os.path.join(self.state_dir, TemplateCache.FILENAME)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+
+try:
+    from ConfigParser import RawConfigParser  # Python 2
+except ImportError:
+    from configparser import RawConfigParser  # Python 3
+
+from common.mapr_logger.log import Log
+from common.os_command import OSCommand
+from validators.validator import Validator
+
+
+class GcloudValidator(Validator):
+    # Listing instances checks the SDK is configured with credentials and a project. It takes seconds so a
+    # success is reused for an hour unless the active account or project changes
+    CACHE_TTL = 60 * 60
+
+    def __init__(self):
+        super(GcloudValidator, self).__init__("gcloud")
+
+    def get_binary(self):
+        return "gcloud"
+
+    def get_context(self):
+        return list(GcloudValidator.get_account_and_project())
+
+    @staticmethod
+    def get_account_and_project():
+        """
+        The account and project of the active gcloud configuration. They are read from the configuration files and
+        the environment the way gcloud does, since running gcloud config would take as long as the check.
+        """
+        config_dir = os.environ.get("CLOUDSDK_CONFIG") or os.path.join(os.path.expanduser("~"), ".config", "gcloud")
+        name = os.environ.get("CLOUDSDK_ACTIVE_CONFIG_NAME")
+        if not name:
+            try:
+                with open(os.path.join(config_dir, "active_config")) as fp:
+                    name = fp.read().strip()
+            except IOError:
+                name = "default"
+
+        parser = RawConfigParser()
+        parser.read(os.path.join(config_dir, "configurations", "config_{0}".format(name)))
+        values = list()
+        for option in ("account", "project"):
+            value = os.environ.get("CLOUDSDK_CORE_{0}".format(option.upper()))
+            if not value and parser.has_option("core", option):
+                value = parser.get("core", option)
+            values.append(value or None)
+        return tuple(values)
+
+    def collect(self):
+        Log.debug("Checking the Google Cloud SDK is installed and configured...")
+        response, status = OSCommand.run2(["command -v gcloud", "gcloud compute instances list"], timeout=self.TIMEOUT)
+        if status == 0:
+            self.results[Validator.FOUND] = True
+            self.operation = Validator.OPERATION_OK
+        else:
+            self.results[Validator.FOUND] = False
+            self.results[Validator.ERROR] = response
+            self.operation = Validator.OPERATION_INSTALL
@@ -21,9 +21,12 @@ class KubectlValidator(Validator):
     def __init__(self):
         super(KubectlValidator, self).__init__('kubectl')
 
+    def get_binary(self):
+        return "kubectl"
+
     def collect(self):
         Log.debug('Checking kubectl is installed correctly...')
-        response, status = OSCommand.run2("command -v kubectl")
+        response, status = OSCommand.run2("command -v kubectl", timeout=self.TIMEOUT)
         if status == 0:
             Log.info("Looking good... Found kubectl")
             self.operation = Validator.OPERATION_OK
@@ -21,9 +21,12 @@ class OpenshiftClientValidator(Validator):
     def __init__(self):
         super(OpenshiftClientValidator, self).__init__('oc')
 
+    def get_binary(self):
+        return "oc"
+
     def collect(self):
         Log.debug('Checking for oc (OpenShift CLI) installation...')
-        response, status = OSCommand.run2("command -v oc")
+        response, status = OSCommand.run2("command -v oc", timeout=self.TIMEOUT)
         if status == 0:
             Log.info("Looking good... Found oc (OpenShift CLI) installed", True)
             self.operation = Validator.OPERATION_OK
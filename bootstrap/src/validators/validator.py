@@ -1,4 +1,9 @@
-from mapr_exceptions.ex import NotFoundException
+import threading
+import time
+
+from common.mapr_logger.log import Log
+from common.worker_pool import WorkerPool
+from mapr_exceptions.ex import NotFoundException, NotImplementedException
 
 
 class Validator(object):
@@ -13,7 +18,13 @@ class Validator(object):
     OPERATION_INSTALL = 4
     OPERATION_WARNING = 5
 
+    # Seconds a collect() may take before its validator is reported as failed
+    TIMEOUT = 60
+    # Seconds a successful result is reused from the cache; None means the validator always collects
+    CACHE_TTL = None
+
     __checkers_list__ = []
+    _cache = None
 
     def __init__(self, name, package_name=None):
         # The results of the scan of the user's system
@@ -30,6 +41,11 @@ class Validator(object):
         self.package_name = package_name
         # The name of the checker
         self.name = name
+        # If collect() has run or the result came from the cache
+        self.collected = False
+        # Set by collect_all when collect() did not finish in time. A collect() that finishes later is ignored
+        self.timed_out = False
+        self._lock = threading.Lock()
 
         Validator.__checkers_list__.append(self)
 
@@ -47,3 +63,89 @@ class Validator(object):
 
     def get(self, key):
         return self.results.get(key)
+
+    # The tool that is checked. The cached result is dropped when its path or modification time changes
+    def get_binary(self):
+        return None
+
+    # What else the result depends on, as a list that is kept with the cached result; It is dropped when this changes
+    def get_context(self):
+        return list()
+
+    # Scan the user's system and set the results and operation
+    def collect(self):
+        raise NotImplementedException("collect method must be implemented")
+
+    @staticmethod
+    def set_cache(cache):
+        Validator._cache = cache
+
+    def collect_cached(self):
+        cache = Validator._cache
+        stamp = None
+        if cache is not None and self.CACHE_TTL is not None:
+            stamp = cache.get_stamp(self.get_binary())
+            if stamp is not None:
+                stamp = stamp + self.get_context()
+            entry = None if stamp is None else cache.get(self.name, stamp, self.CACHE_TTL)
+            if entry is not None:
+                with self._lock:
+                    if self.timed_out:
+                        return
+                    Log.debug("Using the cached result of the {0} validator".format(self.name))
+                    self.results = entry["results"]
+                    self.operation = entry["operation"]
+                    self.collected = True
+                return
+
+        self.collect()
+        with self._lock:
+            if self.timed_out:
+                # collect() sets the operation itself so the failure it finished after is put back
+                self.operation = Validator.OPERATION_NONE
+                return
+            self.collected = True
+            # Only successes are cached so a problem is reported, and its fix noticed, on every run
+            if stamp is not None and self.operation == Validator.OPERATION_OK:
+                cache.put(self.name, stamp, self.operation, self.results)
+
+    @staticmethod
+    def collect_all(validators=None):
+        """
+        Collect the validators that have not been collected yet concurrently, by default all registered ones. A
+        validator that does not finish within its TIMEOUT is failed; its thread is left to finish on its own.
+        """
+        if validators is None:
+            validators = Validator.__checkers_list__
+        validators = [validator for validator in validators if not validator.collected]
+        if len(validators) == 0:
+            return
+
+        start = time.time()
+        pool = WorkerPool(len(validators), "validator")
+        tasks = [pool.submit(validator.collect_cached) for validator in validators]
+        for validator, task in zip(validators, tasks):
+            if not task.wait(max(start + validator.TIMEOUT - time.time(), 0)):
+                with validator._lock:
+                    # The result may have been stored just as the wait ran out
+                    if not validator.collected:
+                        Log.error("The {0} check did not finish within {1} seconds".format(validator.name,
+                                                                                          validator.TIMEOUT))
+                        validator.timed_out = True
+                        validator.operation = Validator.OPERATION_NONE
+                        validator.collected = True
+            elif task.failed():
+                validator.operation = Validator.OPERATION_NONE
+        pool.shutdown(False)
+
+    @staticmethod
+    def get_collected(validator_type):
+        """
+        Return the registered validator of the type, creating it if needed, once it has been collected
+        """
+        try:
+            validator = Validator.get_checker(validator_type)
+        except NotFoundException:
+            validator = validator_type()
+        Validator.collect_all([validator])
+        return validator
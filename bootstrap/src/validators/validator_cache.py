@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+import time
+
+try:
+    from shutil import which  # Python 3
+except ImportError:
+    from distutils.spawn import find_executable as which  # Python 2
+
+from common.mapr_logger.log import Log
+
+
+class ValidatorCache(object):
+    """
+    The successful results of validators kept between runs. An entry is used while it is younger than the
+    validator's time to live and the tool it checked is still at the same path with the same modification time,
+    so installing or upgrading the tool is always noticed.
+    """
+    FILENAME = "validator-cache.json"
+
+    def __init__(self, state_dir):
+        self.filename = os.path.join(state_dir, ValidatorCache.FILENAME)
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    @staticmethod
+    def get_stamp(binary):
+        """
+        Return the path and modification time of the binary, an empty stamp when there is no binary or None when
+        the binary cannot be found and nothing should be cached
+        """
+        if binary is None:
+            return list()
+        path = which(binary)
+        if path is None:
+            return None
+        path = os.path.realpath(path)
+        return [path, os.stat(path).st_mtime]
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return dict()
+        try:
+            with open(self.filename) as fp:
+                return json.load(fp)
+        except (IOError, ValueError) as e:
+            Log.warning("Ignoring the unreadable validator cache {0}: {1}".format(self.filename, str(e)))
+            return dict()
+
+    def _save(self):
+        directory = os.path.dirname(self.filename)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "w") as fp:
+            json.dump(self._entries, fp, indent=2, sort_keys=True)
+        os.rename(temp_filename, self.filename)
+
+    def get(self, name, stamp, ttl):
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None or entry["stamp"] != stamp or time.time() - entry["time"] > ttl:
+            return None
+        return entry
+
+    def put(self, name, stamp, operation, results):
+        with self._lock:
+            self._entries[name] = {"time": time.time(), "stamp": stamp, "operation": operation, "results": results}
+            self._save()